@@ -0,0 +1,326 @@
+import sys
+import pickle
+import struct
+import time
+import traceback
+import multiprocessing
+from multiprocessing import shared_memory
+
+from melee_env.agents.basic import Agent
+from agent_loader import AgentLoader
+
+# Shared memory layout: length of the pickled GameState, then the pickle
+_HEADER = struct.Struct("<I")
+
+
+def _agent_main(conn, shm_name, player_id, device, character, stage, config_path):
+    """
+    Body of an agent's process: load the agent, then act on every state it's sent
+
+    Messages sent back:
+    - ("ready", character, action_space) once the agent is loaded
+    - ("action", seq, action, act_time) for every state
+    - ("error", traceback) if loading or acting raised
+    """
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        agent = AgentLoader(
+            player_id=player_id,
+            device=device,
+            character=character,
+            stage=stage,
+            config_path=config_path
+        )()
+        conn.send(("ready", agent.character, agent.action_space))
+        while True:
+            seq = conn.recv()
+            if seq is None:
+                break
+            (length,) = _HEADER.unpack_from(shm.buf, 0)
+            state = pickle.loads(bytes(shm.buf[_HEADER.size:_HEADER.size + length]))
+
+            start_time = time.perf_counter()
+            action = agent.act(state)
+            if device.type == "cuda":
+                # Imported here, so that agents on the CPU don't need torch
+                import torch
+                torch.cuda.synchronize(device)
+            conn.send(("action", seq, action, time.perf_counter() - start_time))
+    except (EOFError, KeyboardInterrupt):
+        pass
+    except Exception:
+        try:
+            conn.send(("error", traceback.format_exc()))
+        except (BrokenPipeError, OSError):
+            pass
+    finally:
+        shm.close()
+        conn.close()
+
+
+class SandboxedAgent(Agent):
+    """
+    An agent loaded by AgentLoader that runs in its own process
+
+    The matchmaker never waits on the agent longer than it wants to: request() hands
+    the agent a GameState through shared memory, and collect() waits for the action
+    until a deadline and gives up after that. A hung agent doesn't get any new states
+    until it answers, and is killed and restarted once it's been busy for hang_time
+    seconds. An agent that crashes is restarted too. After max_restarts restarts the
+    agent is given up on instead, and doesn't act again. The frames it misses are up
+    to the caller to fill in.
+
+    In the matchmaker's process, the agent is a stand in with the character and
+    action space the real agent was loaded with, so MeleeEnv can use it as usual.
+    They're sent back pickled, so the agent's agent_module_dir is added to this
+    process's sys.path too, for the classes defined in there.
+
+    Attributes:
+    - stats: dict, per agent counts of "frames" acted on in time, "timeouts" (frames
+      it missed the deadline of), "late" (actions that came after their deadline
+      and were thrown away), "crashes", "hangs" and "restarts", and "gave_up", whether
+      it ran out of restarts
+    """
+
+    def __init__(
+        self,
+        player_id,
+        device,
+        character,
+        stage,
+        config_path,
+        hang_time=5.0,
+        max_restarts=3,
+        load_time=120.0,
+        state_size=1 << 20
+    ):
+        """
+        Start the agent's process and wait for it to load
+
+        Args:
+        - player_id, device, character, stage, config_path: as for AgentLoader
+        - hang_time: float, seconds an agent can be busy with one state before it's
+          restarted
+        - max_restarts: int, how many times to restart the agent before giving up on
+          it. None to always restart it
+        - load_time: float, seconds to wait for the agent to load
+        - state_size: int, bytes of shared memory for the pickled GameState
+        """
+
+        super().__init__()
+        self.player_id = player_id
+        self.device = device
+        self.character = character
+        self.stage = stage
+        self.config_path = config_path
+        self.hang_time = hang_time
+        self.max_restarts = max_restarts
+        self.action_space = None
+        self.stats = {"frames": 0, "timeouts": 0, "late": 0, "crashes": 0, "hangs": 0, "restarts": 0, "gave_up": False}
+
+        # The action space is usually an instance of a class in the agent's module,
+        #   which has to be importable here to unpickle it
+        loader = AgentLoader(player_id, device, character, stage, config_path)
+        module_dir = loader.config["agent_module_dir"]
+        if module_dir not in sys.path:
+            sys.path.append(module_dir)
+
+        # Spawned, since CUDA can't be used in a forked child
+        self._context = multiprocessing.get_context("spawn")
+        self._shm = shared_memory.SharedMemory(create=True, size=state_size)
+        self._process = None
+        self._conn = None
+        self._ready = False
+        self._seq = 0
+        # Sequence number and perf_counter() time of the state the agent is busy with
+        self._busy = None
+        self._busy_since = None
+        # Sequence number of the state sent this frame, if one was
+        self._requested = None
+
+        try:
+            self._start()
+            deadline = time.perf_counter() + load_time
+            while not self._ready:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0 or self.stats["gave_up"] or not self._receive(remaining):
+                    raise RuntimeError(f"Agent of player {self.player_id} failed to load")
+        except BaseException:
+            # Whatever went wrong, don't leave the process or the shared memory behind
+            self.close()
+            raise
+
+    def _start(self):
+        self._conn, child_conn = self._context.Pipe()
+        self._process = self._context.Process(
+            target=_agent_main,
+            args=(
+                child_conn,
+                self._shm.name,
+                self.player_id,
+                self.device,
+                self.character,
+                self.stage,
+                self.config_path
+            ),
+            daemon=True
+        )
+        self._process.start()
+        child_conn.close()
+        self._ready = False
+        self._busy = None
+
+    def _restart(self):
+        self._stop()
+        if self.max_restarts is not None and self.stats["restarts"] >= self.max_restarts:
+            # Restarting an agent that keeps failing would hold up every frame
+            print(f"[Log] Player {self.player_id}'s agent was restarted {self.stats['restarts']} times, giving up on it")
+            self.stats["gave_up"] = True
+            self._ready = False
+            self._busy = None
+            return
+        self.stats["restarts"] += 1
+        self._start()
+
+    def _stop(self):
+        if self._process is not None and self._process.is_alive():
+            self._process.kill()
+        if self._process is not None:
+            self._process.join()
+        if self._conn is not None:
+            self._conn.close()
+        self._process = None
+        self._conn = None
+
+    def _receive(self, timeout):
+        """
+        Handle one message from the agent, waiting up to timeout seconds for it
+
+        Returns:
+        - the (action, act_time) of the state the agent was busy with, True for any
+          other message, or False if nothing came or the agent died
+        """
+
+        try:
+            if not self._conn.poll(timeout):
+                return False
+            message = self._conn.recv()
+        except (EOFError, OSError):
+            message = ("error", "connection to the agent's process was lost")
+
+        if message[0] == "ready":
+            _, character, action_space = message
+            self.character = character
+            self.action_space = action_space
+            self._ready = True
+            return True
+        if message[0] == "action":
+            _, seq, action, act_time = message
+            if seq == self._busy:
+                self._busy = None
+                return action, act_time
+            return True
+
+        print(f"[Log] Player {self.player_id}'s agent crashed:\n{message[1]}")
+        self.stats["crashes"] += 1
+        self._restart()
+        return False
+
+    def request(self, state):
+        """
+        Send the agent the state of a frame, if it's ready for one
+
+        Returns:
+        - bool, whether the state was sent. It isn't while the agent is loading, or
+          still busy with an earlier state
+        """
+
+        # Take in whatever the agent sent since the last frame
+        self._requested = None
+        if self.stats["gave_up"]:
+            return False
+        while True:
+            result = self._receive(0)
+            if result is False:
+                break
+            if isinstance(result, tuple):
+                self.stats["late"] += 1
+        if self._busy is not None:
+            if time.perf_counter() - self._busy_since < self.hang_time:
+                return False
+            print(f"[Log] Player {self.player_id}'s agent hung, restarting it")
+            self.stats["hangs"] += 1
+            self._restart()
+        if not self._ready:
+            return False
+
+        payload = pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+        if _HEADER.size + len(payload) > self._shm.size:
+            raise ValueError(f"GameState of {len(payload)} bytes doesn't fit in the shared memory")
+        _HEADER.pack_into(self._shm.buf, 0, len(payload))
+        self._shm.buf[_HEADER.size:_HEADER.size + len(payload)] = payload
+
+        self._seq += 1
+        self._busy = self._requested = self._seq
+        self._busy_since = time.perf_counter()
+        try:
+            self._conn.send(self._seq)
+        except (BrokenPipeError, OSError):
+            self.stats["crashes"] += 1
+            self._restart()
+            return False
+        return True
+
+    def collect(self, deadline):
+        """
+        Wait for the action to the state sent by request(), until a deadline
+
+        Args:
+        - deadline: float, time.perf_counter() time to stop waiting at
+
+        Returns:
+        - (action, act_time), with act_time measured in the agent's process, or
+          (None, None) if the action didn't come in time
+        """
+
+        # Only the action to this frame's state counts, not one to an earlier frame
+        while self._requested is not None and self._busy == self._requested:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            result = self._receive(remaining)
+            if isinstance(result, tuple):
+                self.stats["frames"] += 1
+                return result
+        self.stats["timeouts"] += 1
+        return None, None
+
+    def act(self, state, timeout=None):
+        """
+        request() and collect() in one go
+
+        Args:
+        - state: GameState, the state to act on
+        - timeout: float, seconds to wait for the action. None to wait for as long as
+          hang_time
+        """
+
+        timeout = self.hang_time if timeout is None else timeout
+        deadline = time.perf_counter() + timeout
+        self.request(state)
+        action, _ = self.collect(deadline)
+        return action
+
+    def close(self):
+        """Stop the agent's process and free the shared memory"""
+
+        if self._conn is not None and self._process is not None and self._process.is_alive():
+            try:
+                self._conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            self._process.join(timeout=1.0)
+        self._stop()
+        self._shm.close()
+        self._shm.unlink()
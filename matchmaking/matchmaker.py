@@ -4,11 +4,16 @@ import yaml
 import time
 import torch
 import argparse
+from concurrent.futures import ThreadPoolExecutor, wait
 from melee import enums
 from agent_loader import AgentLoader
+from agent_sandbox import SandboxedAgent
 from melee_env.env import MeleeEnv
 from melee_env.agents.util import ObservationSpace
 
+# Slippi's number for the first frame of a game
+FIRST_FRAME = -123
+
 def get_config(path: str) -> dict:
     """
     Get config
@@ -80,28 +85,178 @@ def get_stage_enum(name: str) -> int:
     return mapping[name]
 
 
+def timed_act(agent, state, device):
+    """
+    Run an agent's act and time it, including the GPU work it queued up
+
+    Args:
+    - agent: Agent, the agent to act
+    - state: GameState, the state to act on
+    - device: torch.device, the agent's device
+
+    Returns:
+    - (action, act_time): the action and the seconds it took
+    """
+
+    if device.type == "cuda":
+        torch.cuda.synchronize(device)
+    start_time = time.perf_counter()
+    action = agent.act(state)
+    if device.type == "cuda":
+        torch.cuda.synchronize(device)
+
+    return action, time.perf_counter() - start_time
+
+
+class ConcurrentActors:
+    """
+    Runs every agent's act at the same time, each on its own worker thread
+
+    Each agent gets one thread, pinned to its device, so its calls still run one
+    after another and its timing isn't mixed up with the other agent's. PyTorch lets
+    go of the GIL while it computes, so the agents overlap and a frame takes as long
+    as the slowest agent instead of the sum of both.
+    """
+
+    def __init__(self, agents, devices):
+        self.agents = agents
+        self.devices = devices
+        self.executors = [
+            ThreadPoolExecutor(
+                max_workers=1,
+                thread_name_prefix=f"player{i + 1}",
+                initializer=self._pin,
+                initargs=(device,),
+            )
+            for i, device in enumerate(devices)
+        ]
+        # The call each agent is busy with, or None. An agent gets no new state while
+        #   it's still busy, so a slow call never leaves a backlog of stale ones
+        self.pending = [None] * len(agents)
+        # Actions thrown away for coming after their frame's deadline, and frames an
+        #   agent was skipped on because it was still busy
+        self.stats = {"late": 0, "skipped": 0}
+
+    @staticmethod
+    def _pin(device):
+        if device.type == "cuda":
+            torch.cuda.set_device(device)
+
+    def act(self, state, deadline):
+        """
+        Get every agent's action for a frame, waiting at most deadline seconds in total
+
+        Args:
+        - state: GameState, the state to act on
+        - deadline: float, seconds to wait for all the agents together
+
+        Returns:
+        - list of (action, act_time) per agent, as timed_act returns it. An agent that
+          missed the deadline gets (None, None), and its late action is thrown away.
+          An agent that's still busy with an earlier frame isn't given this one, and
+          gets (None, None) too.
+        """
+
+        submitted = [None] * len(self.agents)
+        for i, (executor, agent, device) in enumerate(zip(self.executors, self.agents, self.devices)):
+            pending = self.pending[i]
+            if pending is not None:
+                if not pending.done():
+                    self.stats["skipped"] += 1
+                    continue
+                # Finished after its own frame's deadline
+                self.stats["late"] += 1
+            submitted[i] = self.pending[i] = executor.submit(timed_act, agent, state, device)
+        wait([future for future in submitted if future is not None], timeout=deadline)
+
+        results = []
+        for i, future in enumerate(submitted):
+            if future is not None and future.done():
+                self.pending[i] = None
+                results.append(future.result())
+            else:
+                results.append((None, None))
+        return results
+
+    def close(self):
+        for executor in self.executors:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def find_replay(replay_dir):
+    """
+    Find the replay of the game that was just played
+
+    Args:
+    - replay_dir: str, the directory Slippi saved the game's replay in
+
+    Returns:
+    - path: str, the newest .slp file in replay_dir, or None if there's none (or
+      replay_dir is None)
+    """
+
+    if replay_dir is None or not os.path.isdir(replay_dir):
+        return None
+    replays = [
+        os.path.join(replay_dir, name) for name in os.listdir(replay_dir) if name.endswith(".slp")
+    ]
+    if not replays:
+        return None
+    return max(replays, key=os.path.getmtime)
+
+
 def main(_config):
+    """
+    Play one game between the two agents of the config
+
+    Args:
+    - _config: dict, the matchmaker config
+
+    Returns:
+    - result: dict, the winner (1, 2, or 0 for a draw), why the game ended
+      ("game_rule" or "max_steps"), the last frame number, the game's length in
+      frames, stocks and percents, and the path of the replay when it was saved to
+      replay_dir
+    """
+
     done_result = None
     observation_space = ObservationSpace()
     print("[Log] loading agents... ")
-    p1_agent = AgentLoader(
-        player_id=1, 
-        device=torch.device("cuda:0"), 
-        character=get_character_enum(_config["p1_character"]), 
-        stage=get_stage_enum(_config["stage"]), 
-        config_path=_config["p1_agent_config_path"]
-    )()
-    print("[Log] player 1 agent loaded successfully")
-    p2_agent = AgentLoader(
-        player_id=2, 
-        device=torch.device("cuda:1"), 
-        character=get_character_enum(_config["p2_character"]), 
-        stage=get_stage_enum(_config["stage"]), 
-        config_path=_config["p2_agent_config_path"]
-    )()
-    print("[Log] player 2 agent loaded successfully")
-    
-    players = [p1_agent, p2_agent]
+    devices = [
+        torch.device(_config.get("p1_device", "cuda:0")),
+        torch.device(_config.get("p2_device", "cuda:1"))
+    ]
+    sandboxed = _config.get("sandbox_agents", False)
+    players = []
+    for player_id, device in enumerate(devices, start=1):
+        loader_args = dict(
+            player_id=player_id, 
+            device=device, 
+            character=get_character_enum(_config[f"p{player_id}_character"]), 
+            stage=get_stage_enum(_config["stage"]), 
+            config_path=_config[f"p{player_id}_agent_config_path"]
+        )
+        if sandboxed:
+            players.append(
+                SandboxedAgent(
+                    hang_time=_config.get("agent_hang_time", 5.0),
+                    max_restarts=_config.get("agent_max_restarts", 3),
+                    **loader_args
+                )
+            )
+        else:
+            players.append(AgentLoader(**loader_args)())
+        print(f"[Log] player {player_id} agent loaded successfully")
+    
+    actors = None
+    if sandboxed:
+        print("[Log] agents will act in their own processes")
+    elif _config.get("concurrent_act", False):
+        actors = ConcurrentActors(players, devices)
+        print("[Log] agents will act concurrently")
+    # Action of a frame an agent misses: a fixed action, or the agent's last one
+    fallback_action = _config.get("fallback_action", 0)
+    last_actions = [0, 0]
     
     print("[Log] Initializing environment... ")
     env = MeleeEnv(
@@ -110,6 +265,7 @@ def main(_config):
         fast_forward=_config["fast_forward"],
         blocking_input=_config["blocking_input"],
         save_replays=_config["save_replays"],
+        replay_dir=_config.get("replay_dir"),
         port=_config["port"],
         save_action=_config["save_action"]
     )
@@ -132,31 +288,30 @@ def main(_config):
             now_s = env.step(*action_pair)
             continue
         
-        # Act of p1
-        torch.cuda.synchronize()
-        p1_act_start_time = time.time()
-        p1_action = players[0].act(now_s)
-        torch.cuda.synchronize()
-        p1_act_end_time = time.time()
-        p1_act_time = p1_act_end_time - p1_act_start_time
-        
-        if p1_act_time > _config["max_act_time"]:
-            print(f"[Log] Player 1's action time exceeded the limit: {p1_act_time}, no action will be applied")
-            p1_action = 0
-            
-        # Act of p2
-        torch.cuda.synchronize()
-        p2_act_start_time = time.time()
-        p2_action = players[1].act(now_s)
-        torch.cuda.synchronize()
-        p2_act_end_time = time.time()
-        p2_act_time = p2_act_end_time - p2_act_start_time
-        
-        if p2_act_time > _config["max_act_time"]:
-            print(f"[Log] Player 2's action time exceeded the limit: {p2_act_time}, no action will be applied")
-            p2_action = 0
-            
-        action_pair = [p1_action, p2_action]
+        # Act of p1 and p2, one after the other or both at once
+        if sandboxed:
+            deadline = time.perf_counter() + _config["max_act_time"]
+            for player in players:
+                player.request(now_s)
+            results = [player.collect(deadline) for player in players]
+        elif actors is None:
+            results = [timed_act(player, now_s, device) for player, device in zip(players, devices)]
+        else:
+            results = actors.act(now_s, _config.get("act_deadline", _config["max_act_time"]))
+
+        action_pair = []
+        for player_id, (action, act_time) in enumerate(results, start=1):
+            if act_time is None:
+                print(f"[Log] Player {player_id} missed the frame deadline, no action will be applied")
+                action = None
+            elif act_time > _config["max_act_time"]:
+                print(f"[Log] Player {player_id}'s action time exceeded the limit: {act_time}, no action will be applied")
+                action = None
+            if action is None:
+                action = last_actions[player_id - 1] if fallback_action == "last" else fallback_action
+            last_actions[player_id - 1] = action
+            action_pair.append(action)
+        p1_act_time, p2_act_time = [act_time for _, act_time in results]
         
         now_s, _, done, _ = observation_space(env.step(*action_pair))
 
@@ -193,31 +348,62 @@ def main(_config):
     if done_result is None:
         print("[Log] Game ended by the max_steps")
         done_result = now_s
+        reason = "max_steps"
     else:
         print("[Log] Game ended by the game rule")
+        reason = "game_rule"
 
     # Determine winner
+    winner = 0
     if done_result.players[1].stock > done_result.players[2].stock:
         print(f"[Log] Player 1 wins, stock difference, player 1's stock: {done_result.players[1].stock}, player 2's stock: {done_result.players[2].stock}")
+        winner = 1
     
     elif done_result.players[1].stock < done_result.players[2].stock:
         print(f"[Log] Player 2 wins, stock difference, player 1's stock: {done_result.players[1].stock}, player 2's stock: {done_result.players[2].stock}")
+        winner = 2
     
     else:
         if done_result.players[1].percent < done_result.players[2].percent:
             print(f"[Log] Player 1 wins, percent difference, player 1's stock: {done_result.players[1].stock}, player 2's stock: {done_result.players[2].stock}, player 1's percent: {done_result.players[1].percent}, player 2's percent: {done_result.players[2].percent}")
+            winner = 1
     
         elif done_result.players[1].percent > done_result.players[2].percent:
             print(f"[Log] Player 2 wins, percent difference, player 1's stock: {done_result.players[1].stock}, player 2's stock: {done_result.players[2].stock}, player 1's percent: {done_result.players[1].percent}, player 2's percent: {done_result.players[2].percent}")
+            winner = 2
     
         else:
             print(f"[Log] Draw, player 1's stock: {done_result.players[1].stock}, player 2's stock: {done_result.players[2].stock}, player 1's percent: {done_result.players[1].percent}, player 2's percent: {done_result.players[2].percent}")
+
+    result = {
+        "winner": winner,
+        "reason": reason,
+        "frame": done_result.frame,
+        "frames": done_result.frame - FIRST_FRAME + 1,
+        "p1_stock": done_result.players[1].stock,
+        "p2_stock": done_result.players[2].stock,
+        "p1_percent": done_result.players[1].percent,
+        "p2_percent": done_result.players[2].percent,
+    }
     
+    if actors is not None:
+        print(f"[Log] Concurrent agents: {actors.stats}")
+        actors.close()
+    if sandboxed:
+        for player_id, player in enumerate(players, start=1):
+            print(f"[Log] Player {player_id}'s agent: {player.stats}")
+            player.close()
+
     print("[Log] Closing environment... ")
     env.close()
     print("[Log] Environment closed successfully")
+
+    # Dolphin has finished writing the replay now that it's stopped
+    result["replay_path"] = find_replay(_config.get("replay_dir")) if _config["save_replays"] else None
     
     print("[Log] Matchmaking finished")
+
+    return result
     
     
 if __name__ == "__main__":
@@ -0,0 +1,331 @@
+import os
+import json
+import time
+import sqlite3
+import argparse
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS matches (
+    id TEXT PRIMARY KEY,
+    p1 TEXT NOT NULL,
+    p2 TEXT NOT NULL,
+    p1_character TEXT,
+    p2_character TEXT,
+    stage TEXT,
+    p1_stock INTEGER,
+    p2_stock INTEGER,
+    p1_percent REAL,
+    p2_percent REAL,
+    winner INTEGER NOT NULL,
+    reason TEXT,
+    replay_path TEXT,
+    duration_frames INTEGER,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS matches_p1 ON matches (p1, p2);
+CREATE INDEX IF NOT EXISTS matches_p2 ON matches (p2, p1);
+CREATE INDEX IF NOT EXISTS matches_stage ON matches (stage);
+
+CREATE TABLE IF NOT EXISTS ratings (
+    agent TEXT PRIMARY KEY,
+    rating REAL NOT NULL,
+    games INTEGER NOT NULL DEFAULT 0,
+    wins INTEGER NOT NULL DEFAULT 0,
+    losses INTEGER NOT NULL DEFAULT 0,
+    draws INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS ratings_rating ON ratings (rating DESC);
+
+CREATE TABLE IF NOT EXISTS head_to_head (
+    agent TEXT NOT NULL,
+    opponent TEXT NOT NULL,
+    games INTEGER NOT NULL DEFAULT 0,
+    wins INTEGER NOT NULL DEFAULT 0,
+    losses INTEGER NOT NULL DEFAULT 0,
+    draws INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (agent, opponent)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS imports (
+    path TEXT PRIMARY KEY,
+    offset INTEGER NOT NULL
+);
+"""
+
+_MATCH_COLUMNS = (
+    "id", "p1", "p2", "p1_character", "p2_character", "stage", "p1_stock", "p2_stock",
+    "p1_percent", "p2_percent", "winner", "reason", "replay_path", "duration_frames",
+    "finished_at"
+)
+
+# Slippi's number for the first frame of a game, as in matchmaker.py
+_FIRST_FRAME = -123
+
+
+def expected_score(rating, opponent_rating):
+    """Elo's expected score of a player against an opponent, between 0 and 1"""
+
+    return 1 / (1 + 10 ** ((opponent_rating - rating) / 400))
+
+
+class ResultsDB:
+    """
+    SQLite database of match results, with the agents' Elo ratings kept up to date
+
+    Every result is added with add(), which updates the ratings of its two agents and
+    their head to head record in the same transaction, so nothing is ever recomputed
+    over the whole history. The leaderboard and head to head tables are kept as rows
+    of their own, and read straight off their indexes, however many games there are.
+
+    A match that's already in the database is skipped, so the same results can be
+    added again safely, e.g. when a tournament resumes. Results files added with
+    add_jsonl() are read from where the last call left off.
+    """
+
+    def __init__(self, path, k=32.0, initial_rating=1500.0):
+        """
+        Args:
+        - path: str, the database file. Created if needed
+        - k: float, Elo K factor, the most a rating moves in one game
+        - initial_rating: float, rating of an agent's first game
+        """
+
+        self.path = path
+        self.k = k
+        self.initial_rating = initial_rating
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # Several tournaments on one machine can write to the same database
+        self._conn = sqlite3.connect(path, timeout=60.0, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def _rating(self, agent):
+        row = self._conn.execute("SELECT rating FROM ratings WHERE agent = ?", (agent,)).fetchone()
+        if row is None:
+            self._conn.execute(
+                "INSERT INTO ratings (agent, rating) VALUES (?, ?)", (agent, self.initial_rating)
+            )
+            return self.initial_rating
+        return row["rating"]
+
+    def _count(self, agent, opponent, score, rating_change):
+        """Count one game of an agent against an opponent, with its score (1, 0.5 or 0)"""
+
+        outcome = (score == 1.0, score == 0.0, score == 0.5)
+        self._conn.execute(
+            "UPDATE ratings SET rating = rating + ?, games = games + 1, "
+            "wins = wins + ?, losses = losses + ?, draws = draws + ? WHERE agent = ?",
+            (rating_change, *outcome, agent)
+        )
+        self._conn.execute(
+            "INSERT INTO head_to_head (agent, opponent, games, wins, losses, draws) "
+            "VALUES (?, ?, 1, ?, ?, ?) ON CONFLICT (agent, opponent) DO UPDATE SET "
+            "games = games + 1, wins = wins + excluded.wins, "
+            "losses = losses + excluded.losses, draws = draws + excluded.draws",
+            (agent, opponent, *outcome)
+        )
+
+    def add(self, record):
+        """
+        Add a match result and update its agents' ratings
+
+        Args:
+        - record: dict, a finished match as tournament.py stores it: its id, the p1
+          and p2 agents, characters and stage, matchmaker.main's result, and
+          optionally "finished_at"
+
+        Returns:
+        - bool, whether the match was added. It isn't when it's already there
+        """
+
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            added = self._insert(record)
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        return added
+
+    def _insert(self, record):
+        """add(), inside a transaction that's already open"""
+
+        row = dict.fromkeys(_MATCH_COLUMNS)
+        row.update({key: value for key, value in record.items() if key in row})
+        row["duration_frames"] = record.get("frames")
+        if row["duration_frames"] is None and record.get("frame") is not None:
+            # Results from before matchmaker.main counted them only have the last frame
+            row["duration_frames"] = record["frame"] - _FIRST_FRAME + 1
+        if row["finished_at"] is None:
+            row["finished_at"] = time.time()
+
+        cursor = self._conn.execute(
+            f"INSERT INTO matches ({', '.join(_MATCH_COLUMNS)}) "
+            f"VALUES ({', '.join('?' * len(_MATCH_COLUMNS))}) ON CONFLICT (id) DO NOTHING",
+            [row[column] for column in _MATCH_COLUMNS]
+        )
+        if cursor.rowcount == 0:
+            return False
+
+        p1, p2 = row["p1"], row["p2"]
+        p1_score = {0: 0.5, 1: 1.0, 2: 0.0}[row["winner"]]
+        p2_score = 1.0 - p1_score
+        p1_rating, p2_rating = self._rating(p1), self._rating(p2)
+        p1_change = self.k * (p1_score - expected_score(p1_rating, p2_rating))
+        self._count(p1, p2, p1_score, p1_change)
+        self._count(p2, p1, p2_score, -p1_change)
+        return True
+
+    def add_jsonl(self, path):
+        """
+        Add the matches of a results file written by tournament.py
+
+        The file is only read from where the last call for it stopped, since
+        tournament.py only ever appends to it, and its new matches are added in a
+        single transaction. A last line that's still being written is left for the
+        next call.
+
+        Args:
+        - path: str, the results file
+
+        Returns:
+        - added: int, how many matches weren't in the database yet
+        """
+
+        key = os.path.abspath(path)
+        added = 0
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self._conn.execute("SELECT offset FROM imports WHERE path = ?", (key,)).fetchone()
+            offset = 0 if row is None else row["offset"]
+            with open(path, "rb") as f:
+                if offset > os.fstat(f.fileno()).st_size:
+                    # A new file in place of the one that was read
+                    offset = 0
+                f.seek(offset)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    offset += len(line)
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A line cut short by a crash while it was written
+                        continue
+                    added += self._insert(record)
+            self._conn.execute(
+                "INSERT INTO imports (path, offset) VALUES (?, ?) "
+                "ON CONFLICT (path) DO UPDATE SET offset = excluded.offset",
+                (key, offset)
+            )
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        return added
+
+    def leaderboard(self, limit=None, min_games=0):
+        """
+        The agents by rating, highest first
+
+        Args:
+        - limit: int, how many agents to return. None for all of them
+        - min_games: int, leave out agents with fewer games than this
+
+        Returns:
+        - list of dict with the agent, rating, games, wins, losses and draws
+        """
+
+        rows = self._conn.execute(
+            "SELECT * FROM ratings WHERE games >= ? ORDER BY rating DESC LIMIT ?",
+            (min_games, -1 if limit is None else limit)
+        )
+        return [dict(row) for row in rows]
+
+    def head_to_head(self, agent=None):
+        """
+        Games, wins, losses and draws of agents against each of their opponents
+
+        Args:
+        - agent: str, only this agent's records. None for every agent's
+
+        Returns:
+        - list of dict with the agent, opponent, games, wins, losses and draws
+        """
+
+        if agent is None:
+            rows = self._conn.execute("SELECT * FROM head_to_head ORDER BY agent, opponent")
+        else:
+            rows = self._conn.execute(
+                "SELECT * FROM head_to_head WHERE agent = ? ORDER BY opponent", (agent,)
+            )
+        return [dict(row) for row in rows]
+
+    def matches(self, agent, opponent=None, limit=100):
+        """
+        The latest matches an agent played, as either player
+
+        Args:
+        - agent: str, the agent
+        - opponent: str, only the matches against this opponent. None for all of them
+        - limit: int, how many matches to return
+
+        Returns:
+        - list of dict, one per match, newest first
+        """
+
+        if opponent is None:
+            query = (
+                "SELECT * FROM matches WHERE p1 = :agent "
+                "UNION ALL SELECT * FROM matches WHERE p2 = :agent "
+                "ORDER BY finished_at DESC LIMIT :limit"
+            )
+        else:
+            query = (
+                "SELECT * FROM matches WHERE p1 = :agent AND p2 = :opponent "
+                "UNION ALL SELECT * FROM matches WHERE p2 = :agent AND p1 = :opponent "
+                "ORDER BY finished_at DESC LIMIT :limit"
+            )
+        rows = self._conn.execute(query, {"agent": agent, "opponent": opponent, "limit": limit})
+        return [dict(row) for row in rows]
+
+    def close(self):
+        self._conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show the ratings of a results database")
+    parser.add_argument("db_path", type=str, help="Path to the results database")
+    parser.add_argument(
+        "--add",
+        type=str,
+        default=None,
+        help="Add the matches of a tournament.py results.jsonl first"
+    )
+    parser.add_argument(
+        "--agent",
+        type=str,
+        default=None,
+        help="Show this agent's head to head record instead of the leaderboard"
+    )
+    parser.add_argument("--min_games", type=int, default=0, help="Leave out agents with fewer games")
+    args = parser.parse_args()
+
+    db = ResultsDB(args.db_path)
+    if args.add is not None:
+        print(f"[Log] Added {db.add_jsonl(args.add)} matches")
+    if args.agent is None:
+        for rank, row in enumerate(db.leaderboard(min_games=args.min_games), start=1):
+            print(
+                f"{rank:>4} {row['agent']:<24} {row['rating']:>7.1f} "
+                f"{row['wins']}-{row['losses']}-{row['draws']} ({row['games']} games)"
+            )
+    else:
+        for row in db.head_to_head(args.agent):
+            print(
+                f"{row['agent']} vs {row['opponent']:<24} "
+                f"{row['wins']}-{row['losses']}-{row['draws']} ({row['games']} games)"
+            )
+    db.close()
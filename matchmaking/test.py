@@ -0,0 +1,482 @@
+#!/usr/bin/python3
+import os
+import json
+import time
+import types
+import tempfile
+import unittest
+import subprocess
+import multiprocessing
+from unittest import mock
+from multiprocessing import shared_memory
+
+import yaml
+import melee
+from melee.enums import Character, Stage
+
+from agent_sandbox import SandboxedAgent
+from results_db import ResultsDB, expected_score
+from tournament import PortLeases, ResultStore, Tournament, expand_matches
+
+try:
+    import torch
+except ImportError:
+    torch = None
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Stands in for example_agent1 when torch isn't installed: an action space class of
+#   its own module, like the example's
+_STUB_AGENT = '''
+import random
+
+import numpy as np
+from melee_env.agents.basic import Agent
+from melee_env.agents.util import ControlState
+
+
+class StubActionSpace:
+    def __init__(self):
+        self.actions = np.zeros((4, 13))
+        self.size = 4
+
+    def __call__(self, action):
+        return ControlState(self.actions[action])
+
+
+class StubAgent(Agent):
+    def __init__(self, player_id, device, character, stage, config):
+        super().__init__()
+        self.character = character
+        self.action_space = StubActionSpace()
+
+    def act(self, state):
+        return random.randint(0, 3)
+'''
+
+
+class Sandbox(unittest.TestCase):
+    """
+    SandboxedAgent running the example agent in its own process
+    """
+
+    def _config(self, directory):
+        """The example_p1 config, pointed at the example in this checkout"""
+
+        with open(os.path.join(HERE, "example_p1", "example_agent_config.yaml"), "r") as f:
+            config = yaml.safe_load(f)
+        if torch is None:
+            with open(os.path.join(directory, "stub_agent.py"), "w") as f:
+                f.write(_STUB_AGENT)
+            config.update(
+                agent_module_dir=directory,
+                agent_module_name="stub_agent",
+                agent_class_name="StubAgent"
+            )
+        else:
+            config["agent_module_dir"] = os.path.join(HERE, "example_p1")
+        path = os.path.join(directory, "agent_config.yaml")
+        with open(path, "w") as f:
+            yaml.safe_dump(config, f)
+        return path
+
+    def test_sandboxed_agent(self):
+        """The agent loads, acts on a state, and is restarted after it crashes"""
+
+        device = types.SimpleNamespace(type="cpu") if torch is None else torch.device("cpu")
+        with tempfile.TemporaryDirectory() as directory:
+            agent = SandboxedAgent(
+                1, device, Character.FOX, Stage.FINAL_DESTINATION, self._config(directory)
+            )
+            try:
+                # The action space came back from the agent's process, class and all
+                self.assertEqual(agent.character, Character.FOX)
+                self.assertEqual(agent.action_space.size, 4)
+                self.assertIn(
+                    type(agent.action_space).__name__, ("ExampleActionSpace1", "StubActionSpace")
+                )
+
+                gamestate = melee.GameState()
+                self.assertTrue(agent.request(gamestate))
+                action, act_time = agent.collect(time.perf_counter() + 10.0)
+                self.assertIn(action, range(4))
+                self.assertGreaterEqual(act_time, 0.0)
+                self.assertEqual(agent.stats["frames"], 1)
+
+                agent._process.kill()
+                agent._process.join()
+                deadline = time.perf_counter() + 60.0
+                while not agent.request(gamestate):
+                    self.assertLess(time.perf_counter(), deadline, "agent didn't restart")
+                    time.sleep(0.05)
+                self.assertEqual(agent.stats["crashes"], 1)
+                self.assertEqual(agent.stats["restarts"], 1)
+                action, _ = agent.collect(time.perf_counter() + 10.0)
+                self.assertIn(action, range(4))
+            finally:
+                agent.close()
+
+    def test_gives_up(self):
+        """An agent that keeps crashing is given up on once it's out of restarts"""
+
+        device = types.SimpleNamespace(type="cpu") if torch is None else torch.device("cpu")
+        with tempfile.TemporaryDirectory() as directory:
+            agent = SandboxedAgent(
+                1,
+                device,
+                Character.FOX,
+                Stage.FINAL_DESTINATION,
+                self._config(directory),
+                max_restarts=1
+            )
+            try:
+                gamestate = melee.GameState()
+                for crashes in (1, 2):
+                    agent._process.kill()
+                    agent._process.join()
+                    deadline = time.perf_counter() + 60.0
+                    while agent.stats["crashes"] < crashes:
+                        self.assertLess(time.perf_counter(), deadline, "crash went unnoticed")
+                        agent.request(gamestate)
+                        time.sleep(0.05)
+                self.assertEqual(agent.stats["restarts"], 1)
+                self.assertTrue(agent.stats["gave_up"])
+                self.assertIsNone(agent._process)
+
+                # From then on every frame is missed, without starting the agent again
+                self.assertFalse(agent.request(gamestate))
+                self.assertEqual(agent.collect(time.perf_counter() + 1.0), (None, None))
+                self.assertIsNone(agent._process)
+                self.assertEqual(agent.stats["restarts"], 1)
+            finally:
+                agent.close()
+
+    def test_failed_load(self):
+        """An agent that fails to load leaves no shared memory behind"""
+
+        created = []
+        SharedMemory = shared_memory.SharedMemory
+
+        def create(*args, **kwargs):
+            shm = SharedMemory(*args, **kwargs)
+            created.append(shm)
+            return shm
+
+        device = types.SimpleNamespace(type="cpu") if torch is None else torch.device("cpu")
+        with tempfile.TemporaryDirectory() as directory:
+            with mock.patch("agent_sandbox.shared_memory.SharedMemory", create), mock.patch.object(
+                SandboxedAgent, "_receive", side_effect=ModuleNotFoundError("example_agent1")
+            ):
+                with self.assertRaises(ModuleNotFoundError):
+                    SandboxedAgent(
+                        1, device, Character.FOX, Stage.FINAL_DESTINATION, self._config(directory)
+                    )
+        self.assertEqual(len(created), 1)
+        with self.assertRaises(FileNotFoundError):
+            shared_memory.SharedMemory(name=created[0].name)
+
+
+class _SleepyAgent:
+    """Takes act_time seconds to act, and answers with how many states it was given"""
+
+    def __init__(self, act_time):
+        self.act_time = act_time
+        self.states = []
+
+    def act(self, state):
+        self.states.append(state)
+        time.sleep(self.act_time)
+        return len(self.states)
+
+
+@unittest.skipIf(torch is None, "the matchmaker needs torch")
+class Concurrent(unittest.TestCase):
+    """
+    ConcurrentActors with one agent that keeps to the deadline and one that doesn't
+    """
+
+    def test_deadline(self):
+        """The fast agent's actions come back every frame. The slow one misses its
+        frames, isn't given new states while it's busy, and its action is thrown away"""
+
+        from matchmaker import ConcurrentActors
+
+        fast, slow = _SleepyAgent(0.01), _SleepyAgent(0.3)
+        actors = ConcurrentActors([fast, slow], [torch.device("cpu")] * 2)
+        try:
+            states = [object() for _ in range(3)]
+            started = time.perf_counter()
+            (action, act_time), missed = actors.act(states[0], 0.1)
+            self.assertLess(time.perf_counter() - started, 0.25)
+            self.assertEqual(action, 1)
+            self.assertGreaterEqual(act_time, 0.01)
+            self.assertLess(act_time, 0.1)
+            self.assertEqual(missed, (None, None))
+            self.assertEqual(actors.stats, {"late": 0, "skipped": 0})
+
+            # Still busy with the first frame
+            (action, _), missed = actors.act(states[1], 0.1)
+            self.assertEqual(action, 2)
+            self.assertEqual(missed, (None, None))
+            self.assertEqual(actors.stats, {"late": 0, "skipped": 1})
+            self.assertEqual(slow.states, [states[0]])
+
+            # Done with it now, but too late. It gets the current frame next
+            actors.pending[1].result()
+            (action, _), missed = actors.act(states[2], 0.1)
+            self.assertEqual(action, 3)
+            self.assertEqual(missed, (None, None))
+            self.assertEqual(actors.stats, {"late": 1, "skipped": 1})
+            self.assertEqual(fast.states, states)
+            self.assertEqual(slow.states, [states[0], states[2]])
+        finally:
+            started = time.perf_counter()
+            actors.close()
+        # Without waiting on the slow agent
+        self.assertLess(time.perf_counter() - started, 0.2)
+
+
+def _stuck_match(pid_path):
+    """A match that hangs, with a Dolphin of its own in its process group"""
+
+    os.setsid()
+    dolphin = subprocess.Popen(["sleep", "600"])
+    with open(pid_path, "w") as f:
+        f.write(str(dolphin.pid))
+    time.sleep(600)
+
+
+class Matches(unittest.TestCase):
+    """
+    The match queue of a tournament spec
+    """
+
+    spec = {
+        "agents": {"c": "c.yaml", "a": "a.yaml", "b": "b.yaml"},
+        "characters": ["FOX", "FALCO"],
+        "stages": ["FINAL_DESTINATION", "BATTLEFIELD"],
+        "games": 2,
+    }
+
+    def test_expand_matches(self):
+        """Every pairing is played on every stage, with sides swapped every other game"""
+
+        matches = expand_matches(self.spec)
+        self.assertEqual(len(matches), 3 * 4 * 2 * 2)
+        ids = [match["id"] for match in matches]
+        self.assertEqual(len(set(ids)), len(ids))
+
+        by_id = {match["id"]: match for match in matches}
+        for match in matches:
+            if match["game"] != 1:
+                continue
+            first = by_id[match["id"][:-1] + "0"]
+            self.assertEqual(
+                (match["p1"], match["p1_character"]), (first["p2"], first["p2_character"])
+            )
+            self.assertEqual(
+                (match["p2"], match["p2_character"]), (first["p1"], first["p1_character"])
+            )
+            self.assertEqual(match["stage"], first["stage"])
+
+    def test_result_store(self):
+        """A rerun skips the matches in the store, and the line a crash cut short"""
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "results.jsonl")
+            with open(path, "w") as f:
+                f.write(json.dumps({"id": "a:b:FOX:FOX:BATTLEFIELD:0", "winner": 1}) + "\n")
+                f.write("\n")
+                f.write(json.dumps({"winner": 2}) + "\n")
+                f.write('{"id": "a:b:FOX:FOX:BATTLEFIELD:1", "win')
+            store = ResultStore(path)
+            self.assertEqual(store.finished, {"a:b:FOX:FOX:BATTLEFIELD:0"})
+
+            with open(path, "a") as f:
+                f.write("\n")
+            store.add({"id": "a:b:FOX:FOX:BATTLEFIELD:1", "winner": 0})
+            self.assertEqual(
+                ResultStore(path).finished,
+                {"a:b:FOX:FOX:BATTLEFIELD:0", "a:b:FOX:FOX:BATTLEFIELD:1"}
+            )
+
+    def test_finish_stuck_match(self):
+        """A match that's killed takes its Dolphin with it, before its port and
+        temporary directory are handed on"""
+
+        context = multiprocessing.get_context("spawn")
+        with tempfile.TemporaryDirectory() as directory:
+            pid_path = os.path.join(directory, "dolphin.pid")
+            os.makedirs(os.path.join(directory, "0"))
+            leases = PortLeases(os.path.join(directory, "leases.json"), 52950, 52960)
+            port = leases.acquire()
+            process = context.Process(target=_stuck_match, args=(pid_path,), daemon=True)
+            process.start()
+            deadline = time.perf_counter() + 60.0
+            while not os.path.exists(pid_path) or not os.path.getsize(pid_path):
+                self.assertLess(time.perf_counter(), deadline, "match didn't start")
+                time.sleep(0.05)
+            with open(pid_path, "r") as f:
+                dolphin_pid = int(f.read())
+
+            parent_conn, child_conn = context.Pipe(duplex=False)
+            child_conn.close()
+            running = {process.sentinel: ({}, process, parent_conn, port, 0, time.time())}
+            tournament = types.SimpleNamespace(leases=leases, temp_dir=directory)
+            self.assertIsNone(Tournament._finish(tournament, running, process.sentinel))
+
+            with self.assertRaises(ProcessLookupError):
+                os.kill(dolphin_pid, 0)
+            self.assertFalse(os.path.exists(os.path.join(directory, "0")))
+            self.assertEqual(leases.held, set())
+
+
+class Leases(unittest.TestCase):
+    """
+    PortLeases handing out the ports of a small range
+    """
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._directory.name, "leases.json")
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def _write(self, leases):
+        with open(self.path, "w") as f:
+            json.dump(leases, f)
+
+    def test_exhaustion_and_release(self):
+        """Every port goes to one holder at a time, and comes free when released"""
+
+        leases = PortLeases(self.path, 52900, 52902)
+        ports = {leases.acquire(), leases.acquire()}
+        self.assertEqual(ports, {52900, 52901})
+        with self.assertRaises(OSError):
+            leases.acquire()
+        with self.assertRaises(OSError):
+            PortLeases(self.path, 52900, 52902).acquire()
+
+        leases.release(52901)
+        self.assertEqual(leases.held, {52900})
+        self.assertEqual(PortLeases(self.path, 52900, 52902).acquire(), 52901)
+
+    def test_expiry(self):
+        """Leases that ran out or whose process is gone are handed out again"""
+
+        dead = subprocess.Popen(["true"])
+        dead.wait()
+        self._write({
+            "52900": {"pid": os.getpid(), "expires": time.time() - 1.0},
+            "52901": {"pid": dead.pid, "expires": time.time() + 600.0},
+            "52902": {"pid": os.getpid(), "expires": time.time() + 600.0},
+        })
+        leases = PortLeases(self.path, 52900, 52903)
+        self.assertEqual(leases.acquire(), 52900)
+        self.assertEqual(leases.acquire(), 52901)
+        with self.assertRaises(OSError):
+            leases.acquire()
+
+        # renew sets the expiry of held leases lease_time from now
+        leases.lease_time = 0.0
+        leases.renew()
+        leases.lease_time = 600.0
+        time.sleep(0.01)
+        self.assertEqual(PortLeases(self.path, 52900, 52903).acquire(), 52900)
+
+
+class Results(unittest.TestCase):
+    """
+    ResultsDB's ratings, and what it reads of a tournament's results file
+    """
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.db = ResultsDB(os.path.join(self._directory.name, "results.sqlite"), k=32.0)
+
+    def tearDown(self):
+        self.db.close()
+        self._directory.cleanup()
+
+    @staticmethod
+    def _record(id, p1="a", p2="b", winner=1, **result):
+        record = {
+            "id": id, "p1": p1, "p2": p2, "p1_character": "FOX", "p2_character": "FALCO",
+            "stage": "BATTLEFIELD", "winner": winner, "reason": "game_rule", "frame": 2000,
+            "frames": 2124,
+        }
+        record.update(result)
+        return record
+
+    def _ratings(self):
+        return {row["agent"]: row for row in self.db.leaderboard()}
+
+    def test_expected_score(self):
+        self.assertAlmostEqual(expected_score(1500, 1500), 0.5)
+        self.assertAlmostEqual(expected_score(1900, 1500), 10 / 11)
+        self.assertAlmostEqual(expected_score(1500, 1900) + expected_score(1900, 1500), 1.0)
+
+    def test_elo(self):
+        """A game moves the ratings by K times the surprise, in opposite directions"""
+
+        self.assertTrue(self.db.add(self._record("0", winner=1)))
+        ratings = self._ratings()
+        self.assertAlmostEqual(ratings["a"]["rating"], 1516.0)
+        self.assertAlmostEqual(ratings["b"]["rating"], 1484.0)
+        self.assertEqual((ratings["a"]["wins"], ratings["b"]["losses"]), (1, 1))
+
+        # A draw pulls the ratings together by the same amount for both
+        self.assertTrue(self.db.add(self._record("1", p1="b", p2="a", winner=0)))
+        ratings = self._ratings()
+        change = 32.0 * (0.5 - expected_score(1484.0, 1516.0))
+        self.assertAlmostEqual(ratings["b"]["rating"], 1484.0 + change)
+        self.assertAlmostEqual(ratings["a"]["rating"], 1516.0 - change)
+        self.assertAlmostEqual(ratings["a"]["rating"] + ratings["b"]["rating"], 3000.0)
+        self.assertEqual((ratings["a"]["draws"], ratings["b"]["draws"]), (1, 1))
+
+        head_to_head = {row["opponent"]: row for row in self.db.head_to_head("a")}
+        self.assertEqual(head_to_head["b"]["games"], 2)
+
+    def test_add_again(self):
+        """A match that's already in the database changes nothing"""
+
+        self.assertTrue(self.db.add(self._record("0")))
+        ratings = self._ratings()
+        self.assertFalse(self.db.add(self._record("0", winner=2)))
+        self.assertEqual(self._ratings(), ratings)
+        self.assertEqual(len(self.db.matches("a")), 1)
+
+    def test_duration(self):
+        """Matches store their length in frames, also when the result only has the
+        last frame number"""
+
+        self.db.add(self._record("0"))
+        record = self._record("1")
+        del record["frames"]
+        self.db.add(record)
+        durations = {match["id"]: match["duration_frames"] for match in self.db.matches("a")}
+        self.assertEqual(durations, {"0": 2124, "1": 2124})
+
+    def test_add_jsonl(self):
+        """A results file is read from where the last call stopped, and a last line
+        that's still being written waits for the next call"""
+
+        path = os.path.join(self._directory.name, "results.jsonl")
+        line = lambda id: (json.dumps(self._record(id)) + "\n").encode()
+        with open(path, "wb") as f:
+            f.write(line("0") + b"{not json\n" + line("1") + line("2")[:20])
+        self.assertEqual(self.db.add_jsonl(path), 2)
+        self.assertEqual(self.db.add_jsonl(path), 0)
+
+        with open(path, "ab") as f:
+            f.write(line("2")[20:])
+        with mock.patch.object(self.db, "_insert", wraps=self.db._insert) as insert:
+            self.assertEqual(self.db.add_jsonl(path), 1)
+        # Only the new line was read
+        self.assertEqual([call.args[0]["id"] for call in insert.call_args_list], ["2"])
+        self.assertEqual(self._ratings()["a"]["games"], 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,485 @@
+import os
+import copy
+import json
+import time
+import fcntl
+import shutil
+import signal
+import socket
+import argparse
+import itertools
+import collections
+import multiprocessing
+from multiprocessing.connection import wait
+
+import yaml
+
+from results_db import ResultsDB
+
+
+def get_config(path: str) -> dict:
+    """
+    Get config
+
+    Args:
+    - path: str, path to config file
+
+    Returns:
+    - config: dict, config
+    """
+
+    with open(path, "r", encoding="utf-8") as f:
+        config = yaml.load(f, Loader=yaml.FullLoader)
+
+    return config
+
+
+class PortLeases:
+    """
+    Hands out UDP ports for Slippi, so matches running at once never share one
+
+    Leases are kept in a JSON file that every tournament on the machine shares, locked
+    while it's read and written. A lease belongs to a process and runs out after
+    lease_time seconds unless it's renewed, so the ports of a tournament that crashed
+    come free again once its process is gone or its leases have run out.
+    """
+
+    def __init__(self, path, start=51441, end=52441, lease_time=600.0):
+        """
+        Args:
+        - path: str, the lease file. Created if needed
+        - start, end: int, the range of ports to hand out, end excluded
+        - lease_time: float, seconds a lease lasts without being renewed
+        """
+
+        self.path = path
+        self.start = start
+        self.end = end
+        self.lease_time = lease_time
+        self.held = set()
+
+    def _update(self, change):
+        """Run change(leases) on the lease file's contents with the file locked"""
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        with open(self.path + ".lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    leases = json.load(f)
+            except (FileNotFoundError, ValueError):
+                leases = {}
+            result = change(leases)
+            temp_path = f"{self.path}.{os.getpid()}"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(leases, f)
+            os.replace(temp_path, self.path)
+        return result
+
+    @staticmethod
+    def _expired(lease, now):
+        if lease["expires"] < now:
+            return True
+        try:
+            os.kill(lease["pid"], 0)
+        except ProcessLookupError:
+            return True
+        except PermissionError:
+            pass
+        return False
+
+    @staticmethod
+    def _bindable(port):
+        """Whether nothing outside the leases is using the port either"""
+
+        try:
+            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+                sock.bind(("", port))
+            return True
+        except OSError:
+            return False
+
+    def acquire(self):
+        """
+        Lease a free port
+
+        Returns:
+        - port: int
+        """
+
+        def change(leases):
+            now = time.time()
+            for port in range(self.start, self.end):
+                lease = leases.get(str(port))
+                if lease is not None and not self._expired(lease, now):
+                    continue
+                if not self._bindable(port):
+                    continue
+                leases[str(port)] = {"pid": os.getpid(), "expires": now + self.lease_time}
+                return port
+            raise OSError(f"no free port between {self.start} and {self.end}")
+
+        port = self._update(change)
+        self.held.add(port)
+        return port
+
+    def renew(self):
+        """Extend every lease this object holds by lease_time"""
+
+        def change(leases):
+            expires = time.time() + self.lease_time
+            for port in self.held:
+                leases[str(port)] = {"pid": os.getpid(), "expires": expires}
+
+        if self.held:
+            self._update(change)
+
+    def release(self, port):
+        """Give a port back"""
+
+        def change(leases):
+            lease = leases.get(str(port))
+            if lease is not None and lease["pid"] == os.getpid():
+                del leases[str(port)]
+
+        self.held.discard(port)
+        self._update(change)
+
+
+class ResultStore:
+    """
+    Finished matches, one JSON line each, appended as they finish
+
+    Every line is flushed to disk before the next match starts, so after a crash the
+    file holds every match that finished, and resuming skips them.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.finished = set()
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        self.finished.add(json.loads(line)["id"])
+                    except (ValueError, KeyError):
+                        # A line cut short by a crash while it was written
+                        continue
+
+    def add(self, record):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.finished.add(record["id"])
+
+
+def expand_matches(spec):
+    """
+    Expand a tournament spec into its queue of matches
+
+    Every pair of agents plays every combination of characters on every stage,
+    spec["games"] times, swapping sides every other game.
+
+    Args:
+    - spec: dict, the tournament spec
+
+    Returns:
+    - matches: list of dict, each with a unique id, the agent names and characters of
+      p1 and p2, the stage and the game number
+    """
+
+    matches = []
+    characters = spec["characters"]
+    for first, second in itertools.combinations(sorted(spec["agents"]), 2):
+        for first_character, second_character in itertools.product(characters, repeat=2):
+            for stage in spec["stages"]:
+                for game in range(spec.get("games", 1)):
+                    p1, p2 = first, second
+                    p1_character, p2_character = first_character, second_character
+                    if game % 2 == 1:
+                        p1, p2 = second, first
+                        p1_character, p2_character = second_character, first_character
+                    matches.append({
+                        "id": f"{first}:{second}:{first_character}:{second_character}:{stage}:{game}",
+                        "p1": p1,
+                        "p2": p2,
+                        "p1_character": p1_character,
+                        "p2_character": p2_character,
+                        "stage": stage,
+                        "game": game,
+                    })
+
+    return matches
+
+
+def _kill_group(pgid, timeout=10.0):
+    """
+    Kill every process left in a match's process group, and wait for them to be gone
+
+    Args:
+    - pgid: int, the process group, which is the match process's pid
+    - timeout: float, seconds to wait for the processes to be gone
+    """
+
+    try:
+        os.killpg(pgid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        return
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            os.killpg(pgid, 0)
+        except (ProcessLookupError, PermissionError):
+            return
+        time.sleep(0.05)
+    print(f"[Log] Processes of group {pgid} are still around after {timeout:.0f}s")
+
+
+def _match_main(config, log_path, temp_dir, conn):
+    """
+    Body of a match's process: play the game and send back matchmaker.main's result
+
+    Everything the match and its Dolphin print goes to the match's log file, and every
+    temporary directory it makes, like Dolphin's home directory, goes into temp_dir.
+    The match gets a process group of its own, which its Dolphin and sandboxed agents
+    join, so they can all be killed together.
+    """
+
+    os.setsid()
+    os.makedirs(temp_dir, exist_ok=True)
+    os.environ["TMPDIR"] = temp_dir
+    import tempfile
+    tempfile.tempdir = temp_dir
+
+    log = open(log_path, "a", encoding="utf-8")
+    os.dup2(log.fileno(), 1)
+    os.dup2(log.fileno(), 2)
+
+    import matchmaker
+    conn.send(matchmaker.main(config))
+    conn.close()
+
+
+class Tournament:
+    """
+    Runs the match queue of a tournament spec, several matches at once
+
+    Every match is its own process, with its own Slippi port leased from PortLeases,
+    its own temporary directory for Dolphin and its own log file. Results go to a
+    ResultStore as each match finishes, and a rerun of the same spec skips the matches
+    already in there. They're also added to a ResultsDB, which keeps the agents' Elo
+    ratings.
+    """
+
+    def __init__(self, spec):
+        """
+        Args:
+        - spec: dict, the tournament spec. See tournament_config.yaml
+        """
+
+        self.spec = spec
+        self.base_config = get_config(spec["base_config"])
+        self.work_dir = spec.get("work_dir", "./tournament")
+        self.log_dir = os.path.join(self.work_dir, "logs")
+        self.temp_dir = os.path.join(self.work_dir, "tmp")
+        os.makedirs(self.log_dir, exist_ok=True)
+        os.makedirs(self.temp_dir, exist_ok=True)
+
+        self.store = ResultStore(os.path.join(self.work_dir, "results.jsonl"))
+        self.db = ResultsDB(
+            spec.get("results_db", os.path.join(self.work_dir, "results.sqlite")),
+            k=spec.get("elo_k", 32.0)
+        )
+        if os.path.exists(self.store.path):
+            # Catch up on results that made it to the store but not the database
+            #   before a crash
+            self.db.add_jsonl(self.store.path)
+        port_range = spec.get("port_range", [51441, 52441])
+        self.leases = PortLeases(
+            spec.get("lease_file", "/tmp/melee_port_leases.json"),
+            port_range[0],
+            port_range[1],
+            spec.get("lease_time", 600.0)
+        )
+        self.parallel = spec.get("parallel", 1)
+        self.devices = spec.get("devices", ["cuda:0", "cuda:1"])
+        self.match_timeout = spec.get("match_timeout", 1800.0)
+        self.retries = spec.get("retries", 1)
+        # Spawned, since CUDA can't be used in a forked child
+        self._context = multiprocessing.get_context("spawn")
+
+    def match_config(self, match, port, slot):
+        """The matchmaker config of a match, on the given port and device slot"""
+
+        config = copy.deepcopy(self.base_config)
+        agents = self.spec["agents"]
+        config.update({
+            "p1_agent_config_path": agents[match["p1"]],
+            "p2_agent_config_path": agents[match["p2"]],
+            "p1_character": match["p1_character"],
+            "p2_character": match["p2_character"],
+            "stage": match["stage"],
+            "port": port,
+            "p1_device": self.devices[(2 * slot) % len(self.devices)],
+            "p2_device": self.devices[(2 * slot + 1) % len(self.devices)],
+        })
+        if config.get("save_replays"):
+            config["replay_dir"] = os.path.abspath(
+                os.path.join(self.work_dir, "replays", match["id"].replace(":", "_"))
+            )
+        return config
+
+    def _launch(self, match, slot):
+        """Start a match's process on a device slot, with a freshly leased port"""
+
+        port = self.leases.acquire()
+        parent_conn, child_conn = self._context.Pipe(duplex=False)
+        process = self._context.Process(
+            target=_match_main,
+            args=(
+                self.match_config(match, port, slot),
+                os.path.join(self.log_dir, match["id"].replace(":", "_") + ".log"),
+                os.path.join(self.temp_dir, str(slot)),
+                child_conn
+            ),
+            daemon=True
+        )
+        process.start()
+        child_conn.close()
+        return process, parent_conn, port
+
+    def _finish(self, running, sentinel):
+        """
+        Clean up after a match's process, which has exited or is killed now
+
+        Returns:
+        - result: dict, what matchmaker.main returned, or None if the match failed
+        """
+
+        match, process, conn, port, slot, started = running.pop(sentinel)
+        # A match that timed out or crashed leaves its Dolphin and agents running, and
+        #   nothing else stops them. They're all in the match's process group, and go
+        #   before the port and temporary directory they use are handed on
+        if process.is_alive():
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                # Killed before it got to os.setsid
+                process.kill()
+        process.join()
+        _kill_group(process.pid)
+        try:
+            result = conn.recv() if conn.poll() else None
+        except (EOFError, OSError):
+            result = None
+        conn.close()
+        self.leases.release(port)
+        shutil.rmtree(os.path.join(self.temp_dir, str(slot)), ignore_errors=True)
+        return result
+
+    def run(self):
+        """
+        Play every match that isn't in the results yet
+
+        Returns:
+        - games_per_hour: float, the rate the matches of this run finished at
+        """
+
+        queue = collections.deque(
+            match for match in expand_matches(self.spec) if match["id"] not in self.store.finished
+        )
+        total = len(queue)
+        print(f"[Log] {len(self.store.finished)} matches already finished, {total} to play")
+
+        attempts = collections.Counter()
+        # Process sentinel -> (match, process, connection, port, device slot, start time)
+        running = {}
+        free_slots = list(range(self.parallel))
+        finished = 0
+        failed = 0
+        start_time = time.time()
+        last_renewal = start_time
+
+        try:
+            while queue or running:
+                while queue and free_slots:
+                    match = queue.popleft()
+                    slot = free_slots.pop(0)
+                    process, conn, port = self._launch(match, slot)
+                    attempts[match["id"]] += 1
+                    running[process.sentinel] = (match, process, conn, port, slot, time.time())
+
+                wait(list(running), timeout=5.0)
+
+                now = time.time()
+                if now - last_renewal > self.leases.lease_time / 3:
+                    self.leases.renew()
+                    last_renewal = now
+
+                for sentinel in list(running):
+                    match, process, _, _, slot, started = running[sentinel]
+                    if process.is_alive():
+                        if now - started < self.match_timeout:
+                            continue
+                        print(f"[Log] Match {match['id']} timed out after {now - started:.0f}s")
+                    result = self._finish(running, sentinel)
+                    free_slots.append(slot)
+
+                    if result is None:
+                        failed += 1
+                        retry = attempts[match["id"]] <= self.retries
+                        print(
+                            f"[Log] Match {match['id']} failed, exit code {process.exitcode}, "
+                            f"{'retrying' if retry else 'giving up'}"
+                        )
+                        if retry:
+                            queue.append(match)
+                        continue
+
+                    record = dict(match)
+                    record.update(result)
+                    record["seconds"] = now - started
+                    record["finished_at"] = now
+                    self.store.add(record)
+                    self.db.add(record)
+                    finished += 1
+                    games_per_hour = finished / max(now - start_time, 1e-9) * 3600
+                    print(
+                        f"[Log] {finished}/{total} finished, {match['id']}: "
+                        f"winner p{result['winner']} ({games_per_hour:.1f} games/hour)"
+                    )
+        finally:
+            # Whether it's done or interrupted, nothing is left running or leased
+            for sentinel in list(running):
+                self._finish(running, sentinel)
+
+        elapsed = time.time() - start_time
+        games_per_hour = finished / max(elapsed, 1e-9) * 3600
+        print(
+            f"[Log] Tournament finished: {finished} games in {elapsed / 3600:.2f} hours, "
+            f"{games_per_hour:.1f} games/hour, {failed} failed attempts"
+        )
+        for rank, row in enumerate(self.db.leaderboard(), start=1):
+            print(
+                f"[Log] {rank:>3}. {row['agent']} {row['rating']:.1f} "
+                f"({row['wins']}-{row['losses']}-{row['draws']})"
+            )
+        return games_per_hour
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a round robin tournament")
+    parser.add_argument(
+        "--config_path",
+        type=str,
+        default="./tournament_config.yaml",
+        help="Path to tournament spec"
+    )
+    args = parser.parse_args()
+
+    Tournament(get_config(args.config_path)).run()
@@ -0,0 +1,801 @@
+#!/usr/bin/python3
+"""Micro-benchmarks for the hot paths of libmelee
+
+Run from the libmelee directory, for example:
+    python3 benchmark.py decode
+"""
+import argparse
+import asyncio
+import csv
+import io
+import os
+import random
+import shutil
+import socket
+import tempfile
+import time
+
+import numpy as np
+
+from melee import enums, eventdecoder, framedata, hometemplate, mockdolphin, staticdata
+from melee.console import Console
+from melee.controller import Controller
+from melee.framedata import FrameData
+from melee.gamestate import PlayerState
+from melee.replayserver import ReplayServer
+from melee.slpfilestreamer import SLPFileStreamer
+
+PRE_FRAME = 0x37
+POST_FRAME = 0x38
+
+
+def _frame_events(path):
+    """Returns (contents, eventsize, [(command, offset)]) for every event in an SLP file"""
+    streamer = SLPFileStreamer(path)
+    if not streamer.connect():
+        raise SystemExit("Could not read SLP file: " + path)
+    contents = streamer._contents
+    eventsize = [0] * 0x100
+    payload_size = contents[1]
+    for cursor in range(0x2, payload_size, 3):
+        command = contents[cursor]
+        eventsize[command] = ((contents[cursor + 1] << 8) | contents[cursor + 2]) + 1
+    events = []
+    index = payload_size + 1
+    while index < len(contents):
+        command = contents[index]
+        if eventsize[command] == 0:
+            break
+        events.append((command, index))
+        index += eventsize[command]
+    return contents, eventsize, events
+
+
+def _legacy_post_frame(event_bytes):
+    """Per-field numpy reads, the way post-frame events used to be decoded"""
+    values = []
+    for fmt, offset in [
+        (">i", 0x1), (">B", 0x5), (">B", 0x6), (">f", 0xA), (">f", 0xE), (">B", 0x7),
+        (">H", 0x8), (">f", 0x12), (">f", 0x16), (">f", 0x1A), (">B", 0x21),
+        (">f", 0x22), (">B", 0x29), (">f", 0x2B), (">B", 0x2F), (">B", 0x32),
+        (">B", 0x34), (">f", 0x35), (">f", 0x39), (">f", 0x3D), (">f", 0x41),
+        (">f", 0x45), (">f", 0x49), (">f", 0x51), (">f", 0x55), (">f", 0x59),
+        (">f", 0x5D), (">f", 0x61), (">f", 0x65), (">f", 0x69), (">f", 0x6D),
+        (">f", 0x71), (">f", 0x75),
+    ]:
+        try:
+            values.append(np.ndarray((1,), fmt, event_bytes, offset)[0])
+        except TypeError:
+            values.append(0)
+    return values
+
+
+def _legacy_pre_frame(event_bytes):
+    """Per-field numpy reads, the way pre-frame events used to be decoded"""
+    values = []
+    for fmt, offset in [
+        (">B", 0x5), (">B", 0x6), (">f", 0x19), (">f", 0x1D), (">f", 0x21),
+        (">f", 0x25), (">b", 0x3B), (">b", 0x40), (">f", 0x29), (">H", 0x31),
+    ]:
+        try:
+            values.append(np.ndarray((1,), fmt, event_bytes, offset)[0])
+        except TypeError:
+            values.append(0)
+    return values
+
+
+def _time(function, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_decode(args):
+    """Per-frame cost of decoding the pre-frame and post-frame events"""
+    contents, eventsize, events = _frame_events(args.path)
+    frame_events = [(c, i) for c, i in events if c in (PRE_FRAME, POST_FRAME)]
+    frames = len(
+        {
+            int.from_bytes(contents[i + 1 : i + 5], "big", signed=True)
+            for c, i in frame_events
+            if c == POST_FRAME
+        }
+    )
+    sliced = [(c, contents[i : i + eventsize[c]]) for c, i in frame_events]
+
+    def legacy():
+        for command, event_bytes in sliced:
+            if command == POST_FRAME:
+                _legacy_post_frame(event_bytes)
+            else:
+                _legacy_pre_frame(event_bytes)
+
+    def compiled():
+        for command, offset in frame_events:
+            if command == POST_FRAME:
+                eventdecoder.POST_FRAME.decode(contents, offset, eventsize[command])
+            else:
+                eventdecoder.PRE_FRAME.decode(contents, offset, eventsize[command])
+
+    before = _time(legacy, args.repeat)
+    after = _time(compiled, args.repeat)
+    print("%d frames, %d pre/post-frame events" % (frames, len(frame_events)))
+    print("numpy per-field: %8.2f us/frame" % (before / frames * 1e6))
+    print("struct decoder:  %8.2f us/frame" % (after / frames * 1e6))
+    print("speedup:         %8.1fx" % (before / after))
+
+
+class _CountingPipe(io.RawIOBase):
+    """Stands in for the Dolphin pipe, counting write syscalls and bytes"""
+
+    def __init__(self):
+        self.writes = 0
+        self.bytes = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.writes += 1
+        self.bytes += len(data)
+        return len(data)
+
+
+class _LegacyController(Controller):
+    """Writes every command to the pipe as it's made, like controllers used to"""
+
+    def _write(self, command):
+        self.pipe.write(command)
+
+    def _send(self):
+        self.pipe.flush()
+
+
+_AGENT_BUTTONS = [
+    enums.Button.BUTTON_A,
+    enums.Button.BUTTON_B,
+    enums.Button.BUTTON_X,
+    enums.Button.BUTTON_Y,
+    enums.Button.BUTTON_Z,
+]
+
+
+def _agent_inputs(path, frames):
+    """Per-frame actions in the example agents' format, taken from a replay's inputs
+
+    [A, B, X, Y, Z, digital L, digital R, main x, main y, c x, c y, L, R], sticks -1..1
+    """
+    console = Console(system="file", path=path, allow_old_version=True)
+    console.connect()
+    inputs = []
+    while len(inputs) < frames:
+        gamestate = console.step()
+        if gamestate is None:
+            break
+        for player in gamestate.players.values():
+            state = player.controller_state
+            inputs.append(
+                [state.button[button] for button in _AGENT_BUTTONS]
+                + [state.button[enums.Button.BUTTON_L], state.button[enums.Button.BUTTON_R]]
+                + [(value - 0.5) * 2 for value in state.main_stick + state.c_stick]
+                + [state.l_shoulder, state.r_shoulder]
+            )
+            break
+    return inputs
+
+
+def _random_inputs(frames, hold):
+    """Random actions, each held for `hold` frames"""
+    rng = random.Random(0)
+    inputs = []
+    while len(inputs) < frames:
+        action = [rng.random() < 0.2 for _ in range(7)]
+        action += [rng.choice([-1, 0, 1]) for _ in range(4)] + [0, 0]
+        inputs.extend([action] * hold)
+    return inputs[:frames]
+
+
+def _apply(controller, action):
+    """Apply an action the way melee_env's ControlState does"""
+    controller.release_all()
+    for button, pressed in zip(_AGENT_BUTTONS, action):
+        if pressed:
+            controller.press_button(button)
+    controller.tilt_analog_unit(enums.Button.BUTTON_MAIN, action[7], action[8])
+    controller.tilt_analog_unit(enums.Button.BUTTON_C, action[9], action[10])
+    if action[5]:
+        controller.press_button(enums.Button.BUTTON_L)
+    else:
+        controller.press_shoulder(enums.Button.BUTTON_L, action[11])
+    if action[6]:
+        controller.press_button(enums.Button.BUTTON_R)
+    else:
+        controller.press_shoulder(enums.Button.BUTTON_R, action[12])
+
+
+def bench_controller(args):
+    """Bytes and write syscalls per frame sent down the controller pipe"""
+    agents = {
+        "replay inputs": _agent_inputs(args.path, 1000),
+        "random, held 1": _random_inputs(1000, 1),
+        "random, held 8": _random_inputs(1000, 8),
+    }
+    home = tempfile.mkdtemp(prefix="libmelee_bench_") + "/"
+    os.makedirs(home + "Config")
+    with open(home + "Config/Dolphin.ini", "w") as dolphinfile:
+        dolphinfile.write("[Core]\n")
+    console = Console(system="dolphin", dolphin_home_path=home, tmp_home_directory=False)
+    modes = [
+        ("per command", _LegacyController, {}),
+        ("batched", Controller, {}),
+        ("batched+diff", Controller, {"diff_input": True}),
+    ]
+    print("%-15s %-13s %9s %9s %9s" % ("agent", "input", "bytes/f", "writes/f", "us/f"))
+    for agent, inputs in agents.items():
+        for mode, cls, kwargs in modes:
+            controller = cls(console=console, port=1, **kwargs)
+            pipe = _CountingPipe()
+            controller.pipe = io.TextIOWrapper(io.BufferedWriter(pipe))
+
+            def run():
+                for action in inputs:
+                    _apply(controller, action)
+                    controller.flush()
+
+            elapsed = _time(run, args.repeat)
+            frames = len(inputs) * args.repeat
+            print(
+                "%-15s %-13s %9.1f %9.2f %9.2f"
+                % (
+                    agent,
+                    mode,
+                    pipe.bytes / frames,
+                    pipe.writes / frames,
+                    elapsed / len(inputs) * 1e6,
+                )
+            )
+            controller.pipe = None
+    shutil.rmtree(home)
+
+
+def bench_actions(args):
+    """Per-frame cost of applying a discrete action, through melee_env's ControlState or
+    a precompiled ActionTable. Needs melee_env importable"""
+    from melee_env.agents.util import ActionSpace, ActionTable
+
+    space = ActionSpace()
+    table = ActionTable(space)
+    actions = np.random.RandomState(0).randint(space.size, size=1000)
+    home = tempfile.mkdtemp(prefix="libmelee_bench_") + "/"
+    os.makedirs(home + "Config")
+    with open(home + "Config/Dolphin.ini", "w") as dolphinfile:
+        dolphinfile.write("[Core]\n")
+    console = Console(system="dolphin", dolphin_home_path=home, tmp_home_directory=False)
+    print("%-13s %-6s %9s %9s" % ("actions", "diff", "bytes/f", "us/f"))
+    for name, apply in (
+        ("ControlState", lambda action, controller: space(action)(controller)),
+        ("ActionTable", lambda action, controller: table(action)(controller)),
+    ):
+        for diff_input in (False, True):
+            controller = Controller(console=console, port=1, diff_input=diff_input)
+            pipe = _CountingPipe()
+            controller.pipe = io.TextIOWrapper(io.BufferedWriter(pipe))
+
+            def run():
+                for action in actions:
+                    apply(action, controller)
+                    controller.flush()
+
+            elapsed = _time(run, args.repeat)
+            print(
+                "%-13s %-6s %9.1f %9.2f"
+                % (name, diff_input, pipe.bytes / (len(actions) * args.repeat), elapsed / len(actions) * 1e6)
+            )
+            controller.pipe = None
+    shutil.rmtree(home)
+
+
+def bench_startup(args):
+    """Construction time of a Console and a FrameData, with and without the data cache"""
+    has_framedata = os.path.isfile(os.path.join(staticdata.PATH, "framedata.csv"))
+    if not has_framedata:
+        print("framedata.csv not found, timing Console only")
+    cache_dir = tempfile.mkdtemp()
+    previous = os.environ.get("LIBMELEE_CACHE_DIR")
+    os.environ["LIBMELEE_CACHE_DIR"] = cache_dir
+
+    def construct():
+        Console(system="file", path=args.path)
+        if has_framedata:
+            FrameData()
+
+    def cold():
+        staticdata.clear(disk=True)
+        construct()
+
+    def disk():
+        staticdata.clear()
+        construct()
+
+    print("%-32s %9s" % ("", "ms"))
+    for name, function in (
+        ("cold (parse CSVs, write cache)", cold),
+        ("new process (load cache)", disk),
+        ("warm (shared in process)", construct),
+    ):
+        print("%-32s %9.2f" % (name, _time(function, args.repeat) * 1e3))
+    if previous is None:
+        del os.environ["LIBMELEE_CACHE_DIR"]
+    else:
+        os.environ["LIBMELEE_CACHE_DIR"] = previous
+    staticdata.clear()
+    shutil.rmtree(cache_dir)
+
+
+def _synthetic_framedata(path, actions=60, frames=40):
+    """Write a frame data CSV with the given number of attacks per character, each
+    with random hitboxes over its frames"""
+    fields = ["character", "action", "frame"]
+    for i in range(1, 5):
+        fields += ["hitbox_%d_%s" % (i, name) for name in ("status", "size", "x", "y")]
+    fields += ["locomotion_x", "locomotion_y", "iasa", "facing_changed", "projectile"]
+    rng = random.Random(0)
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fields)
+        writer.writeheader()
+        for character in enums.Character:
+            if character.value > 0x20:
+                continue
+            for action in rng.sample(list(enums.Action)[:0x150], actions):
+                start = rng.randint(2, frames // 2)
+                for frame in range(1, frames + 1):
+                    row = {"character": character.value, "action": action.value, "frame": frame,
+                           "locomotion_x": rng.random(), "locomotion_y": 0.0,
+                           "iasa": frame > frames - 5, "facing_changed": False, "projectile": False}
+                    for i in range(1, 5):
+                        active = start <= frame < start + 4 and rng.random() < 0.5
+                        row.update({"hitbox_%d_status" % i: active, "hitbox_%d_size" % i: rng.uniform(1, 10),
+                                    "hitbox_%d_x" % i: rng.uniform(-10, 20), "hitbox_%d_y" % i: rng.uniform(0, 20)})
+                    writer.writerow(row)
+
+
+def _has_hitbox(frame):
+    return (
+        frame["hitbox_1_status"] or frame["hitbox_2_status"] or frame["hitbox_3_status"]
+        or frame["hitbox_4_status"] or frame["projectile"]
+    )
+
+
+def _legacy_first_hitbox_frame(data, character, action):
+    """Scan every frame of the action, the way FrameData used to"""
+    hitboxes = [f for f, frame in data[character][action].items() if frame and _has_hitbox(frame)]
+    return min(hitboxes) if hitboxes else -1
+
+
+def _legacy_last_hitbox_frame(data, character, action):
+    hitboxes = [f for f, frame in data[character][action].items() if frame and _has_hitbox(frame)]
+    return max(hitboxes) if hitboxes else -1
+
+
+def _legacy_iasa(data, character, action):
+    frames = data[character][action]
+    iasa = [f for f, frame in frames.items() if frame and frame["iasa"]]
+    return min(iasa) if iasa else max(frames)
+
+
+def _legacy_range_forward(data, character, action, action_frame):
+    """Loop over the remaining frames' hitboxes, the way FrameData used to"""
+    attackrange = 0
+    for i in range(action_frame + 1, _legacy_last_hitbox_frame(data, character, action) + 1):
+        frame = data[character][action].get(i)
+        if frame is None:
+            continue
+        for box in range(1, 5):
+            if frame["hitbox_%d_status" % box]:
+                attackrange = max(frame["hitbox_%d_size" % box] + frame["hitbox_%d_x" % box], attackrange)
+    return attackrange
+
+
+def bench_framedata(args):
+    """Per-query cost of the attack lookups an agent makes each frame, scanning the
+    frames of an action against reading its precomputed summaries"""
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "framedata.csv")
+    _synthetic_framedata(path)
+    tables = framedata._compile_framedata(path)
+    shutil.rmtree(directory)
+    staticdata._loaded["framedata.csv"] = tables
+    data = FrameData()
+    nested = data.framedata
+    staticdata.clear()
+
+    rng = random.Random(1)
+    slots = [(c, a) for c in nested for a in nested[c]]
+    queries = [rng.choice(slots) + (rng.randint(0, 40),) for _ in range(10000)]
+
+    def legacy():
+        for character, action, frame in queries:
+            _legacy_first_hitbox_frame(nested, character, action)
+            _legacy_iasa(nested, character, action)
+            _legacy_range_forward(nested, character, action, frame)
+
+    def compiled():
+        for character, action, frame in queries:
+            data.first_hitbox_frame(character, action)
+            data.iasa(character, action)
+            data.range_forward(character, action, frame)
+
+    before = _time(legacy, args.repeat)
+    after = _time(compiled, args.repeat)
+    print("%d actions, %d queries of first_hitbox_frame, iasa and range_forward" % (len(slots), len(queries)))
+    print("frame scans:  %8.2f us/query" % (before / len(queries) * 1e6))
+    print("tables:       %8.2f us/query" % (after / len(queries) * 1e6))
+    print("speedup:      %8.1fx" % (before / after))
+
+
+def bench_gamestate(args):
+    """Per-frame cost of stepping through a file, with new or reused gamestates"""
+    for reuse in (False, True):
+        frames = []
+
+        def run():
+            console = Console(system="file", path=args.path, reuse_gamestates=reuse)
+            console.connect()
+            count = 0
+            while console.step() is not None:
+                count += 1
+            frames.append(count)
+
+        elapsed = _time(run, args.repeat)
+        print(
+            "%-18s %8.2f us/frame"
+            % ("reuse_gamestates" if reuse else "new gamestates", elapsed / frames[-1] * 1e6)
+        )
+
+
+_OBSERVATION_FIELDS = ("x", "y", "percent", "stock", "action", "action_frame", "jumps_left")
+
+
+def _observe_players(gamestate):
+    return np.array(
+        [
+            [
+                player.position.x,
+                player.position.y,
+                player.percent,
+                player.stock,
+                player.action.value,
+                player.action_frame,
+                player.jumps_left,
+            ]
+            for player in gamestate.players.values()
+        ],
+        dtype=np.float32,
+    )
+
+
+def _observe_columns(gamestate):
+    return gamestate.columns.observation(fields=_OBSERVATION_FIELDS)
+
+
+def bench_array_mirror(args):
+    """Per-frame cost of stepping a file with and without array_mirror, and of building an
+    observation array every frame from the PlayerStates or from the columns"""
+    print("%-10s %-14s %9s" % ("mode", "observation", "us/frame"))
+    cases = (
+        (False, "none", None),
+        (True, "none", None),
+        (False, "PlayerState", _observe_players),
+        (True, "columns", _observe_columns),
+    )
+    for array_mirror, name, observe in cases:
+        frames = []
+
+        def run():
+            console = Console(system="file", path=args.path, array_mirror=array_mirror)
+            console.connect()
+            count = 0
+            while True:
+                gamestate = console.step()
+                if gamestate is None:
+                    break
+                if observe is not None:
+                    observe(gamestate)
+                count += 1
+            frames.append(count)
+
+        elapsed = _time(run, args.repeat)
+        print(
+            "%-10s %-14s %9.2f"
+            % ("mirror" if array_mirror else "plain", name, elapsed / frames[-1] * 1e6)
+        )
+
+
+def bench_timings(args):
+    """Per-frame cost of stepping through a file with timings off and on, then the
+    per-phase breakdown of the last timed run"""
+    consoles = []
+    for timed in (False, True):
+        frames = []
+
+        def run():
+            console = Console(system="file", path=args.path, timings=timed)
+            console.connect()
+            count = 0
+            while console.step() is not None:
+                count += 1
+            frames.append(count)
+            consoles.append(console)
+
+        elapsed = _time(run, args.repeat)
+        print(
+            "%-12s %8.2f us/frame"
+            % ("timings on" if timed else "timings off", elapsed / frames[-1] * 1e6)
+        )
+    print()
+    print("%-8s %8s %8s %8s %8s" % ("phase", "mean", "p50", "p99", "max"))
+    for phase, stats in consoles[-1].timings.summary().items():
+        print(
+            "%-8s %8.2f %8.2f %8.2f %8.2f"
+            % (phase, stats["mean_us"], stats["p50_us"], stats["p99_us"], stats["max_us"])
+        )
+
+
+async def _stream_replays(args, streams, frames_per_message=1, batched=True):
+    """Stream the replay from a ReplayServer to each of the given number of consoles,
+    all on one event loop
+
+    Returns:
+        (seconds taken, frames received in total, list of latencies in ns)
+    """
+    servers = [
+        ReplayServer(args.path, port=0, fps=args.fps, frames_per_message=frames_per_message)
+        for _ in range(streams)
+    ]
+    tasks = [asyncio.ensure_future(server.serve_async()) for server in servers]
+    consoles = [
+        Console(system="dolphin", tmp_home_directory=False, slippi_port=server.port)
+        for server in servers
+    ]
+    for console in consoles:
+        console._batched = batched
+    connected = await asyncio.gather(*[console.connect_async() for console in consoles])
+    assert all(connected), "could not connect to the replay servers"
+    latencies = []
+
+    async def watch(console, server):
+        frames = 0
+        sent_ns = None
+        while True:
+            gamestate = await console.step_async()
+            if gamestate is None:
+                return frames
+            received = time.perf_counter_ns()
+            if sent_ns is None:
+                sent_ns = next(iter(server.streams.values())).sent_ns
+            latencies.append(received - sent_ns[gamestate.frame])
+            frames += 1
+
+    start = time.perf_counter()
+    frames = await asyncio.gather(
+        *[watch(console, server) for console, server in zip(consoles, servers)]
+    )
+    elapsed = time.perf_counter() - start
+    for task, server in zip(tasks, servers):
+        task.cancel()
+        server.close()
+    for console in consoles:
+        console._slippstream.shutdown()
+    return elapsed, sum(frames), latencies
+
+
+def bench_async(args):
+    """Drive several consoles at once from a single thread with step_async(), each one
+    receiving the replay over ENet from its own ReplayServer. The servers run on the
+    same thread, so their time counts against the consoles too"""
+    print(
+        "%-8s %9s %10s %14s %9s %9s"
+        % ("streams", "seconds", "frames/s", "us/frame each", "p50 us", "p99 us")
+    )
+    for streams in sorted({1, max(args.streams // 2, 1), args.streams}):
+        elapsed, frames, latencies = asyncio.run(_stream_replays(args, streams))
+        latencies = np.array(latencies) / 1000
+        print(
+            "%-8d %9.3f %10.0f %14.2f %9.1f %9.1f"
+            % (
+                streams,
+                elapsed,
+                frames / elapsed,
+                elapsed / frames * 1e6,
+                np.percentile(latencies, 50),
+                np.percentile(latencies, 99),
+            )
+        )
+
+
+def bench_batch(args):
+    """Per-frame cost of receiving a replay over ENet one message at a time, against
+    draining every queued message in one batch, with one or more frames per message"""
+    print("%-16s %-10s %14s" % ("frames/message", "receive", "us/frame each"))
+    for frames_per_message in (1, 4):
+        for batched in (False, True):
+            runs = [
+                asyncio.run(_stream_replays(args, args.streams, frames_per_message, batched))
+                for _ in range(args.repeat)
+            ]
+            print(
+                "%-16d %-10s %14.2f"
+                % (
+                    frames_per_message,
+                    "batched" if batched else "single",
+                    min(elapsed / frames for elapsed, frames, _ in runs) * 1e6,
+                )
+            )
+
+
+# Every public PlayerState field, for the agent that reads everything
+_ALL_FIELDS = [name for name in PlayerState.__slots__ if not name.startswith("_")]
+
+
+def _read_few(gamestate):
+    for player in gamestate.players.values():
+        player.position, player.action, player.percent, player.stock
+
+
+def _read_all(gamestate):
+    for player in gamestate.players.values():
+        for name in _ALL_FIELDS:
+            getattr(player, name)
+
+
+def bench_lazy(args):
+    """Per-frame cost of stepping a file and reading player fields, eager or lazy"""
+    print("%-14s %-6s %9s" % ("agent", "mode", "us/frame"))
+    for agent, read in (("read 4 fields", _read_few), ("read all", _read_all)):
+        for lazy in (False, True):
+            frames = []
+
+            def run():
+                console = Console(system="file", path=args.path, lazy_decoding=lazy)
+                console.connect()
+                count = 0
+                while True:
+                    gamestate = console.step()
+                    if gamestate is None:
+                        break
+                    read(gamestate)
+                    count += 1
+                frames.append(count)
+
+            elapsed = _time(run, args.repeat)
+            print(
+                "%-14s %-6s %9.2f"
+                % (agent, "lazy" if lazy else "eager", elapsed / frames[-1] * 1e6)
+            )
+
+
+def _fake_user_directory(path):
+    """A Dolphin user directory with the usual bulk: configs, game settings, a Wii NAND,
+    and replays, caches and shaders from earlier runs"""
+    rng = random.Random(0)
+    sizes = {
+        "Config": [2_000] * 8,
+        "GameSettings": [20_000] * 20,
+        "Wii": [200_000] * 40,
+        "Replays": [2_000_000] * 20,
+        "Cache": [500_000] * 20,
+        "Shaders": [100_000] * 50,
+    }
+    for directory, files in sizes.items():
+        os.makedirs(os.path.join(path, directory))
+        for i, size in enumerate(files):
+            with open(os.path.join(path, directory, "%d.bin" % i), "wb") as file:
+                file.write(rng.randbytes(size))
+    return path
+
+
+def bench_home(args):
+    """Per-instance time and bytes written to make a Console's temporary home
+    directory, copying all of it or linking to a template"""
+    root = tempfile.mkdtemp(prefix="libmelee_bench_")
+    _fake_user_directory(os.path.join(root, "User"))
+    print("%-9s %12s %12s" % ("home", "ms/instance", "MB/instance"))
+    for mode, template in (("copy", False), ("template", True)):
+        # The first template console builds the template, the way a pool's first
+        #   instance would
+        Console(path=root, home_template=template).stop()
+        consoles = []
+        start = time.perf_counter()
+        for _ in range(args.streams):
+            consoles.append(Console(path=root, home_template=template))
+        elapsed = time.perf_counter() - start
+        written = sum(hometemplate.written_bytes(console.temp_dir) for console in consoles)
+        print(
+            "%-9s %12.2f %12.2f"
+            % (mode, elapsed / args.streams * 1e3, written / args.streams / 1e6)
+        )
+        for console in consoles:
+            console.stop()
+    shutil.rmtree(root)
+
+
+def _free_udp_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def bench_mockdolphin(args):
+    """Frames per second of a two-bot loop against the mock Dolphin with blocking
+    pipes: applying the inputs, flushing both controllers and waiting for the frame"""
+    inputs = _agent_inputs(args.path, 1000)
+    directory = mockdolphin.install(
+        tempfile.mkdtemp(prefix="libmelee_bench_") + "/mockdolphin", args.path
+    )
+    print("%-13s %9s %9s" % ("input", "frames/s", "us/frame"))
+    for mode, kwargs in (("batched", {}), ("batched+diff", {"diff_input": True})):
+        console = Console(path=directory, blocking_input=True, slippi_port=_free_udp_port())
+        controllers = [Controller(console=console, port=port, **kwargs) for port in (1, 2)]
+        console.run()
+        if not console.connect():
+            raise RuntimeError("couldn't connect to the mock Dolphin")
+        for controller in controllers:
+            controller.connect()
+
+        def run():
+            for action in inputs:
+                for controller in controllers:
+                    _apply(controller, action)
+                if console.step() is None:
+                    raise RuntimeError("the mock Dolphin went away")
+
+        elapsed = _time(run, args.repeat)
+        print("%-13s %9.0f %9.2f" % (mode, len(inputs) / elapsed, elapsed / len(inputs) * 1e6))
+        console.stop()
+    shutil.rmtree(os.path.dirname(directory))
+
+
+BENCHMARKS = {
+    "decode": bench_decode,
+    "controller": bench_controller,
+    "actions": bench_actions,
+    "startup": bench_startup,
+    "framedata": bench_framedata,
+    "gamestate": bench_gamestate,
+    "array_mirror": bench_array_mirror,
+    "lazy": bench_lazy,
+    "timings": bench_timings,
+    "async": bench_async,
+    "batch": bench_batch,
+    "mockdolphin": bench_mockdolphin,
+    "home": bench_home,
+}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="libmelee micro-benchmarks")
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS))
+    parser.add_argument(
+        "--path",
+        default="test_artifacts/test_game_1.slp",
+        help="SLP file to benchmark against",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=5, help="Take the best of this many runs"
+    )
+    parser.add_argument(
+        "--streams",
+        type=int,
+        default=8,
+        help="Concurrent streams, for async and batch. Instances, for home",
+    )
+    parser.add_argument(
+        "--fps",
+        type=float,
+        default=None,
+        help="Frame rate to stream replays at, for async and batch. Default is as fast as possible",
+    )
+    args = parser.parse_args()
+    BENCHMARKS[args.benchmark](args)
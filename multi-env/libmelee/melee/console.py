@@ -4,29 +4,53 @@ This can be Dolphin (Slippi's Ishiiruka) or an SLP file. The Console object
 is your method to start and stop Dolphin, set configs, and get the latest GameState.
 """
 import psutil
+import asyncio
 import base64
+import collections
 import configparser
-import csv
 import math
 import os
 import platform
 import shutil
 import stat
+import struct
 import subprocess
 import tempfile
 import time
-from collections import defaultdict
 from pathlib import Path
 from typing import Optional
 
 import numpy as np
-from melee import enums, stages
+from melee import enums, eventdecoder, hometemplate, stages, staticdata
+from melee.columnar import COLUMN, PlayerColumns
 from melee.enums import Action
-from melee.gamestate import GameState, PlayerState, Projectile
+from melee.gamestate import GameState, LazyPlayerState, PlayerState, Projectile
 from melee.slippstream import EventType, SlippstreamClient
 from melee.slpfilestreamer import SLPFileStreamer
+from melee.timings import FrameTimings
 from packaging import version
 
+_PAYLOADS = EventType.PAYLOADS.value
+_ACTION_FRAME_COLUMN = COLUMN["action_frame"]
+
+# Menu scene id of a menu event, to the menu it's in
+_MENU_SCENES = {
+    0x0002: enums.Menu.CHARACTER_SELECT,
+    0x0102: enums.Menu.STAGE_SELECT,
+    0x0108: enums.Menu.STAGE_SELECT,
+    0x0202: enums.Menu.IN_GAME,
+    0x0001: enums.Menu.MAIN_MENU,
+    0x0008: enums.Menu.SLIPPI_ONLINE_CSS,
+    0x0000: enums.Menu.PRESS_START,
+    0x0402: enums.Menu.POSTGAME_SCORES,
+}
+# Menus in which every controller port gets a PlayerState
+_ALL_PORTS_MENUS = (
+    enums.Menu.CHARACTER_SELECT,
+    enums.Menu.STAGE_SELECT,
+    enums.Menu.SLIPPI_ONLINE_CSS,
+)
+
 
 class SlippiVersionTooLow(Exception):
     """Raised when the Slippi version is not recent enough"""
@@ -95,6 +119,12 @@ class Console:
         disable_audio=False,
         overclock: Optional[float] = None,
         save_replays=True,
+        array_mirror=False,
+        reuse_gamestates=False,
+        lazy_decoding=False,
+        timings=False,
+        home_template=False,
+        replay_dir=None,
     ):
         """Create a Console object
 
@@ -126,21 +156,71 @@ class Console:
             disable_audio (bool): Turn off sound.
             overclock (bool): Overclock the dolphin CPU.
             save_replays (bool): Save slippi replays.
+            array_mirror (bool): Mirror each player's decoded pre-frame and post-frame
+                values into preallocated numpy arrays, see `Console.columns` and the
+                melee.columnar module. The PlayerStates are still built as usual, so
+                this makes decoding a frame slower. It only pays off when the bot
+                builds an array observation out of many fields every frame.
+            reuse_gamestates (bool): Overwrite the same two GameState objects in place
+                instead of making new ones every frame. A returned gamestate is only valid
+                until the step after next, so call GameState.snapshot() on any frame you
+                want to keep.
+            lazy_decoding (bool): Only decode the fields that libmelee itself needs up
+                front: position, character, action, action_frame, facing, percent, stock,
+                on_ground and the invulnerability helpers. The rest of each player's
+                fields are unpacked from the event bytes the first time they're read.
+                See gamestate.LazyPlayerState. Pays off when the bot reads a handful of
+                fields per frame. Each lazy field is unpacked on its own, so a bot that
+                reads most of them every frame is slower than with eager decoding (see
+                `python3 benchmark.py lazy`).
+            timings (bool): Record how long every phase of a frame takes (flushing,
+                waiting, unwrapping, decoding, fixups and the time the agent spends
+                between frames) into histograms. See `Console.timings` and the
+                melee.timings module.
+            home_template (bool): With tmp_home_directory and copy_home_directory, make
+                the home directory out of hard links to a trimmed, pre-configured
+                template of it instead of copying all of it. The template is built
+                once per process. See the melee.hometemplate module.
+            replay_dir (str): Directory to save slippi replays in, without month
+                folders, instead of the one set in the home directory's Dolphin.ini.
+                None to leave that setting alone.
         """
         self.logger = logger
         self.system = system
         self.path = path
         self.dolphin_home_path = dolphin_home_path
         self.temp_dir = None
+        self.home_stats = None
+        """(dict): How long making and configuring the temporary home directory took
+        ("seconds"), and with home_template, how many files were linked and copied. None
+        without tmp_home_directory. For the bytes written, see
+        hometemplate.written_bytes(console.temp_dir)"""
+        # The template already has the gecko codes, which mustn't be written into
+        #   the linked copy of them
+        self._home_template = False
+        home_started = time.perf_counter()
         if tmp_home_directory and self.system == "dolphin":
             self.temp_dir = tempfile.mkdtemp(prefix="libmelee_")
             home_dir = self.temp_dir + "/User/"
-            if copy_home_directory:
+            self.home_stats = {}
+            if copy_home_directory and home_template:
+                template = hometemplate.template_for(
+                    self._get_dolphin_home_path(), setup_gecko_codes
+                )
+                self.home_stats.update(hometemplate.materialize(template, home_dir))
+                self._home_template = True
+            elif copy_home_directory:
                 _copytree_safe(self._get_dolphin_home_path(), home_dir)
             self.dolphin_home_path = home_dir
 
+        self.columns = PlayerColumns() if array_mirror else None
+        """(columnar.PlayerColumns): Per-port arrays of player state. None unless array_mirror is set"""
         self.processingtime = 0
         self._frametimestamp = time.time()
+        self.timings = FrameTimings() if timings else None
+        """(timings.FrameTimings): Per-phase latency histograms. None unless timings is set"""
+        # perf_counter_ns() of when the last frame was handed out, for the agent phase
+        self._frame_returned_ns = None
         self.slippi_address = slippi_address
         """(str): IP address of the Dolphin / gamecube to connect to."""
         self.slippi_port = slippi_port
@@ -174,49 +254,48 @@ class Console:
         self.disable_audio = disable_audio
         self.overclock = overclock
         self.save_replays = save_replays
+        self.replay_dir = replay_dir
 
         # Keep a running copy of the last gamestate produced
         self._prev_gamestate = GameState()
         # Half-completed gamestate not yet ready to add to the list
         self._temp_gamestate = None
+        # Messages received in the same batch as an earlier frame, still to be handled
+        self._messages = collections.deque()
+        # Events after the end of a frame, from a message that held more than one frame
+        self._leftover_events = None
+        # With reuse_gamestates, frames are built alternately in these two. The one not
+        #   being built is the frame that was last returned
+        self._gamestates = (GameState(), GameState()) if reuse_gamestates else None
+        self._next_buffer = 0
+        self._event_handlers = self._build_event_handlers()
+        self._lazy_decoding = lazy_decoding
+        self._player_class = LazyPlayerState if lazy_decoding else PlayerState
         self._process = None
+        # Dolphin's messages are read in batches, see SlippstreamClient.dispatch_batch
+        self._batched = self.system == "dolphin"
         assert self.system in ["dolphin", "gamecube", "file"]
         if self.system == "dolphin":
             self._slippstream = SlippstreamClient(
                 self.slippi_address, self.slippi_port, True
             )
+            self._slippstream.timings = self.timings
             if self.path:
                 self._setup_home_directory()
+            if self.home_stats is not None:
+                self.home_stats["seconds"] = time.perf_counter() - home_started
         elif self.system == "gamecube":
             self._slippstream = SlippstreamClient(
                 self.slippi_address, self.slippi_port, False
             )
+            self._slippstream.timings = self.timings
         else:
             self._slippstream = SLPFileStreamer(self.path)
 
-        # Prepare some structures for fixing melee data
-        path = os.path.dirname(os.path.realpath(__file__))
-        with open(path + "/actiondata.csv") as csvfile:
-            # A list of dicts containing the frame data
-            actiondata = list(csv.DictReader(csvfile))
-            # Dict of sets
-            self.zero_indices = defaultdict(set)
-            for line in actiondata:
-                if line["zeroindex"] == "True":
-                    self.zero_indices[int(line["character"])].add(
-                        int(line["action"]))
-
-        # Read the character data csv
-        self.characterdata = dict()
-        with open(path + "/characterdata.csv") as csvfile:
-            reader = csv.DictReader(csvfile)
-            for line in reader:
-                del line["Character"]
-                # Convert all fields to numbers
-                for key, value in line.items():
-                    line[key] = float(value)
-                self.characterdata[enums.Character(
-                    line["CharacterIndex"])] = line
+        # Prepare some structures for fixing melee data. These are parsed once per
+        #   process and shared between consoles, see melee.staticdata
+        self.zero_indices = staticdata.zero_indices()
+        self.characterdata = staticdata.characterdata()
 
     def connect(self):
         """Connects to the Slippi server (dolphin or gamecube).
@@ -226,6 +305,14 @@ class Console:
         """
         return self._slippstream.connect()
 
+    def fileno(self):
+        """File descriptor of the socket the console's data arrives on
+
+        Lets a Console be passed straight to select() or the selectors module,
+        to wait on several consoles at once. Not available for SLP files.
+        """
+        return self._slippstream.fileno()
+
     def _get_dolphin_home_path(self):
         """Return the path to dolphin's home directory"""
         if self.dolphin_home_path:
@@ -324,7 +411,7 @@ class Console:
         self,
     ):
         self._setup_dolphin_ini()
-        if self.setup_gecko_codes:
+        if self.setup_gecko_codes and not self._home_template:
             self._setup_gecko_codes()
 
     def _setup_dolphin_ini(self):
@@ -357,6 +444,9 @@ class Console:
             config.set("Core", "OverclockEnable", "True")
 
         config.set("Core", "SlippiSaveReplays", str(self.save_replays))
+        if self.replay_dir is not None:
+            config.set("Core", "SlippiReplayDir", str(self.replay_dir))
+            config.set("Core", "SlippiReplayMonthFolders", "False")
 
         with open(dolphin_ini_path, "w") as dolphinfile:
             config.write(dolphinfile)
@@ -452,16 +542,155 @@ class Console:
             GameState object that represents new current state of the game"""
         self.processingtime = time.time() - self._frametimestamp
 
-        # Flush the controllers
+        timings = self.timings
+        if timings is None:
+            self.flush()
+            return self._read_gamestate(self._polling_mode)
+        started = timings.start()
+        self.flush()
+        gamestate = self._read_gamestate(self._polling_mode)
+        timings.add("step", started)
+        if gamestate is not None:
+            timings.end_frame()
+        return gamestate
+
+    async def step_async(self):
+        """The asyncio version of step(): flushes all controllers, then waits for the
+        next frame without blocking the event loop
+
+        Lets a single thread drive any number of consoles, for example:
+            gamestates = await asyncio.gather(*[c.step_async() for c in consoles])
+
+        Dolphin streams wait on the ENet socket through the event loop. SLP files
+        never wait, so they read the frame right away and then let other tasks run.
+        Reads from a real GameCube block, so those run in the loop's default executor.
+
+        Returns:
+            GameState object that represents new current state of the game, or None
+            once the stream has ended
+        """
+        self.processingtime = time.time() - self._frametimestamp
+
+        self.flush()
+        if self.system == "file":
+            gamestate = self._read_gamestate(False)
+            await asyncio.sleep(0)
+        elif self.system == "gamecube":
+            loop = asyncio.get_running_loop()
+            gamestate = await loop.run_in_executor(None, self._read_gamestate, False)
+        else:
+            slippstream = self._slippstream
+            while True:
+                gamestate = self._read_gamestate(True)
+                if gamestate is not None or slippstream.disconnected:
+                    break
+                # Wake up every so often even without data, so ENet can service the
+                #   connection
+                await slippstream.wait_readable(1.0)
+        if gamestate is not None and self.timings is not None:
+            self.timings.end_frame()
+        return gamestate
+
+    async def connect_async(self):
+        """The asyncio version of connect(), that doesn't block the event loop
+
+        Returns:
+            True is successful, False otherwise
+        """
+        if self.system == "dolphin":
+            return await self._slippstream.connect_async()
+        return self.connect()
+
+    def flush(self):
+        """Flush all controllers, sending the inputs queued up for this frame"""
+        timings = self.timings
+        if timings is None:
+            for controller in self.controllers:
+                controller.flush()
+            return
+        started = timings.start()
+        if self._frame_returned_ns is not None:
+            timings.add_ns("agent", started - self._frame_returned_ns)
+            self._frame_returned_ns = None
         for controller in self.controllers:
             controller.flush()
+        timings.add("flush", started)
 
+    def seek(self, frame):
+        """Jump to the given frame of an SLP file. The next step() returns that frame
+
+        Uses the file's frame index (see slpfilestreamer.SLPIndex), which is built the
+        first time and then kept next to the file. Helper fields that depend on earlier
+        frames, like invulnerability_left, start over from the seeked to frame.
+
+        Args:
+            frame (int): Frame number to jump to
+
+        Raises:
+            KeyError: If the frame isn't in the file
+        """
+        assert self.system == "file"
+        self._slippstream.seek(frame)
+        self._temp_gamestate = None
+        self._prev_gamestate = GameState()
+        # Frames at or before self._frame are treated as rollbacks and dropped
+        self._frame = min(self._frame, frame - 1)
+
+    def frames(self, start=None, stop=None):
+        """Iterate over the gamestates of an SLP file, from start up to (not including) stop
+
+        Args:
+            start (int): First frame to return. Defaults to wherever the file is at now.
+            stop (int): Frame to stop at. Defaults to the end of the file.
+
+        Yields:
+            GameState objects
+        """
+        assert self.system == "file"
+        if start is not None:
+            self.seek(start)
+        while True:
+            gamestate = self.step()
+            if gamestate is None:
+                return
+            if stop is not None and gamestate.frame >= stop:
+                return
+            yield gamestate
+
+    def poll(self):
+        """Read the next gamestate without blocking, and without flushing controllers
+
+        Use this together with flush() when driving several consoles from one thread.
+        A partially received frame is kept, and completed by later calls.
+
+        Returns:
+            GameState object if a new frame is complete, None otherwise"""
+        gamestate = self._read_gamestate(True)
+        if gamestate is not None and self.timings is not None:
+            self.timings.end_frame()
+        return gamestate
+
+    def _read_gamestate(self, polling_mode):
+        """Read messages off the stream until a full frame has been assembled"""
         if self._temp_gamestate is None:
-            self._temp_gamestate = GameState()
+            self._temp_gamestate = self._new_gamestate()
 
+        timings = self.timings
         frame_ended = False
+        if self._leftover_events is not None:
+            frame_ended = self.__handle_leftover_events()
         while not frame_ended:
-            message = self._slippstream.dispatch(self._polling_mode)
+            if timings is None:
+                message = self.__next_message(polling_mode)
+            else:
+                started = timings.start()
+                unwrapped = timings.elapsed("unwrap")
+                message = self.__next_message(polling_mode)
+                # The client counts the time it spent parsing JSON as unwrap itself
+                timings.add_ns(
+                    "wait",
+                    timings.start() - started - (timings.elapsed("unwrap") - unwrapped),
+                )
             if message:
                 if message["type"] == "connect_reply":
                     self.connected = True
@@ -471,7 +700,9 @@ class Console:
 
                 elif message["type"] == "game_event":
                     if len(message["payload"]) > 0:
-                        if self.system == "dolphin":
+                        if timings is not None:
+                            frame_ended = self.__timed_events(message["payload"], False)
+                        elif self.system == "dolphin":
                             frame_ended = self.__handle_slippstream_events(
                                 base64.b64decode(message["payload"]),
                                 self._temp_gamestate,
@@ -483,7 +714,9 @@ class Console:
 
                 elif message["type"] == "menu_event":
                     if len(message["payload"]) > 0:
-                        if self.system == "dolphin":
+                        if timings is not None:
+                            self.__timed_events(message["payload"], True)
+                        elif self.system == "dolphin":
                             self.__handle_slippstream_menu_event(
                                 base64.b64decode(message["payload"]),
                                 self._temp_gamestate,
@@ -505,9 +738,16 @@ class Console:
 
         gamestate = self._temp_gamestate
         self._temp_gamestate = None
+        if self._gamestates is not None:
+            self._next_buffer ^= 1
+        if timings is not None:
+            started = timings.start()
         self.__fixframeindexing(gamestate)
         self.__fixiasa(gamestate)
+        if timings is not None:
+            timings.add("fixup", started)
         # Insert some metadata into the gamestate
+        gamestate.columns = self.columns
         gamestate.playedOn = self._slippstream.playedOn
         gamestate.startAt = self._slippstream.timestamp
         gamestate.consoleNick = self._slippstream.consoleNick
@@ -525,88 +765,149 @@ class Console:
 
         # Start the processing timer now that we're done reading messages
         self._frametimestamp = time.time()
+        if timings is not None:
+            self._frame_returned_ns = timings.start()
+        return gamestate
+
+    def __next_message(self, polling_mode):
+        """The next message off the stream, receiving a new batch once the last one is used up"""
+        if not self._batched:
+            return self._slippstream.dispatch(polling_mode)
+        messages = self._messages
+        if not messages:
+            messages.extend(self._slippstream.dispatch_batch(polling_mode))
+            if not messages:
+                return None
+        return messages.popleft()
+
+    def __handle_leftover_events(self):
+        """Handle the events kept over from a message that held more than one frame"""
+        events = self._leftover_events
+        self._leftover_events = None
+        if self.timings is None:
+            return self.__handle_slippstream_events(events, self._temp_gamestate)
+        started = self.timings.start()
+        frame_ended = self.__handle_slippstream_events(events, self._temp_gamestate)
+        self.timings.add("decode", started)
+        return frame_ended
+
+    def __timed_events(self, payload, menu):
+        """Handle a game or menu event payload, timing the unwrap and decode phases"""
+        timings = self.timings
+        started = timings.start()
+        if self.system == "dolphin":
+            payload = base64.b64decode(payload)
+            started = timings.add("unwrap", started)
+        if menu:
+            self.__handle_slippstream_menu_event(payload, self._temp_gamestate)
+            frame_ended = True
+        else:
+            frame_ended = self.__handle_slippstream_events(payload, self._temp_gamestate)
+        timings.add("decode", started)
+        return frame_ended
+
+    def _new_gamestate(self):
+        """An empty GameState to build the next frame in"""
+        if self._gamestates is None:
+            return GameState()
+        gamestate = self._gamestates[self._next_buffer]
+        if gamestate is self._prev_gamestate:
+            # Only after a menu frame. Don't let the frame compare against itself
+            self._prev_gamestate = GameState()
+        gamestate.reset()
         return gamestate
 
     def __handle_slippstream_events(self, event_bytes, gamestate):
-        """Handle a series of events, provided sequentially in a byte array"""
+        """Handle a series of events, provided sequentially in a byte array
+
+        Events are read in place, by walking an offset through a single memoryview
+        """
         gamestate.menu_state = enums.Menu.IN_GAME
-        while len(event_bytes) > 0:
+        buffer = memoryview(event_bytes)
+        handlers = self._event_handlers
+        eventsize = self.eventsize
+        offset = 0
+        end = len(buffer)
+        while offset < end:
+            command = buffer[offset]
             # A null message type means that the rest of the data is padding
-            if event_bytes[0] == 0x00:
+            if command == 0x00:
                 return True
-            event_size = self.eventsize[event_bytes[0]]
-            if len(event_bytes) < event_size:
+            event_size = eventsize[command]
+            if end - offset < event_size:
                 print(
                     "WARNING: Something went wrong unpacking events. Data is probably missing"
                 )
                 print("\tDidn't have enough data for event")
                 return False
-            if EventType(event_bytes[0]) == EventType.PAYLOADS:
-                cursor = 0x2
-                payload_size = event_bytes[1]
+            if command == _PAYLOADS:
+                payload_size = buffer[offset + 1]
                 num_commands = (payload_size - 1) // 3
+                cursor = offset + 0x2
                 for i in range(0, num_commands):
-                    command = np.ndarray((1,), ">B", event_bytes, cursor)[0]
-                    command_len = np.ndarray(
-                        (1,), ">H", event_bytes, cursor + 0x1)[0]
-                    self.eventsize[command] = command_len + 1
+                    command, command_len = struct.unpack_from(">BH", buffer, cursor)
+                    eventsize[command] = command_len + 1
                     cursor += 3
-                event_bytes = event_bytes[payload_size + 1:]
-
-            elif EventType(event_bytes[0]) == EventType.FRAME_START:
-                event_bytes = event_bytes[event_size:]
-
-            elif EventType(event_bytes[0]) == EventType.GAME_START:
-                self.__game_start(gamestate, event_bytes)
-                event_bytes = event_bytes[event_size:]
-                # The game needs to know what to press on the first frame of the game
-                #   Just give it empty input. Characters are not actionable anyway.
-                for controller in self.controllers:
-                    controller.release_all()
-                    controller.flush()
-
-            elif EventType(event_bytes[0]) == EventType.GAME_END:
-                event_bytes = event_bytes[event_size:]
-                return self._use_manual_bookends
-
-            elif EventType(event_bytes[0]) == EventType.PRE_FRAME:
-                self.__pre_frame(gamestate, event_bytes)
-                event_bytes = event_bytes[event_size:]
-
-            elif EventType(event_bytes[0]) == EventType.POST_FRAME:
-                self.__post_frame(gamestate, event_bytes)
-                event_bytes = event_bytes[event_size:]
-
-            elif EventType(event_bytes[0]) == EventType.GECKO_CODES:
-                event_bytes = event_bytes[event_size:]
-
-            elif EventType(event_bytes[0]) == EventType.FRAME_BOOKEND:
-                self.__frame_bookend(gamestate, event_bytes)
-                event_bytes = event_bytes[event_size:]
-                # If this is an old frame, then don't return it.
-                if gamestate.frame <= self._frame:
-                    return False
-                self._frame = gamestate.frame
-                return True
+                offset += payload_size + 1
+                continue
 
-            elif EventType(event_bytes[0]) == EventType.ITEM_UPDATE:
-                self.__item_update(gamestate, event_bytes)
-                event_bytes = event_bytes[event_size:]
-
-            else:
+            handler = handlers[command]
+            if handler is None:
                 print(
                     "WARNING: Something went wrong unpacking events. "
                     + "Data is probably missing"
                 )
-                print("\tGot invalid event type: ", event_bytes[0])
+                print("\tGot invalid event type: ", command)
                 return False
+            # Handlers return a true value once the frame is complete
+            frame_ended = handler(gamestate, buffer, offset, event_size)
+            offset += event_size
+            if frame_ended:
+                if offset < end and buffer[offset] != 0x00:
+                    # The message holds the start of the next frame too. Keep that for
+                    #   the next call instead of dropping it
+                    self._leftover_events = buffer[offset:]
+                return True
         return False
 
-    def __game_start(self, gamestate, event_bytes):
+    def _build_event_handlers(self):
+        """Table of event handlers indexed by command byte, None for unknown events"""
+        handlers = [None] * 0x100
+        for event, handler in (
+            (EventType.FRAME_START, self.__skip_event),
+            (EventType.GECKO_CODES, self.__skip_event),
+            (EventType.GAME_START, self.__game_start_event),
+            (EventType.GAME_END, self.__game_end),
+            (EventType.PRE_FRAME, self.__pre_frame),
+            (EventType.POST_FRAME, self.__post_frame),
+            (EventType.FRAME_BOOKEND, self.__frame_bookend),
+            (EventType.ITEM_UPDATE, self.__item_update),
+        ):
+            handlers[event.value] = handler
+        return handlers
+
+    def __skip_event(self, gamestate, buffer, offset, event_size):
+        return None
+
+    def __game_start_event(self, gamestate, buffer, offset, event_size):
+        self.__game_start(gamestate, buffer, offset)
+        # The game needs to know what to press on the first frame of the game
+        #   Just give it empty input. Characters are not actionable anyway.
+        for controller in self.controllers:
+            controller.release_all()
+            controller.flush()
+        return None
+
+    def __game_end(self, gamestate, buffer, offset, event_size):
+        return self._use_manual_bookends
+
+    def __game_start(self, gamestate, buffer, offset):
         self._frame = -10000
-        major = np.ndarray((1,), ">B", event_bytes, 0x1)[0]
-        minor = np.ndarray((1,), ">B", event_bytes, 0x2)[0]
-        version_num = np.ndarray((1,), ">B", event_bytes, 0x3)[0]
+        if self.columns is not None:
+            self.columns.reset()
+        major = np.ndarray((1,), ">B", buffer, offset + 0x1)[0]
+        minor = np.ndarray((1,), ">B", buffer, offset + 0x2)[0]
+        version_num = np.ndarray((1,), ">B", buffer, offset + 0x3)[0]
         self.slp_version = str(major) + "." + \
             str(minor) + "." + str(version_num)
         self._use_manual_bookends = self._allow_old_version and (
@@ -616,223 +917,183 @@ class Console:
             raise SlippiVersionTooLow(self.slp_version)
         try:
             self._current_stage = enums.to_internal_stage(
-                np.ndarray((1,), ">H", event_bytes, 0x13)[0]
+                np.ndarray((1,), ">H", buffer, offset + 0x13)[0]
             )
         except ValueError:
             self._current_stage = enums.Stage.NO_STAGE
 
-        self._is_teams = not (np.ndarray((1,), ">H", event_bytes, 0xD)[0] == 0)
+        self._is_teams = not (np.ndarray((1,), ">H", buffer, offset + 0xD)[0] == 0)
 
         for i in range(4):
-            self._costumes[i] = np.ndarray((1,), ">B", event_bytes, 0x68 + (0x24 * i))[
-                0
-            ]
+            self._costumes[i] = np.ndarray(
+                (1,), ">B", buffer, offset + 0x68 + (0x24 * i))[0]
 
         for i in range(4):
-            self._cpu_level[i] = np.ndarray((1,), ">B", event_bytes, 0x74 + (0x24 * i))[
-                0
-            ]
+            self._cpu_level[i] = np.ndarray(
+                (1,), ">B", buffer, offset + 0x74 + (0x24 * i))[0]
 
         for i in range(4):
             self._team_id[i] = np.ndarray(
-                (1,), ">B", event_bytes, 0x6E + (0x24 * i))[0]
+                (1,), ">B", buffer, offset + 0x6E + (0x24 * i))[0]
 
         for i in range(4):
-            if np.ndarray((1,), ">B", event_bytes, 0x66 + (0x24 * i))[0] != 1:
+            if np.ndarray((1,), ">B", buffer, offset + 0x66 + (0x24 * i))[0] != 1:
                 self._cpu_level[i] = 0
 
-    def __pre_frame(self, gamestate, event_bytes):
+    def __pre_frame(self, gamestate, buffer, offset, event_size):
+        if self._lazy_decoding and self.columns is None:
+            values = None
+            _, port, is_nana = eventdecoder.PRE_FRAME_HEAD.decode(buffer, offset, event_size)
+        else:
+            values = eventdecoder.PRE_FRAME.decode(buffer, offset, event_size)
+            port, is_nana = values[1], values[2]
+
         # Grab the physical controller state and put that into the controller state
-        controller_port = np.ndarray((1,), ">B", event_bytes, 0x5)[0] + 1
+        controller_port = port + 1
+        if self.columns is not None:
+            self.columns.write_pre_frame(controller_port, is_nana == 1, values)
 
         if controller_port not in gamestate.players:
-            gamestate.players[controller_port] = PlayerState()
+            gamestate.new_player(controller_port, self._player_class)
         playerstate = gamestate.players[controller_port]
 
         # Is this Nana?
-        if np.ndarray((1,), ">B", event_bytes, 0x6)[0] == 1:
-            playerstate.nana = PlayerState()
-            playerstate = playerstate.nana
+        if is_nana == 1:
+            playerstate = playerstate.new_nana()
 
         playerstate.costume = self._costumes[controller_port - 1]
         playerstate.cpu_level = self._cpu_level[controller_port - 1]
         playerstate.team_id = self._team_id[controller_port - 1]
 
-        main_x = (np.ndarray((1,), ">f", event_bytes, 0x19)[0] / 2) + 0.5
-        main_y = (np.ndarray((1,), ">f", event_bytes, 0x1D)[0] / 2) + 0.5
-        playerstate.controller_state.main_stick = (main_x, main_y)
-
-        c_x = (np.ndarray((1,), ">f", event_bytes, 0x21)[0] / 2) + 0.5
-        c_y = (np.ndarray((1,), ">f", event_bytes, 0x25)[0] / 2) + 0.5
-        playerstate.controller_state.c_stick = (c_x, c_y)
-
-        raw_main_x = 0
-        raw_main_y = 0
-        try:
-            raw_main_x = int(np.ndarray((1,), ">b", event_bytes, 0x3B)[0])
-        except TypeError:
-            pass
-        try:
-            raw_main_y = int(np.ndarray((1,), ">b", event_bytes, 0x40)[0])
-        except TypeError:
-            pass
-        playerstate.controller_state.raw_main_stick = (raw_main_x, raw_main_y)
-
-        # The game interprets both shoulders together, so the processed value will always be the same
-        trigger = np.ndarray((1,), ">f", event_bytes, 0x29)[0]
-        playerstate.controller_state.l_shoulder = trigger
-        playerstate.controller_state.r_shoulder = trigger
-
-        buttonbits = np.ndarray((1,), ">H", event_bytes, 0x31)[0]
-        playerstate.controller_state.button[enums.Button.BUTTON_A] = bool(
-            int(buttonbits) & 0x0100
-        )
-        playerstate.controller_state.button[enums.Button.BUTTON_B] = bool(
-            int(buttonbits) & 0x0200
-        )
-        playerstate.controller_state.button[enums.Button.BUTTON_X] = bool(
-            int(buttonbits) & 0x0400
-        )
-        playerstate.controller_state.button[enums.Button.BUTTON_Y] = bool(
-            int(buttonbits) & 0x0800
-        )
-        playerstate.controller_state.button[enums.Button.BUTTON_START] = bool(
-            int(buttonbits) & 0x1000
-        )
-        playerstate.controller_state.button[enums.Button.BUTTON_Z] = bool(
-            int(buttonbits) & 0x0010
-        )
-        playerstate.controller_state.button[enums.Button.BUTTON_R] = bool(
-            int(buttonbits) & 0x0020
-        )
-        playerstate.controller_state.button[enums.Button.BUTTON_L] = bool(
-            int(buttonbits) & 0x0040
-        )
-        playerstate.controller_state.button[enums.Button.BUTTON_D_LEFT] = bool(
-            int(buttonbits) & 0x0001
-        )
-        playerstate.controller_state.button[enums.Button.BUTTON_D_RIGHT] = bool(
-            int(buttonbits) & 0x0002
-        )
-        playerstate.controller_state.button[enums.Button.BUTTON_D_DOWN] = bool(
-            int(buttonbits) & 0x0004
-        )
-        playerstate.controller_state.button[enums.Button.BUTTON_D_UP] = bool(
-            int(buttonbits) & 0x0008
-        )
+        if self._lazy_decoding:
+            playerstate.set_pre_event(buffer[offset : offset + event_size])
+        else:
+            eventdecoder.fill_controller_state(playerstate.controller_state, values)
         if self._use_manual_bookends:
             self._frame = gamestate.frame
 
-    def __post_frame(self, gamestate, event_bytes):
+    def __post_frame(self, gamestate, buffer, offset, event_size):
+        if self._lazy_decoding and self.columns is None:
+            # Only what's needed below. The rest is unpacked if and when it's read
+            values = None
+            (
+                frame,
+                port,
+                is_nana,
+                character,
+                action,
+                x,
+                y,
+                facing,
+                percent,
+                stock,
+                action_frame,
+                airborne,
+                hurtbox_status,
+                fod_platform_left,
+                fod_platform_right,
+            ) = eventdecoder.POST_FRAME_HEAD.decode(buffer, offset, event_size)
+        else:
+            values = eventdecoder.POST_FRAME.decode(buffer, offset, event_size)
+            (
+                frame,
+                port,
+                is_nana,
+                character,
+                action,
+                x,
+                y,
+                facing,
+                percent,
+                shield_strength,
+                stock,
+                action_frame,
+                state_bits_4,
+                hitstun_frames_left,
+                airborne,
+                jumps_left,
+                hurtbox_status,
+                speed_air_x_self,
+                speed_y_self,
+                speed_x_attack,
+                speed_y_attack,
+                speed_ground_x_self,
+                hitlag_left,
+                ecb_top_x,
+                ecb_top_y,
+                ecb_bottom_x,
+                ecb_bottom_y,
+                ecb_left_x,
+                ecb_left_y,
+                ecb_right_x,
+                ecb_right_y,
+                fod_platform_left,
+                fod_platform_right,
+            ) = values
+
         gamestate.stage = self._current_stage
         gamestate.is_teams = self._is_teams
-        gamestate.frame = np.ndarray((1,), ">i", event_bytes, 0x1)[0]
-        controller_port = np.ndarray((1,), ">B", event_bytes, 0x5)[0] + 1
+        gamestate.frame = frame
+        controller_port = port + 1
+        if self.columns is not None:
+            self.columns.write_post_frame(controller_port, is_nana == 1, values)
 
         if controller_port not in gamestate.players:
-            gamestate.players[controller_port] = PlayerState()
+            gamestate.new_player(controller_port, self._player_class)
         playerstate = gamestate.players[controller_port]
 
         # Is this Nana?
-        if np.ndarray((1,), ">B", event_bytes, 0x6)[0] == 1:
-            playerstate.nana = PlayerState()
-            playerstate = playerstate.nana
+        if is_nana == 1:
+            playerstate = playerstate.new_nana()
 
-        playerstate.position.x = np.ndarray((1,), ">f", event_bytes, 0xA)[0]
-        playerstate.position.y = np.ndarray((1,), ">f", event_bytes, 0xE)[0]
+        playerstate.position.x = x
+        playerstate.position.y = y
 
-        playerstate.x = playerstate.position.x
-        playerstate.y = playerstate.position.y
+        playerstate.x = x
+        playerstate.y = y
 
-        playerstate.character = enums.Character(
-            np.ndarray((1,), ">B", event_bytes, 0x7)[0]
-        )
-        try:
-            playerstate.action = enums.Action(
-                np.ndarray((1,), ">H", event_bytes, 0x8)[0]
-            )
-        except ValueError:
-            playerstate.action = enums.Action.UNKNOWN_ANIMATION
+        playerstate.character = eventdecoder.CHARACTERS[character]
+        playerstate.action = eventdecoder.ACTIONS[action]
 
         # Melee stores this in a float for no good reason. So we have to convert
-        playerstate.facing = np.ndarray((1,), ">f", event_bytes, 0x12)[0] > 0
-
-        playerstate.percent = int(np.ndarray((1,), ">f", event_bytes, 0x16)[0])
-        playerstate.shield_strength = np.ndarray(
-            (1,), ">f", event_bytes, 0x1A)[0]
-        playerstate.stock = np.ndarray((1,), ">B", event_bytes, 0x21)[0]
-        playerstate.action_frame = int(
-            np.ndarray((1,), ">f", event_bytes, 0x22)[0])
+        playerstate.facing = facing > 0
 
-        try:
-            sb4 = int(np.ndarray((1,), ">B", event_bytes, 0x29)[0])
-            playerstate.is_powershield = (sb4 & 0x20) == 0x20
-        except TypeError:
-            playerstate.is_powershield = False
-
-        try:
-            playerstate.hitstun_frames_left = int(
-                np.ndarray((1,), ">f", event_bytes, 0x2B)[0]
-            )
-        except TypeError:
-            playerstate.hitstun_frames_left = 0
-        except ValueError:
-            playerstate.hitstun_frames_left = 0
-        try:
-            playerstate.on_ground = not bool(
-                np.ndarray((1,), ">B", event_bytes, 0x2F)[0]
-            )
-        except TypeError:
-            playerstate.on_ground = True
-        try:
-            playerstate.jumps_left = np.ndarray(
-                (1,), ">B", event_bytes, 0x32)[0]
-        except TypeError:
-            playerstate.jumps_left = 1
+        playerstate.percent = int(percent)
+        playerstate.stock = stock
+        playerstate.action_frame = int(action_frame)
+        playerstate.on_ground = not bool(airborne)
+        playerstate.invulnerable = hurtbox_status != 0
 
-        try:
-            playerstate.invulnerable = (
-                int(np.ndarray((1,), ">B", event_bytes, 0x34)[0]) != 0
-            )
-        except TypeError:
-            playerstate.invulnerable = False
-
-        try:
-            playerstate.speed_air_x_self = np.ndarray(
-                (1,), ">f", event_bytes, 0x35)[0]
-        except TypeError:
-            playerstate.speed_air_x_self = 0
-
-        try:
-            playerstate.speed_y_self = np.ndarray(
-                (1,), ">f", event_bytes, 0x39)[0]
-        except TypeError:
-            playerstate.speed_y_self = 0
-
-        try:
-            playerstate.speed_x_attack = np.ndarray(
-                (1,), ">f", event_bytes, 0x3D)[0]
-        except TypeError:
-            playerstate.speed_x_attack = 0
-
-        try:
-            playerstate.speed_y_attack = np.ndarray(
-                (1,), ">f", event_bytes, 0x41)[0]
-        except TypeError:
-            playerstate.speed_y_attack = 0
-
-        try:
-            playerstate.speed_ground_x_self = np.ndarray((1,), ">f", event_bytes, 0x45)[
-                0
-            ]
-        except TypeError:
-            playerstate.speed_ground_x_self = 0
-
-        try:
-            playerstate.hitlag_left = int(
-                np.ndarray((1,), ">f", event_bytes, 0x49)[0])
-        except TypeError:
-            playerstate.hitlag_left = 0
+        if self._lazy_decoding:
+            playerstate.set_post_event(buffer[offset : offset + event_size])
+        else:
+            playerstate.shield_strength = shield_strength
+            playerstate.is_powershield = (state_bits_4 & 0x20) == 0x20
+            try:
+                playerstate.hitstun_frames_left = int(hitstun_frames_left)
+            except ValueError:
+                playerstate.hitstun_frames_left = 0
+            playerstate.jumps_left = jumps_left
+
+            playerstate.speed_air_x_self = speed_air_x_self
+            playerstate.speed_y_self = speed_y_self
+            playerstate.speed_x_attack = speed_x_attack
+            playerstate.speed_y_attack = speed_y_attack
+            playerstate.speed_ground_x_self = speed_ground_x_self
+            playerstate.hitlag_left = int(hitlag_left)
+
+            playerstate.ecb.top.x = ecb_top_x
+            playerstate.ecb.top.y = ecb_top_y
+            playerstate.ecb_top = (ecb_top_x, ecb_top_y)
+            playerstate.ecb.bottom.x = ecb_bottom_x
+            playerstate.ecb.bottom.y = ecb_bottom_y
+            playerstate.ecb_bottom = (ecb_bottom_x, ecb_bottom_y)
+            playerstate.ecb.left.x = ecb_left_x
+            playerstate.ecb.left.y = ecb_left_y
+            playerstate.ecb_left = (ecb_left_x, ecb_left_y)
+            playerstate.ecb.right.x = ecb_right_x
+            playerstate.ecb.right.y = ecb_right_y
+            playerstate.ecb_right = (ecb_right_x, ecb_right_y)
 
         # Keep track of a player's invulnerability due to respawn or ledge grab
         if controller_port in self._prev_gamestate.players:
@@ -883,85 +1144,14 @@ class Console:
         except KeyError:
             playerstate.off_stage = False
 
-        # ECB top edge, x
-        ecb_top_x = 0
-        ecb_top_y = 0
-        try:
-            ecb_top_x = np.ndarray((1,), ">f", event_bytes, 0x51)[0]
-        except TypeError:
-            ecb_top_x = 0
-        # ECB Top edge, y
-        try:
-            ecb_top_y = np.ndarray((1,), ">f", event_bytes, 0x55)[0]
-        except TypeError:
-            ecb_top_y = 0
-        playerstate.ecb.top.x = ecb_top_x
-        playerstate.ecb.top.y = ecb_top_y
-        playerstate.ecb_top = (ecb_top_x, ecb_top_y)
-
-        # ECB bottom edge, x coord
-        ecb_bot_x = 0
-        ecb_bot_y = 0
-        try:
-            ecb_bot_x = np.ndarray((1,), ">f", event_bytes, 0x59)[0]
-        except TypeError:
-            ecb_bot_x = 0
-        # ECB Bottom edge, y coord
-        try:
-            ecb_bot_y = np.ndarray((1,), ">f", event_bytes, 0x5D)[0]
-        except TypeError:
-            ecb_bot_y = 0
-        playerstate.ecb.bottom.x = ecb_bot_x
-        playerstate.ecb.bottom.y = ecb_bot_y
-        playerstate.ecb_bottom = (ecb_bot_x, ecb_bot_y)
-
-        # ECB left edge, x coord
-        ecb_left_x = 0
-        ecb_left_y = 0
-        try:
-            ecb_left_x = np.ndarray((1,), ">f", event_bytes, 0x61)[0]
-        except TypeError:
-            ecb_left_x = 0
-        # ECB left edge, y coord
-        try:
-            ecb_left_y = np.ndarray((1,), ">f", event_bytes, 0x65)[0]
-        except TypeError:
-            ecb_left_y = 0
-        playerstate.ecb.left.x = ecb_left_x
-        playerstate.ecb.left.y = ecb_left_y
-        playerstate.ecb_left = (ecb_left_x, ecb_left_y)
-
-        # ECB right edge, x coord
-        ecb_right_x = 0
-        ecb_right_y = 0
-        try:
-            ecb_right_x = np.ndarray((1,), ">f", event_bytes, 0x69)[0]
-        except TypeError:
-            ecb_right_x = 0
-        # ECB right edge, y coord
-        try:
-            ecb_right_y = np.ndarray((1,), ">f", event_bytes, 0x6D)[0]
-        except TypeError:
-            ecb_right_y = 0
-        playerstate.ecb.right.x = ecb_right_x
-        playerstate.ecb.right.y = ecb_right_y
-        playerstate.ecb_right = (ecb_right_x, ecb_right_y)
         if self._use_manual_bookends:
             self._frame = gamestate.frame
 
         # FoD platform heights
-        try:
-            gamestate._fod_platform_left = np.ndarray(
-                (1,), ">f", event_bytes, 0x71)[0]
-        except TypeError:
-            gamestate._fod_platform_left = 0
-        try:
-            gamestate._fod_platform_right = np.ndarray(
-                (1,), ">f", event_bytes, 0x75)[0]
-        except TypeError:
-            gamestate._fod_platform_right = 0
+        gamestate._fod_platform_left = fod_platform_left
+        gamestate._fod_platform_right = fod_platform_right
 
-    def __frame_bookend(self, gamestate, event_bytes):
+    def __frame_bookend(self, gamestate, buffer, offset, event_size):
         self._prev_gamestate = gamestate
         # Calculate helper distance variable
         #   This is a bit kludgey.... :/
@@ -983,36 +1173,39 @@ class Console:
         ydist = player_one_y - player_two_y
         gamestate.distance = math.sqrt((xdist**2) + (ydist**2))
 
-    def __item_update(self, gamestate, event_bytes):
+        # If this is an old frame, then don't return it.
+        if gamestate.frame <= self._frame:
+            return False
+        self._frame = gamestate.frame
+        return True
+
+    def __item_update(self, gamestate, buffer, offset, event_size):
         projectile = Projectile()
-        projectile.position.x = np.ndarray((1,), ">f", event_bytes, 0x14)[0]
-        projectile.position.y = np.ndarray((1,), ">f", event_bytes, 0x18)[0]
+        projectile.position.x = np.ndarray((1,), ">f", buffer, offset + 0x14)[0]
+        projectile.position.y = np.ndarray((1,), ">f", buffer, offset + 0x18)[0]
         projectile.x = projectile.position.x
         projectile.y = projectile.position.y
-        projectile.speed.x = np.ndarray((1,), ">f", event_bytes, 0xC)[0]
-        projectile.speed.y = np.ndarray((1,), ">f", event_bytes, 0x10)[0]
+        projectile.speed.x = np.ndarray((1,), ">f", buffer, offset + 0xC)[0]
+        projectile.speed.y = np.ndarray((1,), ">f", buffer, offset + 0x10)[0]
         projectile.x_speed = projectile.speed.x
         projectile.y_speed = projectile.speed.y
         try:
-            projectile.owner = np.ndarray((1,), ">B", event_bytes, 0x2A)[0] + 1
+            projectile.owner = np.ndarray((1,), ">B", buffer, offset + 0x2A)[0] + 1
             if projectile.owner > 4:
                 projectile.owner = -1
         except TypeError:
             projectile.owner = -1
-        try:
-            projectile.type = enums.ProjectileType(
-                np.ndarray((1,), ">H", event_bytes, 0x5)[0]
-            )
-        except ValueError:
-            projectile.type = enums.ProjectileType.UNKNOWN_PROJECTILE
+        projectile.type = eventdecoder.PROJECTILE_TYPES[
+            np.ndarray((1,), ">H", buffer, offset + 0x5)[0]
+        ]
 
         try:
             projectile.frame = int(np.ndarray(
-                (1,), ">f", event_bytes, 0x1E)[0])
+                (1,), ">f", buffer, offset + 0x1E)[0])
         except ValueError:
             projectile.frame = -1
 
-        projectile.subtype = np.ndarray((1,), ">B", event_bytes, 0x7)[0]
+        projectile.subtype = np.ndarray((1,), ">B", buffer, offset + 0x7)[0]
 
         # Ignore exploded Samus bombs. They are subtype 3
         if (
@@ -1042,153 +1235,57 @@ class Console:
         Modifies specified gamestate based on the event bytes
         """
         scene = np.ndarray((1,), ">H", event_bytes, 0x1)[0]
-        if scene == 0x02:
-            gamestate.menu_state = enums.Menu.CHARACTER_SELECT
+        gamestate.menu_state = _MENU_SCENES.get(scene, enums.Menu.UNKNOWN_MENU)
+        if gamestate.menu_state in _ALL_PORTS_MENUS:
             # All the controller ports are active on this screen
-            gamestate.players[1] = PlayerState()
-            gamestate.players[2] = PlayerState()
-            gamestate.players[3] = PlayerState()
-            gamestate.players[4] = PlayerState()
-        elif scene in [0x0102, 0x0108]:
-            gamestate.menu_state = enums.Menu.STAGE_SELECT
-            gamestate.players[1] = PlayerState()
-            gamestate.players[2] = PlayerState()
-            gamestate.players[3] = PlayerState()
-            gamestate.players[4] = PlayerState()
-        elif scene == 0x0202:
-            gamestate.menu_state = enums.Menu.IN_GAME
-        elif scene == 0x0001:
-            gamestate.menu_state = enums.Menu.MAIN_MENU
-        elif scene == 0x0008:
-            gamestate.menu_state = enums.Menu.SLIPPI_ONLINE_CSS
-            gamestate.players[1] = PlayerState()
-            gamestate.players[2] = PlayerState()
-            gamestate.players[3] = PlayerState()
-            gamestate.players[4] = PlayerState()
-        elif scene == 0x0000:
-            gamestate.menu_state = enums.Menu.PRESS_START
-        elif scene == 0x0402:
-            gamestate.menu_state = enums.Menu.POSTGAME_SCORES
-        else:
-            gamestate.menu_state = enums.Menu.UNKNOWN_MENU
+            for port in range(1, 5):
+                gamestate.new_player(port)
 
         # controller port statuses at CSS
         if gamestate.menu_state in [
             enums.Menu.CHARACTER_SELECT,
             enums.Menu.SLIPPI_ONLINE_CSS,
         ]:
-            gamestate.players[1].controller_status = enums.ControllerStatus(
-                np.ndarray((1,), ">B", event_bytes, 0x25)[0]
-            )
-            gamestate.players[2].controller_status = enums.ControllerStatus(
-                np.ndarray((1,), ">B", event_bytes, 0x26)[0]
-            )
-            gamestate.players[3].controller_status = enums.ControllerStatus(
-                np.ndarray((1,), ">B", event_bytes, 0x27)[0]
-            )
-            gamestate.players[4].controller_status = enums.ControllerStatus(
-                np.ndarray((1,), ">B", event_bytes, 0x28)[0]
-            )
+            for i in range(4):
+                player = gamestate.players[i + 1]
+                player.controller_status = eventdecoder.CONTROLLER_STATUSES[
+                    np.ndarray((1,), ">B", event_bytes, 0x25 + i)[0]
+                ]
 
-            # CSS Cursors
-            gamestate.players[1].cursor_x = np.ndarray(
-                (1,), ">f", event_bytes, 0x3)[0]
-            gamestate.players[1].cursor_y = np.ndarray(
-                (1,), ">f", event_bytes, 0x7)[0]
-            gamestate.players[2].cursor_x = np.ndarray(
-                (1,), ">f", event_bytes, 0xB)[0]
-            gamestate.players[2].cursor_y = np.ndarray(
-                (1,), ">f", event_bytes, 0xF)[0]
-            gamestate.players[3].cursor_x = np.ndarray(
-                (1,), ">f", event_bytes, 0x13)[0]
-            gamestate.players[3].cursor_y = np.ndarray(
-                (1,), ">f", event_bytes, 0x17)[0]
-            gamestate.players[4].cursor_x = np.ndarray(
-                (1,), ">f", event_bytes, 0x1B)[0]
-            gamestate.players[4].cursor_y = np.ndarray(
-                (1,), ">f", event_bytes, 0x1F)[0]
+                # CSS Cursors
+                player.cursor_x = np.ndarray((1,), ">f", event_bytes, 0x3 + 8 * i)[0]
+                player.cursor_y = np.ndarray((1,), ">f", event_bytes, 0x7 + 8 * i)[0]
 
             # Ready to fight banner
             gamestate.ready_to_start = np.ndarray(
                 (1,), ">B", event_bytes, 0x23)[0]
 
-            # Character selected
-            try:
-                gamestate.players[1].character = enums.to_internal(
-                    np.ndarray((1,), ">B", event_bytes, 0x29)[0]
-                )
-                gamestate.players[1].character_selected = gamestate.players[1].character
-            except TypeError:
-                gamestate.players[1].character = enums.Character.UNKNOWN_CHARACTER
-                gamestate.players[
-                    1
-                ].character_selected = enums.Character.UNKNOWN_CHARACTER
-            try:
-                gamestate.players[2].character = enums.to_internal(
-                    np.ndarray((1,), ">B", event_bytes, 0x2A)[0]
-                )
-                gamestate.players[2].character_selected = gamestate.players[2].character
-            except TypeError:
-                gamestate.players[2].character = enums.Character.UNKNOWN_CHARACTER
-                gamestate.players[
-                    2
-                ].character_selected = enums.Character.UNKNOWN_CHARACTER
-            try:
-                gamestate.players[3].character = enums.to_internal(
-                    np.ndarray((1,), ">B", event_bytes, 0x2B)[0]
-                )
-                gamestate.players[3].character_selected = gamestate.players[3].character
+            for i in range(4):
+                player = gamestate.players[i + 1]
+                # Character selected
+                try:
+                    player.character = eventdecoder.CSS_CHARACTERS[
+                        np.ndarray((1,), ">B", event_bytes, 0x29 + i)[0]
+                    ]
+                except TypeError:
+                    player.character = enums.Character.UNKNOWN_CHARACTER
+                player.character_selected = player.character
 
-            except TypeError:
-                gamestate.players[3].character = enums.Character.UNKNOWN_CHARACTER
-                gamestate.players[
-                    3
-                ].character_selected = enums.Character.UNKNOWN_CHARACTER
-            try:
-                gamestate.players[4].character = enums.to_internal(
-                    np.ndarray((1,), ">B", event_bytes, 0x2C)[0]
-                )
-                gamestate.players[4].character_selected = gamestate.players[4].character
-            except TypeError:
-                gamestate.players[4].character = enums.Character.UNKNOWN_CHARACTER
-                gamestate.players[
-                    4
-                ].character_selected = enums.Character.UNKNOWN_CHARACTER
-
-            # Coin down
-            try:
-                gamestate.players[1].coin_down = (
-                    np.ndarray((1,), ">B", event_bytes, 0x2D)[0] == 2
-                )
-            except TypeError:
-                gamestate.players[1].coin_down = False
-            try:
-                gamestate.players[2].coin_down = (
-                    np.ndarray((1,), ">B", event_bytes, 0x2E)[0] == 2
-                )
-            except TypeError:
-                gamestate.players[2].coin_down = False
-            try:
-                gamestate.players[3].coin_down = (
-                    np.ndarray((1,), ">B", event_bytes, 0x2F)[0] == 2
-                )
-            except TypeError:
-                gamestate.players[3].coin_down = False
-            try:
-                gamestate.players[4].coin_down = (
-                    np.ndarray((1,), ">B", event_bytes, 0x30)[0] == 2
-                )
-            except TypeError:
-                gamestate.players[4].coin_down = False
+            for i in range(4):
+                player = gamestate.players[i + 1]
+                # Coin down
+                try:
+                    player.coin_down = (
+                        np.ndarray((1,), ">B", event_bytes, 0x2D + i)[0] == 2
+                    )
+                except TypeError:
+                    player.coin_down = False
 
         if gamestate.menu_state == enums.Menu.STAGE_SELECT:
             # Stage
-            try:
-                gamestate.stage = enums.Stage(
-                    np.ndarray((1,), ">B", event_bytes, 0x24)[0]
-                )
-            except ValueError:
-                gamestate.stage = enums.Stage.NO_STAGE
+            gamestate.stage = eventdecoder.STAGES[
+                np.ndarray((1,), ">B", event_bytes, 0x24)[0]
+            ]
 
             # Stage Select Cursor X, Y
             for _, player in gamestate.players.items():
@@ -1202,13 +1299,11 @@ class Console:
 
         # Sub-menu
         try:
-            gamestate.submenu = enums.SubMenu(
+            gamestate.submenu = eventdecoder.SUBMENUS[
                 np.ndarray((1,), ">B", event_bytes, 0x3D)[0]
-            )
+            ]
         except TypeError:
             gamestate.submenu = enums.SubMenu.UNKNOWN_SUBMENU
-        except ValueError:
-            gamestate.submenu = enums.SubMenu.UNKNOWN_SUBMENU
 
         # Selected menu
         try:
@@ -1271,9 +1366,11 @@ class Console:
     def __fixframeindexing(self, gamestate):
         """Melee's indexing of action frames is wildly inconsistent.
         Here we adjust all of the frames to be indexed at 1 (so math is easier)"""
-        for _, player in gamestate.players.items():
+        for port, player in gamestate.players.items():
             if player.action.value in self.zero_indices[player.character.value]:
                 player.action_frame = player.action_frame + 1
+                if self.columns is not None:
+                    self.columns.players[port - 1, _ACTION_FRAME_COLUMN] = player.action_frame
 
     def __fixiasa(self, gamestate):
         """The IASA flag doesn't set or reset for special attacks.
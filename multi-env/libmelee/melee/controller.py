@@ -91,6 +91,20 @@ class ControllerState:
         buffer += val
         return buffer
 
+    def toCommands(self):
+        """Serialize the whole controller state into Dolphin pipe commands, minus the FLUSH
+
+        Sending these puts the controller in this state no matter what state it was in before.
+        """
+        commands = []
+        for button, pressed in self.button.items():
+            commands.append(("PRESS " if pressed else "RELEASE ") + button.value + "\n")
+        commands.append("SET MAIN %s %s\n" % self.main_stick)
+        commands.append("SET C %s %s\n" % self.c_stick)
+        commands.append("SET L %s\n" % self.l_shoulder)
+        commands.append("SET R %s\n" % self.r_shoulder)
+        return "".join(commands)
+
     def __str__(self):
         string = ""
         for val in self.button:
@@ -116,6 +130,7 @@ class Controller:
         port,
         type=enums.ControllerType.STANDARD,
         serial_device="/dev/ttyACM0",
+        diff_input=False,
     ):
         """Create a new virtual controller
 
@@ -123,6 +138,10 @@ class Controller:
             console (console.Console): A console object to attach the controller to
             port (int): Which controller port to plug into. Must be 1-4.
             type (enums.ControllerType): The type of controller this is
+            diff_input (bool): Only send Dolphin the parts of the controller state that
+                changed since the last flush, instead of every command as it's made.
+                Either way, commands are queued up and written to the pipe in one go
+                when flushing.
         """
         self._is_dolphin = console.system == "dolphin"
         if self._is_dolphin:
@@ -143,6 +162,12 @@ class Controller:
         self.port = port
         self.prev = ControllerState()
         self.current = ControllerState()
+        self.diff_input = diff_input
+        self.bytes_written = 0
+        """(int): Total bytes written to the Dolphin pipe"""
+        self.writes = 0
+        """(int): Total write calls made on the Dolphin pipe"""
+        self._pending = []
         self.logger = console.logger
         self._console = console
         self._type = type
@@ -273,7 +298,7 @@ class Controller:
         if self.logger:
             self.logger.log("Buttons Pressed", command, concat=True)
         if self._is_dolphin:
-            if not self.pipe:
+            if not self.pipe or self.diff_input:
                 return
             self._write(command)
 
@@ -290,7 +315,7 @@ class Controller:
         if self.logger:
             self.logger.log("Buttons Pressed", command, concat=True)
         if self._is_dolphin:
-            if not self.pipe:
+            if not self.pipe or self.diff_input:
                 return
             self._write(command)
 
@@ -314,7 +339,7 @@ class Controller:
         if self.logger:
             self.logger.log("Buttons Pressed", command, concat=True)
         if self._is_dolphin:
-            if not self.pipe:
+            if not self.pipe or self.diff_input:
                 return
             self._write(command)
 
@@ -334,7 +359,7 @@ class Controller:
         if self.logger:
             self.logger.log("Buttons Pressed", command, concat=True)
         if self._is_dolphin:
-            if not self.pipe:
+            if not self.pipe or self.diff_input:
                 return
             self._write(command)
 
@@ -349,25 +374,7 @@ class Controller:
             x (float): Ranges between -1 (left) and 1 (right)
             y (float): Ranges between -1 (down) and 1 (up)
         """
-        if button == enums.Button.BUTTON_MAIN:
-            self.current.main_stick = (x, y)
-        else:
-            self.current.c_stick = (x, y)
-        command = (
-            "SET "
-            + str(button.value)
-            + " "
-            + str((x / 2) + 0.5)
-            + " "
-            + str((y / 2) + 0.5)
-            + "\n"
-        )
-        if self.logger:
-            self.logger.log("Buttons Pressed", command, concat=True)
-        if self._is_dolphin:
-            if not self.pipe:
-                return
-            self._write(command)
+        self.tilt_analog(button, (x / 2) + 0.5, (y / 2) + 0.5)
 
     # Left around for compat reasons. Might disappear at any time
     #   left undocumented. Just use release_all()
@@ -397,7 +404,7 @@ class Controller:
         self.current.l_shoulder = 0
         self.current.r_shoulder = 0
         if self._is_dolphin:
-            if not self.pipe:
+            if not self.pipe or self.diff_input:
                 return
             command = "RELEASE A" + "\n"
             command += "RELEASE B" + "\n"
@@ -420,15 +427,57 @@ class Controller:
         if self.logger:
             self.logger.log("Buttons Pressed", "Empty Input", concat=True)
 
+    def set_state(self, state, commands=None):
+        """Set the whole controller state at once
+
+        Args:
+            state (ControllerState): State to put the controller in. It's copied, so
+                the same object can be reused every frame.
+            commands (str): Precomputed state.toCommands(), to skip serializing the
+                state on every call.
+        """
+        self.current = copy.copy(state)
+        self.current.button = dict(state.button)
+        if self.logger:
+            self.logger.log("Buttons Pressed", "Set State", concat=True)
+        if self._is_dolphin:
+            if not self.pipe or self.diff_input:
+                return
+            self._write(commands if commands is not None else state.toCommands())
+
     def _write(self, command):
-        """Platform independent button write function."""
+        """Queue up a command, to be sent on the next flush"""
+        self._pending.append(command)
+
+    def _send(self):
+        """Platform independent write of all the queued commands, as one write"""
+        data = "".join(self._pending)
+        self._pending.clear()
+        self.bytes_written += len(data)
+        self.writes += 1
         if platform.system() == "Windows":
             try:
-                win32file.WriteFile(self.pipe, command.encode())
+                win32file.WriteFile(self.pipe, data.encode())
             except pywintypes.error:
                 pass
         else:
-            self.pipe.write(command)
+            self.pipe.write(data)
+            self.pipe.flush()
+
+    def _diff(self):
+        """Queue up commands for whatever changed between prev and current"""
+        prev, current = self.prev, self.current
+        for button, pressed in current.button.items():
+            if prev.button[button] != pressed:
+                self._write(("PRESS " if pressed else "RELEASE ") + button.value + "\n")
+        if current.main_stick != prev.main_stick:
+            self._write("SET MAIN %s %s\n" % current.main_stick)
+        if current.c_stick != prev.c_stick:
+            self._write("SET C %s %s\n" % current.c_stick)
+        if current.l_shoulder != prev.l_shoulder:
+            self._write("SET L %s\n" % current.l_shoulder)
+        if current.r_shoulder != prev.r_shoulder:
+            self._write("SET R %s\n" % current.r_shoulder)
 
     def flush(self):
         """Actually send the button presses to the console
@@ -436,16 +485,18 @@ class Controller:
         Up until this point, any buttons you 'press' are just queued in a pipe.
         It doesn't get sent to the console until you flush
         """
+        if self._is_dolphin and self.pipe:
+            if self.diff_input:
+                self._diff()
+            self._write("FLUSH\n")
+            self._send()
+
         # Move the current controller state into the previous one
+        #   The button dict is copied too, so prev doesn't change along with current
         self.prev = copy.copy(self.current)
+        self.prev.button = dict(self.current.button)
 
-        if self._is_dolphin:
-            self._write("FLUSH\n")
-            if platform.system() != "Windows":
-                if not self.pipe:
-                    return
-                self.pipe.flush()
-        else:
+        if not self._is_dolphin:
             # Command for "send single controller poll" is 'A'
             # Serialize controller state into bytes and send
             self.tastm32.write(b"A" + self.current.toBytes())
@@ -0,0 +1,202 @@
+"""Bulk conversion of SLP replays into columnar tables, for training on
+
+Every game becomes one table with a row per frame. Player state goes in columns named
+p<port>_<field>, holding the raw decoded values listed in melee.columnar.FIELDS, next
+to a frame column and the metadata columns stage, slp_version and winner.
+Characters are in the p<port>_character columns.
+
+Games are decoded in a process pool. Each output file is named after the SHA-256 of the
+replay it came from, so running the conversion again skips everything that is already
+done, even if replays were renamed or moved in the meantime.
+
+Run it as a script:
+    python3 -m melee.dataset /root/slippi_replays /root/dataset --format parquet
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+try:
+    import pyarrow
+    import pyarrow.feather
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+from melee import enums
+from melee.columnar import COLUMN, FIELDS
+from melee.console import Console
+
+EXTENSIONS = {"parquet": ".parquet", "arrow": ".arrow", "npz": ".npz"}
+"""(dict of str - str): Supported output formats and their file extensions"""
+
+MANIFEST = "manifest.jsonl"
+
+
+def file_hash(path):
+    """Returns the hex SHA-256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _winner(players, ports):
+    """Port with the most stocks left, then the least percent. 0 for a draw"""
+    stock, percent = COLUMN["stock"], COLUMN["percent"]
+    ranked = sorted(ports, key=lambda port: (-players[port - 1, stock], players[port - 1, percent]))
+    if len(ranked) < 2:
+        return ranked[0] if ranked else 0
+    first, second = players[ranked[0] - 1], players[ranked[1] - 1]
+    if (first[stock], first[percent]) == (second[stock], second[percent]):
+        return 0
+    return ranked[0]
+
+
+def read_game(path):
+    """Decode a whole SLP file into columns
+
+    Returns:
+        dict of column name to np.ndarray, one entry per frame
+
+    Raises:
+        ValueError: If the file can't be read
+    """
+    console = Console(system="file", path=path, allow_old_version=True, array_mirror=True)
+    if not console.connect():
+        raise ValueError("not a readable SLP file: %s" % path)
+    frames = []
+    rows = []
+    stage = enums.Stage.NO_STAGE
+    while True:
+        gamestate = console.step()
+        if gamestate is None:
+            break
+        frames.append(gamestate.frame)
+        rows.append(gamestate.columns.players.copy())
+        stage = gamestate.stage
+    console.stop()
+    if not frames:
+        raise ValueError("no frames in %s" % path)
+
+    players = np.stack(rows)
+    ports = [int(port) + 1 for port in np.flatnonzero(console.columns.active)]
+    count = len(frames)
+    columns = {"frame": np.asarray(frames, dtype=np.int32)}
+    for port in ports:
+        for field in FIELDS:
+            columns["p%d_%s" % (port, field)] = players[:, port - 1, COLUMN[field]]
+    columns["stage"] = np.full(count, stage.value, dtype=np.int32)
+    columns["slp_version"] = np.full(count, console.slp_version)
+    columns["winner"] = np.full(count, _winner(players[-1], ports), dtype=np.int8)
+    return columns
+
+
+def _write(columns, path, fmt):
+    # Write next to the final file and rename, so a killed run never leaves a
+    #   half-written table that a rerun would mistake for a finished one
+    partial = path + ".partial"
+    if fmt == "npz":
+        with open(partial, "wb") as file:
+            np.savez_compressed(file, **columns)
+    else:
+        table = pyarrow.table(columns)
+        if fmt == "parquet":
+            pyarrow.parquet.write_table(table, partial)
+        else:
+            pyarrow.feather.write_feather(table, partial)
+    os.replace(partial, path)
+
+
+def convert_file(path, output_dir, fmt="parquet"):
+    """Convert a single SLP file, unless it's been converted already
+
+    Returns:
+        dict with the source path, content hash, output path, status ("converted",
+        "skipped" or "failed"), frame count and error message, for the manifest
+    """
+    result = {"source": str(path), "hash": None, "output": None, "frames": 0}
+    try:
+        digest = file_hash(path)
+        output = os.path.join(output_dir, digest + EXTENSIONS[fmt])
+        result.update(hash=digest, output=output)
+        if os.path.exists(output):
+            result["status"] = "skipped"
+            return result
+        columns = read_game(path)
+        _write(columns, output, fmt)
+        result.update(status="converted", frames=len(columns["frame"]))
+    except Exception as error:  # pylint: disable=broad-except
+        result.update(status="failed", error="%s: %s" % (type(error).__name__, error))
+    return result
+
+
+def find_replays(input_dir):
+    """Returns the paths of all .slp files under a directory, sorted"""
+    paths = []
+    for root, _, names in os.walk(input_dir):
+        paths.extend(os.path.join(root, name) for name in names if name.endswith(".slp"))
+    return sorted(paths)
+
+
+def convert_directory(input_dir, output_dir, fmt="parquet", workers=None, progress=None):
+    """Convert every SLP file under input_dir in a process pool
+
+    A line per replay is appended to manifest.jsonl in the output directory.
+
+    Args:
+        input_dir (str): Directory to search for .slp files, recursively
+        output_dir (str): Where to write the tables. Created if needed.
+        fmt (str): One of "parquet", "arrow" or "npz". The first two need pyarrow.
+        workers (int): Number of processes. Defaults to the number of CPUs.
+        progress (callable): Called with each result dict as it completes
+
+    Returns:
+        dict of status to count
+    """
+    if fmt not in EXTENSIONS:
+        raise ValueError("unknown format %r, expected one of %s" % (fmt, sorted(EXTENSIONS)))
+    if fmt != "npz" and pyarrow is None:
+        raise ImportError("the %s format needs pyarrow installed" % fmt)
+    os.makedirs(output_dir, exist_ok=True)
+    counts = {"converted": 0, "skipped": 0, "failed": 0}
+    paths = find_replays(input_dir)
+    with ProcessPoolExecutor(max_workers=workers) as pool, open(
+        os.path.join(output_dir, MANIFEST), "a"
+    ) as manifest:
+        futures = [pool.submit(convert_file, path, output_dir, fmt) for path in paths]
+        for future in as_completed(futures):
+            result = future.result()
+            counts[result["status"]] += 1
+            manifest.write(json.dumps(result) + "\n")
+            manifest.flush()
+            if progress is not None:
+                progress(result)
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert SLP replays into columnar tables")
+    parser.add_argument("input", help="Directory of .slp files")
+    parser.add_argument("output", help="Directory to write the tables to")
+    parser.add_argument("--format", default="parquet", choices=sorted(EXTENSIONS))
+    parser.add_argument("--workers", type=int, default=None, help="Number of processes")
+    args = parser.parse_args()
+
+    start = time.time()
+
+    def _print(result):
+        print("%-9s %s" % (result["status"], result["source"]))
+
+    totals = convert_directory(args.input, args.output, args.format, args.workers, _print)
+    print(
+        "%d converted, %d skipped, %d failed in %.1fs"
+        % (totals["converted"], totals["skipped"], totals["failed"], time.time() - start)
+    )
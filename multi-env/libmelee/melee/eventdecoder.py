@@ -0,0 +1,233 @@
+"""Precompiled decoders for fixed-layout Slippi events
+
+Pre-frame and post-frame events make up nearly all of the data in a Slippi stream.
+Rather than reading each field out of the event individually, these decoders compile
+the whole layout into a single struct.Struct that unpacks an event in one call.
+
+Older SLP versions have shorter events. The layout is compiled once per event size
+(as announced in the PAYLOADS event), and fields that don't fit in the event are
+filled in with defaults.
+
+Raw ids read out of events are turned into enum members with the lookup lists at the
+bottom of this module, which have an entry for every possible id, so unknown ids map
+to a fallback member without raising.
+"""
+
+import struct
+
+from melee import enums
+
+
+class EventDecoder:
+    """Unpacks all the fields of a fixed-layout event with a single struct call
+
+    Args:
+        fields (list of (str, int, str, object)): Name, byte offset into the event
+            (counting the command byte), struct format character, and the default
+            value to use when the event is too short to contain the field.
+            Must be given in increasing, non-overlapping offset order.
+    """
+
+    def __init__(self, fields):
+        self.fields = tuple(fields)
+        self.names = tuple(field[0] for field in self.fields)
+        """(tuple of str): Names of the decoded values, in the order they are returned"""
+        self._layouts = {}
+
+    def subset(self, names):
+        """Returns an EventDecoder for just the named fields, in this decoder's order
+
+        Its decode() skips over the bytes of every other field.
+        """
+        return EventDecoder(field for field in self.fields if field[0] in names)
+
+    def _compile(self, event_size):
+        """Build the struct for events of the given size"""
+        fmt = ">"
+        cursor = 0
+        present = 0
+        for _, offset, code, _ in self.fields:
+            end = offset + struct.calcsize(">" + code)
+            if end > event_size:
+                break
+            if offset > cursor:
+                fmt += str(offset - cursor) + "x"
+            fmt += code
+            cursor = end
+            present += 1
+        defaults = tuple(field[3] for field in self.fields[present:])
+        layout = (struct.Struct(fmt), defaults)
+        self._layouts[event_size] = layout
+        return layout
+
+    def decode(self, buffer, offset, event_size):
+        """Decode a single event
+
+        Args:
+            buffer (bytes-like): Buffer holding the event
+            offset (int): Index of the event's command byte in the buffer
+            event_size (int): Size of the event, including the command byte
+
+        Returns:
+            tuple of values, in the same order as `names`
+        """
+        layout = self._layouts.get(event_size)
+        if layout is None:
+            layout = self._compile(event_size)
+        unpacker, defaults = layout
+        values = unpacker.unpack_from(buffer, offset)
+        if defaults:
+            return values + defaults
+        return values
+
+
+PRE_FRAME = EventDecoder(
+    [
+        ("frame", 0x1, "i", 0),
+        ("port", 0x5, "B", 0),
+        ("is_nana", 0x6, "B", 0),
+        ("main_x", 0x19, "f", 0.0),
+        ("main_y", 0x1D, "f", 0.0),
+        ("c_x", 0x21, "f", 0.0),
+        ("c_y", 0x25, "f", 0.0),
+        ("trigger", 0x29, "f", 0.0),
+        ("buttons", 0x31, "H", 0),
+        ("raw_main_x", 0x3B, "b", 0),
+        ("raw_main_y", 0x40, "b", 0),
+    ]
+)
+"""(EventDecoder): Decoder for PRE_FRAME events"""
+
+POST_FRAME = EventDecoder(
+    [
+        ("frame", 0x1, "i", 0),
+        ("port", 0x5, "B", 0),
+        ("is_nana", 0x6, "B", 0),
+        ("character", 0x7, "B", 0),
+        ("action", 0x8, "H", 0),
+        ("x", 0xA, "f", 0.0),
+        ("y", 0xE, "f", 0.0),
+        ("facing", 0x12, "f", 0.0),
+        ("percent", 0x16, "f", 0.0),
+        ("shield_strength", 0x1A, "f", 0.0),
+        ("stock", 0x21, "B", 0),
+        ("action_frame", 0x22, "f", 0.0),
+        ("state_bits_4", 0x29, "B", 0),
+        ("hitstun_frames_left", 0x2B, "f", 0.0),
+        ("airborne", 0x2F, "B", 0),
+        ("jumps_left", 0x32, "B", 1),
+        ("hurtbox_status", 0x34, "B", 0),
+        ("speed_air_x_self", 0x35, "f", 0),
+        ("speed_y_self", 0x39, "f", 0),
+        ("speed_x_attack", 0x3D, "f", 0),
+        ("speed_y_attack", 0x41, "f", 0),
+        ("speed_ground_x_self", 0x45, "f", 0),
+        ("hitlag_left", 0x49, "f", 0.0),
+        ("ecb_top_x", 0x51, "f", 0),
+        ("ecb_top_y", 0x55, "f", 0),
+        ("ecb_bottom_x", 0x59, "f", 0),
+        ("ecb_bottom_y", 0x5D, "f", 0),
+        ("ecb_left_x", 0x61, "f", 0),
+        ("ecb_left_y", 0x65, "f", 0),
+        ("ecb_right_x", 0x69, "f", 0),
+        ("ecb_right_y", 0x6D, "f", 0),
+        ("fod_platform_left", 0x71, "f", 0),
+        ("fod_platform_right", 0x75, "f", 0),
+    ]
+)
+"""(EventDecoder): Decoder for POST_FRAME events"""
+
+PRE_FRAME_HEAD = PRE_FRAME.subset(("frame", "port", "is_nana"))
+"""(EventDecoder): Just the player a PRE_FRAME event is for, see Console(lazy_decoding=True)"""
+
+POST_FRAME_HEAD = POST_FRAME.subset(
+    (
+        "frame",
+        "port",
+        "is_nana",
+        "character",
+        "action",
+        "x",
+        "y",
+        "facing",
+        "percent",
+        "stock",
+        "action_frame",
+        "airborne",
+        "hurtbox_status",
+        "fod_platform_left",
+        "fod_platform_right",
+    )
+)
+"""(EventDecoder): Just the POST_FRAME fields that Console needs every frame, see
+    Console(lazy_decoding=True)"""
+
+BUTTON_BITS = (
+    (enums.Button.BUTTON_A, 0x0100),
+    (enums.Button.BUTTON_B, 0x0200),
+    (enums.Button.BUTTON_X, 0x0400),
+    (enums.Button.BUTTON_Y, 0x0800),
+    (enums.Button.BUTTON_START, 0x1000),
+    (enums.Button.BUTTON_Z, 0x0010),
+    (enums.Button.BUTTON_R, 0x0020),
+    (enums.Button.BUTTON_L, 0x0040),
+    (enums.Button.BUTTON_D_LEFT, 0x0001),
+    (enums.Button.BUTTON_D_RIGHT, 0x0002),
+    (enums.Button.BUTTON_D_DOWN, 0x0004),
+    (enums.Button.BUTTON_D_UP, 0x0008),
+)
+"""(tuple of (enums.Button, int)): Bit of each button in the pre-frame button bits"""
+
+
+def fill_controller_state(controller_state, values):
+    """Set a controller.ControllerState from the values of a decoded PRE_FRAME event"""
+    _, _, _, main_x, main_y, c_x, c_y, trigger, buttonbits, raw_main_x, raw_main_y = values
+    controller_state.main_stick = ((main_x / 2) + 0.5, (main_y / 2) + 0.5)
+    controller_state.c_stick = ((c_x / 2) + 0.5, (c_y / 2) + 0.5)
+    controller_state.raw_main_stick = (raw_main_x, raw_main_y)
+
+    # The game interprets both shoulders together, so the processed value will always be the same
+    controller_state.l_shoulder = trigger
+    controller_state.r_shoulder = trigger
+
+    button = controller_state.button
+    for name, bit in BUTTON_BITS:
+        button[name] = bool(buttonbits & bit)
+
+
+def enum_table(enum, size, default):
+    """List mapping every raw id in range(size) to its member of enum
+
+    Args:
+        enum (Enum): Enum class whose values are the raw ids
+        size (int): Number of possible ids, 0x100 for a byte and 0x10000 for a short
+        default: Member for ids that aren't in the enum
+
+    Returns:
+        list of enum members, indexed by raw id
+    """
+    table = [default] * size
+    for member in enum:
+        if 0 <= member.value < size:
+            table[member.value] = member
+    return table
+
+
+CHARACTERS = enum_table(enums.Character, 0x100, enums.Character.UNKNOWN_CHARACTER)
+"""(list of enums.Character): Internal character id to Character"""
+CSS_CHARACTERS = [enums.to_internal(char_id) for char_id in range(0x100)]
+"""(list of enums.Character): Character select screen id to Character, see enums.to_internal"""
+ACTIONS = enum_table(enums.Action, 0x10000, enums.Action.UNKNOWN_ANIMATION)
+"""(list of enums.Action): Action state id to Action"""
+PROJECTILE_TYPES = enum_table(
+    enums.ProjectileType, 0x10000, enums.ProjectileType.UNKNOWN_PROJECTILE
+)
+"""(list of enums.ProjectileType): Item type id to ProjectileType"""
+STAGES = enum_table(enums.Stage, 0x100, enums.Stage.NO_STAGE)
+"""(list of enums.Stage): Stage select screen id to Stage"""
+SUBMENUS = enum_table(enums.SubMenu, 0x100, enums.SubMenu.UNKNOWN_SUBMENU)
+"""(list of enums.SubMenu): Sub-menu id to SubMenu"""
+CONTROLLER_STATUSES = enum_table(
+    enums.ControllerStatus, 0x100, enums.ControllerStatus.CONTROLLER_UNPLUGGED
+)
+"""(list of enums.ControllerStatus): Controller port status byte to ControllerStatus"""
@@ -7,12 +7,140 @@ and state information that would be difficult to discover on your own.
 
 import csv
 import math
-import os
 from collections import defaultdict
 
-from melee import stages
+import numpy as np
+
+from melee import stages, staticdata
 from melee.enums import Action, AttackState, Character
 
+HITBOXES = 4
+"""(int): Number of hitboxes recorded per frame"""
+
+
+def _compile_framedata(path):
+    """Compile framedata.csv into flat numpy arrays
+
+    Every (character, action) pair in the CSV gets a slot. The per-frame arrays have one
+    row for each frame from the slot's first to last recorded frame, stored back to back,
+    so a frame is found with a couple of index lookups. Frames missing from the CSV get
+    a row with present set to False.
+
+    Returns:
+        dict of str to np.ndarray
+    """
+    actions = defaultdict(dict)
+    with open(path) as csvfile:
+        for row in csv.DictReader(csvfile):
+            key = (int(row["character"]), int(row["action"]))
+            actions[key][int(row["frame"])] = row
+    keys = sorted(actions)
+
+    slot_first = np.array([min(actions[key]) for key in keys], dtype=np.int32)
+    slot_length = np.array(
+        [max(actions[key]) - min(actions[key]) + 1 for key in keys], dtype=np.int32
+    )
+    slot_start = np.zeros(len(keys), dtype=np.int64)
+    np.cumsum(slot_length[:-1], out=slot_start[1:])
+    total = int(slot_length.sum())
+
+    slots = np.full(
+        (
+            max((key[0] for key in keys), default=0) + 1,
+            max((key[1] for key in keys), default=0) + 1,
+        ),
+        -1,
+        dtype=np.int32,
+    )
+    tables = {
+        "present": np.zeros(total, dtype=bool),
+        "hitbox_status": np.zeros((total, HITBOXES), dtype=bool),
+        "hitbox_size": np.zeros((total, HITBOXES)),
+        "hitbox_x": np.zeros((total, HITBOXES)),
+        "hitbox_y": np.zeros((total, HITBOXES)),
+        "locomotion_x": np.zeros(total),
+        "locomotion_y": np.zeros(total),
+        "iasa": np.zeros(total, dtype=bool),
+        "facing_changed": np.zeros(total, dtype=bool),
+        "projectile": np.zeros(total, dtype=bool),
+    }
+    for slot, key in enumerate(keys):
+        slots[key] = slot
+        for frame, row in actions[key].items():
+            index = slot_start[slot] + frame - slot_first[slot]
+            tables["present"][index] = True
+            for i in range(HITBOXES):
+                prefix = "hitbox_%d_" % (i + 1)
+                tables["hitbox_status"][index, i] = row[prefix + "status"] == "True"
+                tables["hitbox_size"][index, i] = float(row[prefix + "size"])
+                tables["hitbox_x"][index, i] = float(row[prefix + "x"])
+                tables["hitbox_y"][index, i] = float(row[prefix + "y"])
+            tables["locomotion_x"][index] = float(row["locomotion_x"])
+            tables["locomotion_y"][index] = float(row["locomotion_y"])
+            for field in ("iasa", "facing_changed", "projectile"):
+                tables[field][index] = row[field] == "True"
+
+    tables.update(slots=slots, slot_first=slot_first, slot_length=slot_length, slot_start=slot_start)
+    tables.update(_summarize(tables))
+    return tables
+
+
+def _summarize(tables):
+    """Per-action summaries, and per-frame running totals over the rest of the action"""
+    status = tables["hitbox_status"]
+    hit = status.any(axis=1) | tables["projectile"]
+    # How far the active hitboxes of each frame reach, forwards and backwards
+    reach_forward = np.where(status, tables["hitbox_size"] + tables["hitbox_x"], 0).max(axis=1)
+    reach_backward = np.where(status, -tables["hitbox_size"] + tables["hitbox_x"], 0).min(axis=1)
+    reach_forward = np.maximum(reach_forward, 0)
+    reach_backward = np.minimum(reach_backward, 0)
+
+    count = len(tables["slot_first"])
+    summary = {
+        "frame_count": np.full(count, -1, dtype=np.int32),
+        "first_hitbox_frame": np.full(count, -1, dtype=np.int32),
+        "last_hitbox_frame": np.full(count, -1, dtype=np.int32),
+        "iasa_frame": np.full(count, -1, dtype=np.int32),
+        "hitbox_count": np.zeros(count, dtype=np.int32),
+        "max_range_forward": np.zeros(count),
+        "max_range_backward": np.zeros(count),
+        "range_forward_after": np.zeros(len(hit)),
+        "range_backward_after": np.zeros(len(hit)),
+        "locomotion_x_after": np.zeros(len(hit)),
+    }
+    for slot in range(count):
+        start = tables["slot_start"][slot]
+        stop = start + tables["slot_length"][slot]
+        first = tables["slot_first"][slot]
+        frames = np.arange(first, first + tables["slot_length"][slot])
+        present = tables["present"][start:stop]
+        summary["frame_count"][slot] = frames[present].max()
+        hit_frames = frames[present & hit[start:stop]]
+        if len(hit_frames):
+            summary["first_hitbox_frame"][slot] = hit_frames.min()
+            summary["last_hitbox_frame"][slot] = hit_frames.max()
+            iasa_frames = frames[present & tables["iasa"][start:stop]]
+            summary["iasa_frame"][slot] = (
+                iasa_frames.min() if len(iasa_frames) else frames[present].max()
+            )
+            # Each time we go from NOT having a hit box to having one, that's another hit
+            active = np.isin(np.arange(1, hit_frames.max() + 1), hit_frames)
+            if len(active):
+                summary["hitbox_count"][slot] = np.count_nonzero(
+                    active[1:] & ~active[:-1]
+                ) + int(active[0])
+        # Running max/min/sum over this frame and every later one
+        forward = np.maximum.accumulate(reach_forward[start:stop][::-1])[::-1]
+        backward = np.minimum.accumulate(reach_backward[start:stop][::-1])[::-1]
+        summary["range_forward_after"][start:stop] = forward
+        summary["range_backward_after"][start:stop] = -backward
+        summary["max_range_forward"][slot] = forward[0]
+        summary["max_range_backward"][slot] = -backward[0]
+        summary["locomotion_x_after"][start:stop] = np.cumsum(
+            tables["locomotion_x"][start:stop][::-1]
+        )[::-1]
+    return summary
+
 
 class FrameData:
     """Set of helper functions and data structures for knowing Melee frame data
@@ -64,53 +192,60 @@ class FrameData:
             self.prevfacing = {}
             self.prevprojectilecount = {}
 
-        # Read the existing framedata
-        path = os.path.dirname(os.path.realpath(__file__))
-        self.framedata = defaultdict(lambda: defaultdict(lambda: defaultdict(dict)))
-        with open(path + "/framedata.csv") as csvfile:
-            # A list of dicts containing the frame data
-            csvreader = list(csv.DictReader(csvfile))
-            # Build a series of nested dicts for faster read access
-            for frame in csvreader:
-                # Pull out the character, action, and frame
-                character = Character(int(frame["character"]))
-                action = Action(int(frame["action"]))
-                action_frame = int(frame["frame"])
-                self.framedata[character][action][action_frame] = {
-                    "hitbox_1_status": frame["hitbox_1_status"] == "True",
-                    "hitbox_1_size": float(frame["hitbox_1_size"]),
-                    "hitbox_1_x": float(frame["hitbox_1_x"]),
-                    "hitbox_1_y": float(frame["hitbox_1_y"]),
-                    "hitbox_2_status": frame["hitbox_2_status"] == "True",
-                    "hitbox_2_size": float(frame["hitbox_2_size"]),
-                    "hitbox_2_x": float(frame["hitbox_2_x"]),
-                    "hitbox_2_y": float(frame["hitbox_2_y"]),
-                    "hitbox_3_status": frame["hitbox_3_status"] == "True",
-                    "hitbox_3_size": float(frame["hitbox_3_size"]),
-                    "hitbox_3_x": float(frame["hitbox_3_x"]),
-                    "hitbox_3_y": float(frame["hitbox_3_y"]),
-                    "hitbox_4_status": frame["hitbox_4_status"] == "True",
-                    "hitbox_4_size": float(frame["hitbox_4_size"]),
-                    "hitbox_4_x": float(frame["hitbox_4_x"]),
-                    "hitbox_4_y": float(frame["hitbox_4_y"]),
-                    "locomotion_x": float(frame["locomotion_x"]),
-                    "locomotion_y": float(frame["locomotion_y"]),
-                    "iasa": frame["iasa"] == "True",
-                    "facing_changed": frame["facing_changed"] == "True",
-                    "projectile": frame["projectile"] == "True",
-                }
+        # Read the existing framedata, shared with every other FrameData in the process
+        self.tables = staticdata.framedata_tables()
+        """(dict of str - np.ndarray): The frame data, compiled into dense arrays.
+
+        slots[character, action] gives the action's slot, or -1. Per-action arrays
+        (frame_count, first_hitbox_frame, last_hitbox_frame, iasa_frame, hitbox_count,
+        max_range_forward, max_range_backward) are indexed by slot. Per-frame arrays are
+        indexed by slot_start[slot] + frame - slot_first[slot]."""
+        self._slots = self.tables["slots"]
+        self._framedata = None
 
         # read the character data csv
-        self.characterdata = dict()
-        path = os.path.dirname(os.path.realpath(__file__))
-        with open(path + "/characterdata.csv") as csvfile:
-            reader = csv.DictReader(csvfile)
-            for line in reader:
-                del line["Character"]
-                # Convert all fields to numbers
-                for key, value in line.items():
-                    line[key] = float(value)
-                self.characterdata[Character(line["CharacterIndex"])] = line
+        self.characterdata = staticdata.characterdata()
+
+    @property
+    def framedata(self):
+        """(dict): The frame data as nested dicts of character, action and frame to a dict
+        of fields, the way it used to be stored. Built on first use, prefer `tables`."""
+        if self._framedata is None:
+            self._framedata = defaultdict(lambda: defaultdict(lambda: defaultdict(dict)))
+            for character, action in np.argwhere(self._slots >= 0):
+                slot = self._slots[character, action]
+                character, action = Character(int(character)), Action(int(action))
+                first = int(self.tables["slot_first"][slot])
+                for frame in range(first, first + int(self.tables["slot_length"][slot])):
+                    row = self._getframe(character, action, frame)
+                    if row is not None:
+                        self._framedata[character][action][frame] = row
+        return self._framedata
+
+    def _slot(self, character, action):
+        """Slot of the given action in the tables, -1 if there's no frame data for it"""
+        character, action = character.value, action.value
+        if character < self._slots.shape[0] and action < self._slots.shape[1]:
+            return self._slots[character, action]
+        return -1
+
+    def _row(self, slot, action_frame):
+        """Row of the given frame in the per-frame tables, -1 if it's not recorded"""
+        if slot < 0:
+            return -1
+        offset = action_frame - self.tables["slot_first"][slot]
+        if offset < 0 or offset >= self.tables["slot_length"][slot]:
+            return -1
+        row = self.tables["slot_start"][slot] + offset
+        if not self.tables["present"][row]:
+            return -1
+        return row
+
+    def _summary(self, name, character, action, default):
+        slot = self._slot(character, action)
+        if slot < 0:
+            return default
+        return int(self.tables[name][slot])
 
     def is_grab(self, character, action):
         """For the given character, is the supplied action a grab?
@@ -245,18 +380,7 @@ class FrameData:
             character (enums.Character): The character we're interested in
             action (enums.Action): The action we're interested in
         """
-        # For each frame...
-        for _, frame in self.framedata[character][action].items():
-            if frame:
-                if (
-                    frame["hitbox_1_status"]
-                    or frame["hitbox_2_status"]
-                    or frame["hitbox_3_status"]
-                    or frame["hitbox_4_status"]
-                    or frame["projectile"]
-                ):
-                    return True
-        return False
+        return self._summary("first_hitbox_frame", character, action, -1) != -1
 
     def is_shield(self, action):
         """Is the given action a Shielding action?
@@ -322,34 +446,18 @@ class FrameData:
             action (enums.Action): The action we're interested in
             action_frame (int): The frame of the action we're interested in
         """
-        attackrange = 0
-        lastframe = self.last_hitbox_frame(character, action)
-        for i in range(action_frame + 1, lastframe + 1):
-            attackingframe = self._getframe(character, action, i)
-            if attackingframe is None:
-                continue
+        return self._range_after("range_forward_after", character, action, action_frame)
 
-            if attackingframe["hitbox_1_status"]:
-                attackrange = max(
-                    attackingframe["hitbox_1_size"] + attackingframe["hitbox_1_x"],
-                    attackrange,
-                )
-            if attackingframe["hitbox_2_status"]:
-                attackrange = max(
-                    attackingframe["hitbox_2_size"] + attackingframe["hitbox_2_x"],
-                    attackrange,
-                )
-            if attackingframe["hitbox_3_status"]:
-                attackrange = max(
-                    attackingframe["hitbox_3_size"] + attackingframe["hitbox_3_x"],
-                    attackrange,
-                )
-            if attackingframe["hitbox_4_status"]:
-                attackrange = max(
-                    attackingframe["hitbox_4_size"] + attackingframe["hitbox_4_x"],
-                    attackrange,
-                )
-        return attackrange
+    def _range_after(self, name, character, action, action_frame):
+        """Look up a running total over the frames after action_frame"""
+        slot = self._slot(character, action)
+        if slot < 0:
+            return 0
+        first = self.tables["slot_first"][slot]
+        offset = max(action_frame + 1 - first, 0)
+        if offset >= self.tables["slot_length"][slot]:
+            return 0
+        return float(self.tables[name][self.tables["slot_start"][slot] + offset])
 
     def range_backward(self, character, action, action_frame):
         """Returns the maximum remaining range of the given attack, in the backwards direction
@@ -362,34 +470,7 @@ class FrameData:
             action (enums.Action): The action we're interested in
             action_frame (int): The frame of the action we're interested in
         """
-        attackrange = 0
-        lastframe = self.last_hitbox_frame(character, action)
-        for i in range(action_frame + 1, lastframe + 1):
-            attackingframe = self._getframe(character, action, i)
-            if attackingframe is None:
-                continue
-
-            if attackingframe["hitbox_1_status"]:
-                attackrange = min(
-                    -attackingframe["hitbox_1_size"] + attackingframe["hitbox_1_x"],
-                    attackrange,
-                )
-            if attackingframe["hitbox_2_status"]:
-                attackrange = min(
-                    -attackingframe["hitbox_2_size"] + attackingframe["hitbox_2_x"],
-                    attackrange,
-                )
-            if attackingframe["hitbox_3_status"]:
-                attackrange = min(
-                    -attackingframe["hitbox_3_size"] + attackingframe["hitbox_3_x"],
-                    attackrange,
-                )
-            if attackingframe["hitbox_4_status"]:
-                attackrange = min(
-                    -attackingframe["hitbox_4_size"] + attackingframe["hitbox_4_x"],
-                    attackrange,
-                )
-        return abs(attackrange)
+        return self._range_after("range_backward_after", character, action, action_frame)
 
     def in_range(self, attacker, defender, stage):
         """Calculates if an attack is in range of a given defender
@@ -432,16 +513,33 @@ class FrameData:
         gravity = self.characterdata[attacker.character]["Gravity"]
         termvelocity = self.characterdata[attacker.character]["TerminalVelocity"]
 
-        for i in range(attacker.action_frame + 1, lastframe + 1):
-            attackingframe = self._getframe(attacker.character, attacker.action, i)
-            if attackingframe is None:
+        slot = self._slot(attacker.character, attacker.action)
+        if slot < 0:
+            return 0
+        tables = self.tables
+        first = int(tables["slot_first"][slot])
+        start = max(attacker.action_frame + 1, first)
+        stop = min(lastframe + 1, first + int(tables["slot_length"][slot]))
+        if start >= stop:
+            return 0
+        rows = slice(
+            tables["slot_start"][slot] + start - first,
+            tables["slot_start"][slot] + stop - first,
+        )
+        present = tables["present"][rows].tolist()
+        hitbox = tables["hitbox_status"][rows].any(axis=1).tolist()
+        locomotion_x = tables["locomotion_x"][rows].tolist()
+        locomotion_y = tables["locomotion_y"][rows].tolist()
+        row = tables["slot_start"][slot] + start - first
+        facing = 1 if attacker.facing else -1
+
+        for i in range(start, stop):
+            if not present[i - start]:
                 continue
 
             # Figure out how much the attaker will be moving this frame
             #   Is there any locomotion in the animation? If so, use that
-            locomotion_x = float(attackingframe["locomotion_x"])
-            locomotion_y = float(attackingframe["locomotion_y"])
-            if locomotion_y == 0 and locomotion_x == 0:
+            if locomotion_y[i - start] == 0 and locomotion_x[i - start] == 0:
                 # There's no locomotion, so let's figure out how the attacker will be moving...
                 #   Are they on the ground or in the air?
                 if onground:
@@ -472,63 +570,23 @@ class FrameData:
 
                     attacker_x += attacker_speed_x
             else:
-                attacker_x += locomotion_x
-                attacker_y += locomotion_y
-
-            if (
-                attackingframe["hitbox_1_status"]
-                or attackingframe["hitbox_2_status"]
-                or attackingframe["hitbox_3_status"]
-                or attackingframe["hitbox_4_status"]
-            ):
-                # Calculate the x and y positions of all 4 hitboxes for this frame
-                hitbox_1_x = float(attackingframe["hitbox_1_x"])
-                hitbox_1_y = float(attackingframe["hitbox_1_y"]) + attacker_y
-                hitbox_2_x = float(attackingframe["hitbox_2_x"])
-                hitbox_2_y = float(attackingframe["hitbox_2_y"]) + attacker_y
-                hitbox_3_x = float(attackingframe["hitbox_3_x"])
-                hitbox_3_y = float(attackingframe["hitbox_3_y"]) + attacker_y
-                hitbox_4_x = float(attackingframe["hitbox_4_x"])
-                hitbox_4_y = float(attackingframe["hitbox_4_y"]) + attacker_y
-
-                # Flip the horizontal hitboxes around if we're facing left
-                if not attacker.facing:
-                    hitbox_1_x *= -1
-                    hitbox_2_x *= -1
-                    hitbox_3_x *= -1
-                    hitbox_4_x *= -1
-
-                hitbox_1_x += attacker_x
-                hitbox_2_x += attacker_x
-                hitbox_3_x += attacker_x
-                hitbox_4_x += attacker_x
-
-                # Now see if any of the hitboxes are in range
-                distance1 = math.sqrt(
-                    (hitbox_1_x - defender.position.x) ** 2
-                    + (hitbox_1_y - defender_y) ** 2
-                )
-                distance2 = math.sqrt(
-                    (hitbox_2_x - defender.position.x) ** 2
-                    + (hitbox_2_y - defender_y) ** 2
-                )
-                distance3 = math.sqrt(
-                    (hitbox_3_x - defender.position.x) ** 2
-                    + (hitbox_3_y - defender_y) ** 2
-                )
-                distance4 = math.sqrt(
-                    (hitbox_4_x - defender.position.x) ** 2
-                    + (hitbox_4_y - defender_y) ** 2
-                )
-
-                if distance1 < defender_size + float(attackingframe["hitbox_1_size"]):
-                    return i
-                if distance2 < defender_size + float(attackingframe["hitbox_2_size"]):
-                    return i
-                if distance3 < defender_size + float(attackingframe["hitbox_3_size"]):
-                    return i
-                if distance4 < defender_size + float(attackingframe["hitbox_4_size"]):
-                    return i
+                attacker_x += locomotion_x[i - start]
+                attacker_y += locomotion_y[i - start]
+
+            if hitbox[i - start]:
+                # See if any of the 4 hitboxes are in range
+                #   Flip the horizontal hitboxes around if we're facing left
+                index = row + i - start
+                sizes = tables["hitbox_size"][index].tolist()
+                xs = tables["hitbox_x"][index].tolist()
+                ys = tables["hitbox_y"][index].tolist()
+                for size, x, y in zip(sizes, xs, ys):
+                    distance = math.sqrt(
+                        (x * facing + attacker_x - defender.position.x) ** 2
+                        + (y + attacker_y - defender_y) ** 2
+                    )
+                    if distance < defender_size + size:
+                        return i
         return 0
 
     def dj_height(self, character_state):
@@ -610,9 +668,23 @@ class FrameData:
 
     def _getframe(self, character, action, action_frame):
         """Returns a raw frame dict for the specified frame"""
-        if self.framedata[character][action][action_frame]:
-            return self.framedata[character][action][action_frame]
-        return None
+        row = self._row(self._slot(character, action), action_frame)
+        if row < 0:
+            return None
+        tables = self.tables
+        frame = {}
+        for i in range(HITBOXES):
+            prefix = "hitbox_%d_" % (i + 1)
+            frame[prefix + "status"] = bool(tables["hitbox_status"][row, i])
+            frame[prefix + "size"] = float(tables["hitbox_size"][row, i])
+            frame[prefix + "x"] = float(tables["hitbox_x"][row, i])
+            frame[prefix + "y"] = float(tables["hitbox_y"][row, i])
+        frame["locomotion_x"] = float(tables["locomotion_x"][row])
+        frame["locomotion_y"] = float(tables["locomotion_y"][row])
+        frame["iasa"] = bool(tables["iasa"][row])
+        frame["facing_changed"] = bool(tables["facing_changed"][row])
+        frame["projectile"] = bool(tables["projectile"][row])
+        return frame
 
     def last_roll_frame(self, character, action):
         """Returns the last frame of the roll
@@ -624,12 +696,7 @@ class FrameData:
         """
         if not self.is_roll(character, action):
             return -1
-        frames = []
-        for action_frame in self.framedata[character][action]:
-            frames.append(action_frame)
-        if not frames:
-            return -1
-        return max(frames)
+        return self.frame_count(character, action)
 
     def roll_end_position(self, character_state, stage):
         """Returns the x coordinate that the current roll will end in
@@ -641,23 +708,25 @@ class FrameData:
         distance = 0
         try:
             # TODO: Take current momentum into account
-            # Loop through each frame in the attack
-            for action_frame in self.framedata[character_state.character][
-                character_state.action
-            ]:
-                # Only care about frames that haven't happened yet
-                if action_frame > character_state.action_frame:
-                    distance += self.framedata[character_state.character][
-                        character_state.action
-                    ][action_frame]["locomotion_x"]
+            # Add up the movement of each frame that hasn't happened yet
+            distance = self._range_after(
+                "locomotion_x_after",
+                character_state.character,
+                character_state.action,
+                character_state.action_frame,
+            )
 
             # We can derive the direction we're supposed to be moving by xor'ing a few things together...
             #   1) Current facing
             #   2) Facing changed in the frame data
             #   3) Is backwards roll
-            facingchanged = self.framedata[character_state.character][
-                character_state.action
-            ][character_state.action_frame]["facing_changed"]
+            row = self._row(
+                self._slot(character_state.character, character_state.action),
+                character_state.action_frame,
+            )
+            if row < 0:
+                raise KeyError(character_state.action_frame)
+            facingchanged = bool(self.tables["facing_changed"][row])
             backroll = character_state.action in [
                 Action.ROLL_BACKWARD,
                 Action.GROUND_ROLL_BACKWARD_UP,
@@ -710,22 +779,7 @@ class FrameData:
             character (enums.Character): The character we're interested in
             action (enums.Action): The action we're interested in
         """
-        # Grab only the subset that have a hitbox
-        hitboxes = []
-        for action_frame, frame in self.framedata[character][action].items():
-            if frame:
-                # Does this frame have a hitbox?
-                if (
-                    frame["hitbox_1_status"]
-                    or frame["hitbox_2_status"]
-                    or frame["hitbox_3_status"]
-                    or frame["hitbox_4_status"]
-                    or frame["projectile"]
-                ):
-                    hitboxes.append(action_frame)
-        if not hitboxes:
-            return -1
-        return min(hitboxes)
+        return self._summary("first_hitbox_frame", character, action, -1)
 
     def hitbox_count(self, character, action):
         """Returns the number of hitboxes an attack has
@@ -750,29 +804,7 @@ class FrameData:
         if character == Character.YLINK and action == Action.SWORD_DANCE_4_MID:
             return 10
 
-        hitboxes = []
-        for action_frame, frame in self.framedata[character][action].items():
-            if frame:
-                # Does this frame have a hitbox?
-                if (
-                    frame["hitbox_1_status"]
-                    or frame["hitbox_2_status"]
-                    or frame["hitbox_3_status"]
-                    or frame["hitbox_4_status"]
-                    or frame["projectile"]
-                ):
-                    hitboxes.append(action_frame)
-        if not hitboxes:
-            return 0
-        hashitbox = False
-        count = 0
-        # Every time we go from NOT having a hit box to having one, up the count
-        for i in range(1, max(hitboxes) + 1):
-            hashitbox_new = i in hitboxes
-            if hashitbox_new and not hashitbox:
-                count += 1
-            hashitbox = hashitbox_new
-        return count
+        return self._summary("hitbox_count", character, action, 0)
 
     def iasa(self, character, action):
         """Returns the first frame of an attack that the character is interruptible (actionable)
@@ -783,19 +815,7 @@ class FrameData:
             character (enums.Character): The character we're interested in
             action (enums.Action): The action we're interested in
         """
-        if not self.is_attack(character, action):
-            return -1
-        iasaframes = []
-        allframes = []
-        for action_frame, frame in self.framedata[character][action].items():
-            if frame:
-                # Does this frame have a hitbox?
-                allframes.append(action_frame)
-                if frame["iasa"]:
-                    iasaframes.append(action_frame)
-        if not iasaframes:
-            return max(allframes)
-        return min(iasaframes)
+        return self._summary("iasa_frame", character, action, -1)
 
     def last_hitbox_frame(self, character, action):
         """Returns the last frame that a hitbox appears for a given action
@@ -807,22 +827,7 @@ class FrameData:
             action (enums.Action): The action we're interested in
 
         """
-        # Grab only the subset that have a hitbox
-        hitboxes = []
-        for action_frame, frame in self.framedata[character][action].items():
-            if frame:
-                # Does this frame have a hitbox?
-                if (
-                    frame["hitbox_1_status"]
-                    or frame["hitbox_2_status"]
-                    or frame["hitbox_3_status"]
-                    or frame["hitbox_4_status"]
-                    or frame["projectile"]
-                ):
-                    hitboxes.append(action_frame)
-        if not hitboxes:
-            return -1
-        return max(hitboxes)
+        return self._summary("last_hitbox_frame", character, action, -1)
 
     def frame_count(self, character, action):
         """Returns the count of total frames in the given action.
@@ -831,12 +836,7 @@ class FrameData:
             character (enums.Character): The character we're interested in
             action (enums.Action): The action we're interested in
         """
-        frames = []
-        for action_frame, _ in self.framedata[character][action].items():
-            frames.append(action_frame)
-        if not frames:
-            return -1
-        return max(frames)
+        return self._summary("frame_count", character, action, -1)
 
     def _cleanupcsv(self):
         """Helper function to remove all the non-attacking, non-rolling, non-B move actions"""
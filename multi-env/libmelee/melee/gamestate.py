@@ -1,11 +1,13 @@
 """ Gamestate is a single snapshot in time of the game that represents all necessary information
         to make gameplay decisions
 """
+import copy
+import operator
 from dataclasses import dataclass, field
 
 import melee
 import numpy as np
-from melee import enums
+from melee import enums, eventdecoder
 
 
 @dataclass
@@ -54,6 +56,8 @@ class GameState(object):
         "_fod_platform_left",
         "_fod_platform_right",
         "custom",
+        "columns",
+        "_spare_players",
     )
 
     def __init__(self):
@@ -95,6 +99,65 @@ class GameState(object):
         """(float): The current height of FoD platforms"""
         self.custom = dict()
         """(dict): Custom fields to be added by the user"""
+        self.columns = None
+        """(columnar.PlayerColumns): Array-backed player state, if the console was made with
+                array_mirror=True. Shared with the console and overwritten every frame."""
+        self._spare_players = dict()
+
+    def reset(self):
+        """Put the gamestate back the way a new GameState starts out, in place
+
+        The PlayerStates are kept aside and handed out again by new_player(), so a
+        gamestate that's reset every frame doesn't allocate anything.
+        """
+        self.frame = -10000
+        self.stage = enums.Stage.FINAL_DESTINATION
+        self.menu_state = enums.Menu.IN_GAME
+        self.submenu = enums.SubMenu.UNKNOWN_SUBMENU
+        self._spare_players.update(self.players)
+        self.players.clear()
+        self.projectiles.clear()
+        self.stage_select_cursor_x = 0.0
+        self.stage_select_cursor_y = 0.0
+        self.ready_to_start = False
+        self.is_teams = False
+        self.distance = 0.0
+        self.menu_selection = 0
+        self.startAt = ""
+        self.playedOn = ""
+        self.consoleNick = ""
+        self._newframe = True
+        self._fod_platform_left, self._fod_platform_right = 0, 0
+        self.custom.clear()
+        self.columns = None
+
+    def new_player(self, port, player_class=None):
+        """Put a PlayerState with default values in players[port], and return it
+
+        Reuses one of the PlayerStates set aside by reset() when there is one.
+
+        Args:
+            port (int): Controller port
+            player_class (type): PlayerState or LazyPlayerState. Defaults to PlayerState
+        """
+        player_class = player_class or PlayerState
+        player = self._spare_players.pop(port, None)
+        if type(player) is not player_class:
+            player = player_class()
+        else:
+            player.reset()
+        self.players[port] = player
+        return player
+
+    def snapshot(self):
+        """Returns a deep copy of this gamestate that stays valid after the next frame
+
+        Consoles made with reuse_gamestates=True overwrite the gamestates they return,
+        so take a snapshot of any frame you want to keep around. The copy gets its own
+        copy of `columns`, too.
+        """
+        gamestate = copy.deepcopy(self, {id(self._spare_players): dict()})
+        return gamestate
 
 
 class PlayerState(object):
@@ -145,6 +208,7 @@ class PlayerState(object):
         "connectCode",
         "team_id",
         "is_powershield",
+        "_spare_nana",
     )
 
     def __init__(self):
@@ -242,6 +306,226 @@ class PlayerState(object):
         """(string): The rollback connect code for the player. Might be blank."""
         self.team_id = 0
         """(int): The team ID of the player. This is different than costume, and only relevant during teams."""
+        self._spare_nana = None
+
+    def reset(self):
+        """Put every field back to its default value, in place
+
+        The nested position, cursor, ECB and controller state objects are reset rather
+        than replaced, and Nana is kept aside for new_nana().
+        """
+        defaults = _player_defaults()
+        for name in self._plain_fields:
+            setattr(self, name, getattr(defaults, name))
+        if self.nana is not None:
+            self._spare_nana = self.nana
+            self.nana = None
+        self.position.x = self.position.y = defaults.position.x
+        self.cursor.x = self.cursor.y = defaults.cursor.x
+        self._reset_nested(defaults)
+
+    def _reset_nested(self, defaults):
+        ecb = self.ecb
+        ecb.top.x = ecb.top.y = ecb.bottom.x = ecb.bottom.y = defaults.position.x
+        ecb.left.x = ecb.left.y = ecb.right.x = ecb.right.y = defaults.position.x
+        controller_state = self.controller_state
+        controller_state.button.update(defaults.controller_state.button)
+        controller_state.main_stick = defaults.controller_state.main_stick
+        controller_state.c_stick = defaults.controller_state.c_stick
+        controller_state.raw_main_stick = defaults.controller_state.raw_main_stick
+        controller_state.l_shoulder = defaults.controller_state.l_shoulder
+        controller_state.r_shoulder = defaults.controller_state.r_shoulder
+
+    def new_nana(self):
+        """Put a PlayerState with default values in `nana`, and return it"""
+        nana = self.nana if self.nana is not None else self._spare_nana
+        if nana is None:
+            nana = type(self)()
+        else:
+            nana.reset()
+        self.nana = nana
+        return nana
+
+
+# Fields of PlayerState that hold plain values, which reset() copies from a default instance
+_PLAYER_VALUES = tuple(
+    name
+    for name in PlayerState.__slots__
+    if name not in ("position", "cursor", "ecb", "controller_state", "nana", "_spare_nana")
+)
+PlayerState._plain_fields = _PLAYER_VALUES
+_PLAYER_DEFAULTS = []
+
+
+def _player_defaults():
+    # Made on first use, since melee.controller isn't importable yet when this module is
+    if not _PLAYER_DEFAULTS:
+        _PLAYER_DEFAULTS.append(PlayerState())
+    return _PLAYER_DEFAULTS[0]
+
+
+def _post_field(*names, convert=None):
+    """Decoder for just the given post-frame fields, and what to make of its values"""
+    decoder = eventdecoder.POST_FRAME.subset(names)
+    if convert is None:
+        return decoder, operator.itemgetter(0)
+    if len(names) == 1:
+        return decoder, lambda values: convert(values[0])
+    return decoder, convert
+
+
+def _int_or_zero(value):
+    try:
+        return int(value)
+    except ValueError:
+        return 0
+
+
+def _ecb_point(name):
+    return _post_field(name + "_x", name + "_y", convert=tuple)
+
+
+_ECB_NAMES = tuple(
+    "ecb_%s_%s" % (point, axis)
+    for point in ("top", "bottom", "left", "right")
+    for axis in ("x", "y")
+)
+
+
+def _ecb(values):
+    return ECB(*(Position(values[i], values[i + 1]) for i in range(0, 8, 2)))
+
+
+def _controller_state(values):
+    controller_state = melee.controller.ControllerState()
+    eventdecoder.fill_controller_state(controller_state, values)
+    return controller_state
+
+
+# Fields that LazyPlayerState builds on first access, from the post-frame event. Each
+#   has its own decoder that unpacks only the bytes it needs, and a function that makes
+#   the field out of the decoded values
+_POST_FIELDS = {
+    "shield_strength": _post_field("shield_strength"),
+    "is_powershield": _post_field("state_bits_4", convert=lambda bits: (bits & 0x20) == 0x20),
+    "hitstun_frames_left": _post_field("hitstun_frames_left", convert=_int_or_zero),
+    "jumps_left": _post_field("jumps_left"),
+    "speed_air_x_self": _post_field("speed_air_x_self"),
+    "speed_y_self": _post_field("speed_y_self"),
+    "speed_x_attack": _post_field("speed_x_attack"),
+    "speed_y_attack": _post_field("speed_y_attack"),
+    "speed_ground_x_self": _post_field("speed_ground_x_self"),
+    "hitlag_left": _post_field("hitlag_left", convert=int),
+    "ecb_top": _ecb_point("ecb_top"),
+    "ecb_bottom": _ecb_point("ecb_bottom"),
+    "ecb_left": _ecb_point("ecb_left"),
+    "ecb_right": _ecb_point("ecb_right"),
+    "ecb": _post_field(*_ECB_NAMES, convert=_ecb),
+}
+# And from the pre-frame event
+_PRE_FIELDS = {"controller_state": (eventdecoder.PRE_FRAME, _controller_state)}
+
+
+def _lazy_field(name, event_slot, values_slot, decoder, convert):
+    """Property that decodes a field out of its event's bytes on first access"""
+    missing = object()
+    get_event = operator.attrgetter(event_slot)
+    get_values = operator.attrgetter(values_slot)
+
+    def get(self):
+        values = get_values(self)
+        value = values.get(name, missing)
+        if value is missing:
+            event = get_event(self)
+            if event is None:
+                value = _default(name)
+            else:
+                value = convert(decoder.decode(event, 0, len(event)))
+            values[name] = value
+        return value
+
+    def set(self, value):
+        get_values(self)[name] = value
+
+    return property(get, set)
+
+
+def _default(name):
+    if name == "ecb":
+        return ECB()
+    if name == "controller_state":
+        return melee.controller.ControllerState()
+    return getattr(_player_defaults(), name)
+
+
+class LazyPlayerState(PlayerState):
+    """A PlayerState that decodes its less used fields only when they're read
+
+    Made by consoles with lazy_decoding=True. The console only unpacks the handful of
+    fields it needs itself out of each pre-frame and post-frame event, and the player
+    keeps a view of the event's bytes. Fields like the ECB, speeds, hitlag and
+    controller state are unpacked out of those bytes, each with its own precompiled
+    struct, the first time they're read. Reads after that come from a memo. Every field
+    reads the same as on an eager PlayerState.
+    """
+
+    __slots__ = ("_pre_event", "_post_event", "_pre_values", "_post_values")
+
+    def __init__(self):
+        # Lazy fields start out unset, and read as their defaults until an event arrives
+        self._pre_event = None
+        self._post_event = None
+        self._pre_values = dict()
+        self._post_values = dict()
+        self.position = Position()
+        self.cursor = Cursor()
+        self.nana = None
+        self._spare_nana = None
+        defaults = _player_defaults()
+        for name in self._plain_fields:
+            setattr(self, name, getattr(defaults, name))
+
+    def __reduce_ex__(self, protocol):
+        # The events are views into the stream's buffer, which can't be copied or
+        #   pickled. Copies and pickles hold on to the bytes instead
+        if isinstance(self._pre_event, memoryview):
+            self._pre_event = self._pre_event.tobytes()
+        if isinstance(self._post_event, memoryview):
+            self._post_event = self._post_event.tobytes()
+        return super().__reduce_ex__(protocol)
+
+    def _reset_nested(self, defaults):
+        self._pre_event = None
+        self._post_event = None
+        self._pre_values.clear()
+        self._post_values.clear()
+
+    def set_pre_event(self, event):
+        """Use the given PRE_FRAME event's bytes for this frame's controller state"""
+        self._pre_event = event
+        self._pre_values.clear()
+
+    def set_post_event(self, event):
+        """Use the given POST_FRAME event's bytes for this frame's lazy fields"""
+        self._post_event = event
+        self._post_values.clear()
+
+
+LazyPlayerState._plain_fields = tuple(
+    name for name in _PLAYER_VALUES if name not in _POST_FIELDS and name not in _PRE_FIELDS
+)
+for _name, (_decoder, _convert) in _POST_FIELDS.items():
+    setattr(
+        LazyPlayerState,
+        _name,
+        _lazy_field(_name, "_post_event", "_post_values", _decoder, _convert),
+    )
+for _name, (_decoder, _convert) in _PRE_FIELDS.items():
+    setattr(
+        LazyPlayerState,
+        _name,
+        _lazy_field(_name, "_pre_event", "_pre_values", _decoder, _convert),
+    )
 
 
 class Projectile:
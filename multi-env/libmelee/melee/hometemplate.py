@@ -0,0 +1,157 @@
+"""Dolphin home directories made from a shared template, instead of copied in full
+
+With tmp_home_directory=True every Console copies the whole Dolphin user directory,
+old replays, caches and shaders included, and then rewrites its config files. With
+many instances that I/O takes up most of the startup, and fills the disk.
+
+A template is a trimmed, pre-configured copy of a user directory, built once:
+
+    - Directories that Dolphin fills in as it runs (SKIPPED) are left out
+    - libmelee's gecko codes are already in GameSettings/, when asked for
+
+Each instance's home directory is then made from the template with materialize().
+Directories are created for real, and files are hard linked to the template's. If the
+template is on another filesystem, they're symlinked instead. Only the files that get
+written to per instance are really copied (PRIVATE): everything in Config/ (Dolphin.ini
+gets its ports and GCPadNew.ini its controllers), and the memory cards and GCI folders
+in GC/ and the Wii NAND in Wii/, which Dolphin writes into in place. Pipes/ and the
+SKIPPED directories start out empty.
+
+Dolphin saves its ini files by writing a new file and renaming it over the old one, so
+a linked file it saves turns into a file of the instance's own, and the template is
+left alone. Anything that writes into a linked file in place would change it for
+every instance though, so the template should only hold read-only content.
+
+Console(home_template=True) builds a template of the home directory in the first
+console of a process, and links every console's home to it. Console.home_stats then
+has the seconds spent setting up the home directory, and written_bytes() tells how
+much was written for it.
+"""
+
+import atexit
+import os
+import shutil
+import stat
+import tempfile
+
+SKIPPED = ("Cache", "Shaders", "Logs", "Dump", "ScreenShots", "StateSaves", "Pipes", "Replays")
+"""(tuple of str): Top level directories left out of templates. Made empty per instance"""
+
+PRIVATE = ("Config", "GC", "Wii")
+"""(tuple of str): Top level directories that are really copied for each instance"""
+
+# Templates built by template_for() in this process, by (source, gecko codes)
+_templates = {}
+
+
+def _ignore(src, names):
+    """Leave out FIFOs, which can't be copied"""
+    ignored = []
+    for name in names:
+        path = os.path.join(src, name)
+        if stat.S_ISFIFO(os.stat(path).st_mode):
+            ignored.append(name)
+    return ignored
+
+
+def build(source, destination, gecko_codes=True):
+    """Make a template out of a Dolphin user directory
+
+    Args:
+        source (str): The user directory to template
+        destination (str): Where to build the template. Must not exist yet.
+        gecko_codes (bool): Put libmelee's GALE01r2.ini in GameSettings/, like
+            Console(setup_gecko_codes=True) would
+
+    Returns:
+        The destination
+    """
+    source = os.path.abspath(source)
+    os.makedirs(destination)
+    for name in os.listdir(source):
+        path = os.path.join(source, name)
+        if name in SKIPPED or stat.S_ISFIFO(os.stat(path).st_mode):
+            continue
+        if os.path.isdir(path):
+            shutil.copytree(path, os.path.join(destination, name), ignore=_ignore)
+        else:
+            shutil.copy2(path, destination)
+    if gecko_codes:
+        game_settings_path = os.path.join(destination, "GameSettings")
+        os.makedirs(game_settings_path, exist_ok=True)
+        libmelee_path = os.path.dirname(os.path.realpath(__file__))
+        shutil.copy(os.path.join(libmelee_path, "GALE01r2.ini"), game_settings_path)
+    return destination
+
+
+def template_for(source, gecko_codes=True):
+    """The template of a user directory, built the first time it's asked for
+
+    Templates are built next to the temporary home directories, so they can be hard
+    linked, and deleted when the process exits. Changes to the source directory after
+    that aren't picked up.
+    """
+    key = (os.path.realpath(source), gecko_codes)
+    if key not in _templates:
+        parent = tempfile.mkdtemp(prefix="libmelee_template_")
+        atexit.register(shutil.rmtree, parent, True)
+        _templates[key] = build(source, os.path.join(parent, "User"), gecko_codes)
+    return _templates[key]
+
+
+def _link(source, destination, stats):
+    try:
+        os.link(source, destination)
+        stats["files_linked"] += 1
+    except OSError:
+        # Across filesystems, or on one that doesn't do hard links
+        os.symlink(source, destination)
+        stats["files_symlinked"] += 1
+
+
+def materialize(template, destination):
+    """Make a home directory out of a template. See the module docstring
+
+    Args:
+        template (str): A template made by build()
+        destination (str): The home directory to make. Must not exist yet.
+
+    Returns:
+        dict of how many files were linked ("files_linked", "files_symlinked") and
+        copied ("files_copied")
+    """
+    stats = {"files_linked": 0, "files_symlinked": 0, "files_copied": 0}
+    template = os.path.abspath(template)
+    os.makedirs(destination)
+    for name in SKIPPED:
+        os.makedirs(os.path.join(destination, name), exist_ok=True)
+    for name in os.listdir(template):
+        path = os.path.join(template, name)
+        target = os.path.join(destination, name)
+        if name in PRIVATE:
+            shutil.copytree(path, target, ignore=_ignore)
+            stats["files_copied"] += sum(len(files) for _, _, files in os.walk(target))
+        elif os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                target_root = os.path.join(target, os.path.relpath(root, path))
+                os.makedirs(target_root, exist_ok=True)
+                for file in files:
+                    _link(os.path.join(root, file), os.path.join(target_root, file), stats)
+        else:
+            _link(path, target, stats)
+    return stats
+
+
+def written_bytes(path):
+    """Bytes of file data that belong to a directory alone
+
+    Counts the regular files that aren't shared through a hard link, so for a
+    materialized home directory it's what was really written for it.
+    """
+    total = 0
+    for root, _, files in os.walk(path):
+        for file in files:
+            info = os.lstat(os.path.join(root, file))
+            if stat.S_ISREG(info.st_mode) and info.st_nlink == 1:
+                total += info.st_size
+    return total
@@ -0,0 +1,212 @@
+"""A stand-in for the Dolphin executable, for running bots without the emulator
+
+Console.run() can launch it in place of dolphin-emu. Like Dolphin, it reads the bots'
+inputs from the controller FIFOs in the user directory's Pipes/ folder, and serves the
+game to Slippstream clients on the spectator port from Config/Dolphin.ini. Instead of
+emulating the game, it streams the frames of a recorded SLP file with a ReplayServer.
+
+The PRESS, RELEASE, SET and FLUSH commands written to the pipes are parsed and kept
+as each port's controller state, but they don't change the game. With BlockingPipes
+set in Dolphin.ini, the next frame is sent once every pipe that's been written to has
+flushed, the way Dolphin waits for its bots. Otherwise frames go out at a steady rate.
+
+That makes it possible to measure everything on the bot's side of the pipes, like
+Controller.flush(), Console.step() and the env loop around them, on any Linux box.
+To use it, make a directory Console(path=...) can launch it from:
+
+    directory = melee.mockdolphin.install("/tmp/mockdolphin", "test_artifacts/test_game_1.slp")
+    console = melee.Console(path=directory, blocking_input=True)
+    console.run()
+"""
+
+import argparse
+import configparser
+import os
+import select
+import shlex
+import stat
+import sys
+
+from melee import enums
+from melee.replayserver import ReplayServer
+
+_BUTTONS = frozenset(button.value for button in enums.Button)
+
+
+def install(directory, replay, fps=60.0, loop=True):
+    """Make a directory that Console(path=directory) runs the mock from
+
+    Writes a dolphin-emu launcher script there, and an empty User/ home directory
+    for Console to copy.
+
+    Args:
+        directory (str): Where to put it. Created if needed.
+        replay (str): SLP file to stream to the bots
+        fps (float): Frame rate when not using blocking pipes
+        loop (bool): Start the replay over when it ends
+
+    Returns:
+        The directory, to pass as Console's path
+    """
+    directory = os.path.abspath(directory)
+    os.makedirs(os.path.join(directory, "User", "Config"), exist_ok=True)
+    package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    command = [sys.executable, "-m", "melee.mockdolphin", "--replay", os.path.abspath(replay)]
+    command += ["--fps", str(fps)]
+    if loop:
+        command.append("--loop")
+    launcher = os.path.join(directory, "dolphin-emu")
+    with open(launcher, "w") as file:
+        file.write("#!/bin/sh\n")
+        file.write(
+            'PYTHONPATH=%s"${PYTHONPATH:+:$PYTHONPATH}" exec %s "$@"\n'
+            % (shlex.quote(package_root), " ".join(shlex.quote(part) for part in command))
+        )
+    os.chmod(launcher, os.stat(launcher).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    return directory
+
+
+class _Pipe:
+    """One controller's FIFO, and the controller state its commands add up to"""
+
+    def __init__(self, port, path):
+        self.port = port
+        if not os.path.exists(path):
+            os.mkfifo(path)
+        # Opened read-write, so the read end never sees EOF between bot processes and
+        #   opening doesn't wait for a writer
+        self.fd = os.open(path, os.O_RDWR | os.O_NONBLOCK)
+        self.partial = b""
+        self.active = False
+        self.flushes = 0
+        self.commands = 0
+        self.errors = 0
+        self.buttons = set()
+        self.analog = {"MAIN": (0.5, 0.5), "C": (0.5, 0.5), "L": 0.0, "R": 0.0}
+
+    def read(self):
+        """Read and parse whatever commands are waiting"""
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return
+        self.active = True
+        lines = (self.partial + data).split(b"\n")
+        self.partial = lines.pop()
+        for line in lines:
+            if line:
+                self.command(line.decode("ascii", "replace").split())
+
+    def command(self, words):
+        self.commands += 1
+        try:
+            if words[0] == "FLUSH":
+                self.flushes += 1
+            elif words[0] == "PRESS" and words[1] in _BUTTONS:
+                self.buttons.add(words[1])
+            elif words[0] == "RELEASE" and words[1] in _BUTTONS:
+                self.buttons.discard(words[1])
+            elif words[0] == "SET" and words[1] in ("MAIN", "C"):
+                self.analog[words[1]] = (float(words[2]), float(words[3]))
+            elif words[0] == "SET" and words[1] in ("L", "R"):
+                self.analog[words[1]] = float(words[2])
+            else:
+                raise ValueError
+        except (IndexError, ValueError):
+            self.errors += 1
+            print(
+                "mockdolphin: bad command on port %d: %r" % (self.port, " ".join(words)),
+                file=sys.stderr,
+            )
+
+    def close(self):
+        os.close(self.fd)
+
+
+class MockDolphin:
+    """Serves a replay to the bots of a Dolphin user directory, see the module docstring
+
+    Args:
+        user_path (str): Dolphin user directory, as passed to Dolphin with -u
+        replay (str): SLP file to stream
+        fps (float): Frame rate when BlockingPipes is off. None for as fast as possible.
+        loop (bool): Start the replay over when it ends
+    """
+
+    def __init__(self, user_path, replay, fps=60.0, loop=True):
+        config = configparser.ConfigParser()
+        config.read(os.path.join(user_path, "Config", "Dolphin.ini"))
+        self.blocking = config.getboolean("Core", "BlockingPipes", fallback=False)
+        port = config.getint("Core", "slippispectatorlocalport", fallback=51441)
+
+        pads = configparser.ConfigParser()
+        pads.read(os.path.join(user_path, "Config", "GCPadNew.ini"))
+        pipes_path = os.path.join(user_path, "Pipes")
+        os.makedirs(pipes_path, exist_ok=True)
+        self.pipes = []
+        for controller_port in range(1, 5):
+            device = pads.get("GCPad%d" % controller_port, "Device", fallback="")
+            if device.startswith("Pipe/"):
+                name = device.split("/")[-1]
+                self.pipes.append(_Pipe(controller_port, os.path.join(pipes_path, name)))
+
+        # The pipes exist before the spectator port opens, so a bot that connected to
+        #   the port never finds them missing
+        self.server = ReplayServer(
+            replay,
+            port=port,
+            fps=fps,
+            loop=loop,
+            nick="mockdolphin",
+            on_demand=self.blocking,
+        )
+        self.frames = 0
+        """(int): How many frames the bots have flushed their way through"""
+
+    def _advance(self):
+        """With blocking pipes, move on a frame for every round of flushes"""
+        active = [pipe for pipe in self.pipes if pipe.active]
+        while active and all(pipe.flushes for pipe in active):
+            for pipe in active:
+                pipe.flushes -= 1
+            self.server.advance()
+            self.frames += 1
+
+    def serve_forever(self):
+        """Run until killed"""
+        fds = {pipe.fd: pipe for pipe in self.pipes}
+        server_fd = self.server.fileno()
+        while True:
+            wait = self.server.poll()
+            timeout = 0.1 if wait is None else min(wait, 0.1)
+            readable, _, _ = select.select([server_fd, *fds], [], [], timeout)
+            for fd in readable:
+                if fd in fds:
+                    fds[fd].read()
+            if self.blocking:
+                self._advance()
+
+    def close(self):
+        self.server.close()
+        for pipe in self.pipes:
+            pipe.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stand-in for Dolphin that serves a replay")
+    parser.add_argument("-u", "--user", required=True, help="Dolphin user directory")
+    parser.add_argument("-e", "--exec", default=None, help="ISO path. Ignored")
+    parser.add_argument("--replay", required=True, help="SLP file to stream")
+    parser.add_argument(
+        "--fps", type=float, default=60.0, help="Frame rate without blocking pipes, 0 for unlimited"
+    )
+    parser.add_argument("--loop", action="store_true", help="Repeat the replay forever")
+    args = parser.parse_args()
+
+    dolphin = MockDolphin(args.user, args.replay, args.fps or None, args.loop)
+    try:
+        dolphin.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        dolphin.close()
@@ -0,0 +1,352 @@
+"""A stand-in for Slippi Dolphin's spectator server, that streams a recorded SLP file
+
+Speaks the same ENet JSON protocol as Dolphin: a client connects and sends a
+connect_request, gets a connect_reply, and then the game's events arrive as game_event
+messages with base64 payloads, one frame each by default. So a
+Console(system="dolphin") can be pointed at it to test or benchmark the live decoding
+path without Dolphin or an ISO.
+
+The replay is streamed at a fixed frame rate, as fast as ENet will take it, or one
+message each time advance() is called, the way Dolphin with blocking pipes waits for
+the bots' inputs before running the next frame. Every
+client that connects gets the whole replay from the cursor it asks for, and is
+disconnected at the end unless the server loops.
+
+pyenet holds the GIL while it services a host, so a server running in a thread next to
+a blocking Console.step() in the same process crawls. Run it in its own process, or on
+the same event loop as consoles driven with Console.step_async().
+
+Run it as a script:
+    python3 -m melee.replayserver test_artifacts/test_game_1.slp --port 51441 --fps 60
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import select
+import struct
+import time
+
+import enet
+
+from melee.slippstream import wait_readable
+from melee.slpfilestreamer import EventType, SLPFileStreamer
+
+_FRAME_BOOKEND = EventType.FRAME_BOOKEND.value
+
+
+def replay_messages(path, frames_per_message=1):
+    """Cut the events of an SLP file into game_event payloads
+
+    The first payload also holds everything before the first frame (the event payload
+    sizes and the game start), and the last one the game end. Frames played again after
+    a rollback are sent along with the next new frame.
+
+    Args:
+        path (str): Path to the SLP file
+        frames_per_message (int): How many frames to put in each payload
+
+    Returns:
+        list of (tuple of the frame numbers in the payload, payload bytes)
+
+    Raises:
+        ValueError: If the file can't be read, or is too old to have frame bookends
+    """
+    streamer = SLPFileStreamer(path)
+    if not streamer.connect():
+        raise ValueError("not a readable SLP file: %s" % path)
+    contents = bytes(streamer._contents)
+    streamer.shutdown()
+    eventsize = [0] * 0x100
+    for cursor in range(0x2, contents[1], 3):
+        command, size = struct.unpack_from(">BH", contents, cursor)
+        eventsize[command] = size + 1
+
+    messages = []
+    start = 0
+    frames = []
+    bookends = 0
+    latest = None
+    offset = contents[1] + 1
+    while offset < len(contents) and eventsize[contents[offset]]:
+        size = eventsize[contents[offset]]
+        if contents[offset] == _FRAME_BOOKEND:
+            frame = struct.unpack_from(">i", contents, offset + 0x1)[0]
+            frames.append(frame)
+            # A frame that's been rolled back and played again isn't handed out again
+            #   by Console, so it goes in with the next new frame. That way every
+            #   message gets a frame out of Console.step()
+            if latest is not None and frame <= latest:
+                offset += size
+                continue
+            latest = frame
+            bookends += 1
+            if bookends % frames_per_message == 0:
+                messages.append((tuple(frames), contents[start : offset + size]))
+                frames = []
+                start = offset + size
+        offset += size
+    if not bookends:
+        raise ValueError("%s has no frame bookends, SLP 3.0.0 or newer is needed" % path)
+    if start < offset:
+        messages.append((tuple(frames), contents[start:offset]))
+    return messages
+
+
+class _Stream:
+    """Where one connected client is in the replay"""
+
+    __slots__ = ["peer", "first", "cursor", "started", "sent_ns", "done", "credit"]
+
+    def __init__(self, peer, cursor, credit):
+        self.peer = peer
+        self.first = cursor
+        self.cursor = cursor
+        self.started = time.perf_counter()
+        self.sent_ns = {}
+        self.done = False
+        self.credit = credit
+
+
+class ReplayServer:
+    """Streams a recorded SLP file to Slippstream clients, the way Dolphin would
+
+    Args:
+        path (str): Path to the SLP file to stream. Needs frame bookends (SLP 3.0.0+)
+        address (str): IP address to listen on
+        port (int): UDP port to listen on. 0 picks a free one, see ReplayServer.port
+        fps (float): Frames per second to stream at. None for as fast as possible.
+        on_demand (bool): Ignore fps, and only send a message when advance() says to
+        frames_per_message (int): How many frames to send in each game_event
+        loop (bool): Start over from the beginning at the end of the replay, instead
+            of disconnecting the client
+        nick (str): Nickname the server gives itself in the connect_reply
+        version (str): Slippi version the server gives in the connect_reply
+        max_clients (int): How many clients can be connected at once
+    """
+
+    def __init__(
+        self,
+        path,
+        address="127.0.0.1",
+        port=51441,
+        fps=None,
+        frames_per_message=1,
+        loop=False,
+        nick="replay",
+        version="3.0.0",
+        max_clients=32,
+        on_demand=False,
+    ):
+        self.fps = fps
+        self.on_demand = on_demand
+        # Messages advance()d while no client was connected, for the next one to connect
+        self._credit = 0
+        self.frames_per_message = frames_per_message
+        self.loop = loop
+        self.nick = nick
+        self.version = version
+        self._frames = []
+        self._payloads = []
+        for frames, payload in replay_messages(path, frames_per_message):
+            self._frames.append(frames)
+            self._payloads.append(base64.b64encode(payload).decode())
+        self._host = enet.Host(
+            enet.Address(bytes(address, "utf-8"), port), max_clients, 0, 0, 0
+        )
+        self.port = self._host.address.port
+        """(int): The UDP port the server is listening on"""
+        self.streams = {}
+        """(dict): Per connected client, where it is in the replay. Each has a sent_ns
+        dict of frame number to the time.perf_counter_ns() it was sent at"""
+        self.clients = 0
+        """(int): How many clients have connected in total"""
+        self._closed = False
+
+    @property
+    def messages(self):
+        """(int): How many game_event messages the replay is sent in"""
+        return len(self._payloads)
+
+    def fileno(self):
+        """File descriptor of the server's socket, for use with select()"""
+        return self._host.socket.fileno()
+
+    def _message(self, cursor):
+        index = cursor % len(self._payloads)
+        return json.dumps(
+            {
+                "type": "game_event",
+                "cursor": cursor,
+                "next_cursor": cursor + 1,
+                "payload": self._payloads[index],
+            }
+        ).encode()
+
+    def _receive(self):
+        """Handle everything ENet has for us, without waiting"""
+        host = self._host
+        event = host.service(0)
+        while event.type != enet.EVENT_TYPE_NONE:
+            key = event.peer.incomingPeerID
+            if event.type == enet.EVENT_TYPE_RECEIVE:
+                try:
+                    message = json.loads(event.packet.data)
+                except ValueError:
+                    message = {}
+                if message.get("type") == "connect_request":
+                    cursor = max(int(message.get("cursor", 0)), 0)
+                    if not self.loop:
+                        cursor = min(cursor, len(self._payloads))
+                    reply = {
+                        "type": "connect_reply",
+                        "nick": self.nick,
+                        "version": self.version,
+                        "cursor": cursor,
+                    }
+                    event.peer.send(
+                        0, enet.Packet(json.dumps(reply).encode(), enet.PACKET_FLAG_RELIABLE)
+                    )
+                    self.streams[key] = _Stream(event.peer, cursor, self._credit)
+                    self._credit = 0
+                    self.clients += 1
+            elif event.type == enet.EVENT_TYPE_DISCONNECT:
+                self.streams.pop(key, None)
+            event = host.service(0)
+
+    def advance(self, messages=1):
+        """Let every client have the given number of messages more, with on_demand
+
+        If no client is connected, the next one to connect gets them.
+        """
+        if not self.streams:
+            self._credit += messages
+        for stream in self.streams.values():
+            stream.credit += messages
+
+    def poll(self):
+        """Handle incoming events and send every message that's due, without waiting
+
+        Returns:
+            Seconds until the next message is due, 0 if there's more to send right
+            away, or None if no client is waiting for anything
+        """
+        self._receive()
+        wait = None
+        payloads = len(self._payloads)
+        for stream in self.streams.values():
+            if stream.done:
+                continue
+            if self.on_demand:
+                due = stream.cursor + stream.credit
+                stream.credit = 0
+            elif self.fps is None:
+                due = stream.cursor + 1
+            else:
+                elapsed = time.perf_counter() - stream.started
+                due = stream.first + int(elapsed * self.fps / self.frames_per_message) + 1
+            # As fast as possible means one message per client per poll, so that many
+            #   clients are served fairly
+            while stream.cursor < due:
+                if stream.cursor >= payloads and not self.loop:
+                    stream.peer.disconnect_later()
+                    stream.done = True
+                    break
+                stream.peer.send(
+                    0, enet.Packet(self._message(stream.cursor), enet.PACKET_FLAG_RELIABLE)
+                )
+                sent = time.perf_counter_ns()
+                for frame in self._frames[stream.cursor % payloads]:
+                    stream.sent_ns[frame] = sent
+                stream.cursor += 1
+            if stream.done or self.on_demand:
+                continue
+            if self.fps is None:
+                wait = 0
+            else:
+                next_due = (stream.cursor - stream.first) * self.frames_per_message / self.fps
+                until = max(next_due - (time.perf_counter() - stream.started), 0)
+                wait = until if wait is None else min(wait, until)
+        # Get what was queued up out on the wire now, rather than on the next poll
+        self._host.flush()
+        return wait
+
+    def serve_forever(self, idle_timeout=None):
+        """Serve clients until close() is called
+
+        Args:
+            idle_timeout (float): Return after this many seconds without any client
+                waiting for anything. None to never time out.
+        """
+        idle_since = time.perf_counter()
+        while not self._closed:
+            wait = self.poll()
+            if wait is None:
+                if idle_timeout is not None and time.perf_counter() - idle_since > idle_timeout:
+                    return
+                wait = 0.1
+            else:
+                idle_since = time.perf_counter()
+            if wait > 0:
+                # Wakes up early for acknowledgements and new clients
+                select.select([self.fileno()], [], [], min(wait, 0.1))
+
+    async def serve_async(self):
+        """Serve clients on the running asyncio loop until close() is called, or the
+        task is cancelled"""
+        fd = self.fileno()
+        while not self._closed:
+            wait = self.poll()
+            if wait == 0:
+                # Let the consoles on the same loop have a turn
+                await asyncio.sleep(0)
+            else:
+                await wait_readable(fd, 0.1 if wait is None else min(wait, 0.1))
+
+    def close(self):
+        """Disconnect every client and stop serving"""
+        self._closed = True
+        for stream in self.streams.values():
+            stream.peer.disconnect_now()
+        self.streams.clear()
+        self._host.flush()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Stream an SLP file to Slippstream clients, like Dolphin does"
+    )
+    parser.add_argument("path", help="SLP file to stream")
+    parser.add_argument("--address", default="127.0.0.1", help="IP address to listen on")
+    parser.add_argument(
+        "--port", type=int, default=51441, help="UDP port to listen on, 0 for any"
+    )
+    parser.add_argument(
+        "--fps", type=float, default=None, help="Frame rate. Default is as fast as possible"
+    )
+    parser.add_argument("--frames-per-message", type=int, default=1)
+    parser.add_argument("--loop", action="store_true", help="Repeat the replay forever")
+    parser.add_argument(
+        "--idle-timeout",
+        type=float,
+        default=None,
+        help="Exit after this many seconds without a client",
+    )
+    args = parser.parse_args()
+
+    server = ReplayServer(
+        args.path,
+        args.address,
+        args.port,
+        fps=args.fps,
+        frames_per_message=args.frames_per_message,
+        loop=args.loop,
+    )
+    print(server.port, flush=True)
+    try:
+        server.serve_forever(args.idle_timeout)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
@@ -5,6 +5,7 @@ This can be used to talk to some server implementing the Slippstream protocol
 (i.e. the Project Slippi fork of Nintendont or Slippi Ishiiruka).
 """
 
+import asyncio
 import json
 import socket
 import time
@@ -34,6 +35,35 @@ class EventType(Enum):
     FRAME_BOOKEND = 0x3C
 
 
+def _resolve(future, value):
+    if not future.done():
+        future.set_result(value)
+
+
+async def wait_readable(fd, timeout=None):
+    """Wait on the running asyncio loop until a file descriptor has data to read
+
+    Args:
+        fd (int): File descriptor to wait on
+        timeout (float): Give up after this many seconds. None to wait forever.
+
+    Returns:
+        True if fd became readable, False if the timeout ran out first
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+    loop.add_reader(fd, _resolve, future, True)
+    timer = None
+    if timeout is not None:
+        timer = loop.call_later(timeout, _resolve, future, False)
+    try:
+        return await future
+    finally:
+        loop.remove_reader(fd)
+        if timer is not None:
+            timer.cancel()
+
+
 class CommType(Enum):
     """Types of SlippiComm messages"""
 
@@ -62,6 +92,10 @@ class SlippstreamClient:
         self.now_frame_time = 0
         self.last_frame_time = 0
         self.server = None
+        # A timings.FrameTimings to count JSON parsing towards, set by the Console
+        self.timings = None
+        self.disconnected = False
+        """(bool): Whether the console has closed the connection"""
 
     def shutdown(self):
         """Close down the socket and connection to the console"""
@@ -79,6 +113,12 @@ class SlippstreamClient:
 
         return False
 
+    def fileno(self):
+        """File descriptor of the underlying socket, for use with select()"""
+        if self.gamecube:
+            return self._host.socket.fileno()
+        return self.server.fileno()
+
     def dispatch(self, polling_mode):
         """Dispatch messages with the peer (read and write packets)"""
         event = None
@@ -96,7 +136,12 @@ class SlippstreamClient:
                         return None
                 if event.type == enet.EVENT_TYPE_RECEIVE:
                     try:
-                        return json.loads(event.packet.data)
+                        if self.timings is None:
+                            return json.loads(event.packet.data)
+                        started = self.timings.start()
+                        message = json.loads(event.packet.data)
+                        self.timings.add("unwrap", started)
+                        return message
                     except json.JSONDecodeError:
                         # This happens at the end of a game for some reason?
                         if len(event.packet.data) == 0:
@@ -104,14 +149,9 @@ class SlippstreamClient:
                             continue
                         return None
                 elif event.type == enet.EVENT_TYPE_CONNECT:
-                    handshake = json.dumps(
-                        {
-                            "type": "connect_request",
-                            "cursor": 0,
-                        }
-                    )
-                    self._peer.send(0, enet.Packet(handshake.encode()))
+                    self.__send_connect_request()
                 elif event.type == enet.EVENT_TYPE_DISCONNECT:
+                    self.disconnected = True
                     return None
             else:
                 self.buf += self.server.recv(1000)
@@ -136,6 +176,127 @@ class SlippstreamClient:
 
         return None
 
+    def dispatch_batch(self, polling_mode):
+        """Receive every message that's waiting, rather than one per call like dispatch()
+
+        Waits for the first message the same way dispatch() does, then drains whatever
+        else ENet already has queued up with zero timeout service calls. The JSON of
+        all the packets is parsed in a single call.
+
+        Returns:
+            list of messages, in the order they arrived. Empty if nothing arrived in
+            polling mode, or if the console disconnected.
+        """
+        if not self.gamecube:
+            message = self.dispatch(polling_mode)
+            return [] if message is None else [message]
+        if self.disconnected:
+            return []
+        packets = []
+        wait_time = 0 if polling_mode else 1000
+        while True:
+            event = self._host.service(wait_time)
+            if event.type == enet.EVENT_TYPE_RECEIVE:
+                # Empty packets show up at the end of a game
+                if event.packet.data:
+                    packets.append(event.packet.data)
+                    wait_time = 0
+            elif event.type == enet.EVENT_TYPE_NONE:
+                if packets or polling_mode:
+                    break
+            elif event.type == enet.EVENT_TYPE_CONNECT:
+                self.__send_connect_request()
+            elif event.type == enet.EVENT_TYPE_DISCONNECT:
+                self.disconnected = True
+                break
+        if not packets:
+            return []
+        if self.timings is not None:
+            started = self.timings.start()
+        try:
+            messages = json.loads(b"[" + b",".join(packets) + b"]")
+        except json.JSONDecodeError:
+            # Find and drop the packets that aren't valid JSON
+            messages = []
+            for packet in packets:
+                try:
+                    messages.append(json.loads(packet))
+                except json.JSONDecodeError:
+                    pass
+        if self.timings is not None:
+            self.timings.add("unwrap", started)
+        return messages
+
+    async def connect_async(self, timeout=4.0):
+        """The asyncio version of connect(), waiting for the console on the event loop
+
+        pyenet holds the GIL while it services a host, so a blocking connect() can't
+        just be moved to another thread without stalling the loop.
+
+        Args:
+            timeout (float): Seconds to wait for the console before giving up
+
+        Returns True on success, False on failure
+        """
+        if not self.gamecube:
+            return self.connect()
+        try:
+            self._peer = self._host.connect(
+                enet.Address(bytes(self.address, "utf-8"), int(self.port)), 1
+            )
+        except OSError:
+            return False
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        try:
+            while True:
+                event = self._host.service(0)
+                if event.type == enet.EVENT_TYPE_CONNECT:
+                    self.__send_connect_request()
+                    return True
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return False
+                if event.type == enet.EVENT_TYPE_NONE:
+                    # Wake up now and then to let ENet resend the connect
+                    await self.wait_readable(min(remaining, 0.1))
+        except OSError:
+            return False
+
+    async def wait_readable(self, timeout=None):
+        """Wait on the running asyncio loop until the socket has data, see wait_readable()"""
+        return await wait_readable(self.fileno(), timeout)
+
+    async def dispatch_async(self, timeout=1.0):
+        """The asyncio version of dispatch(): waits for the next message without
+        blocking the event loop
+
+        Args:
+            timeout (float): How often to service the connection while no data arrives,
+                in seconds, so ENet's keepalives and resends still go out
+
+        Returns:
+            The next message, or None once the console has disconnected
+        """
+        if not self.gamecube:
+            # Reads off the GameCube's socket always block, so only start once there's data
+            await self.wait_readable()
+            return self.dispatch(True)
+        while True:
+            message = self.dispatch(True)
+            if message is not None or self.disconnected:
+                return message
+            await self.wait_readable(timeout)
+
+    def __send_connect_request(self):
+        handshake = json.dumps(
+            {
+                "type": "connect_request",
+                "cursor": 0,
+            }
+        )
+        self._peer.send(0, enet.Packet(handshake.encode()))
+
     def __new_handshake(self, cursor=0, token=NULL_TOKEN):
         """Returns a new binary handshake message"""
         handshake = bytearray()
@@ -170,13 +331,7 @@ class SlippstreamClient:
                 for _ in range(4):
                     event = self._host.service(1000)
                     if event.type == enet.EVENT_TYPE_CONNECT:
-                        handshake = json.dumps(
-                            {
-                                "type": "connect_request",
-                                "cursor": 0,
-                            }
-                        )
-                        self._peer.send(0, enet.Packet(handshake.encode()))
+                        self.__send_connect_request()
                         return True
                 return False
             except OSError:
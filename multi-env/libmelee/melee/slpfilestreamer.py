@@ -3,6 +3,9 @@
 Reads Slippi game events from SLP file rather than over network
 """
 
+import mmap
+import os
+import struct
 from enum import Enum
 
 import numpy as np
@@ -24,9 +27,167 @@ class EventType(Enum):
     FRAME_BOOKEND = 0x3C
 
 
+# Every finalized SLP file starts with the 'raw' array, as a UBJSON optimized uint8
+#   array with a big endian int32 length: {U\x03raw[$U#l<length>
+_RAW_HEADER = b"{U\x03raw[$U#l"
+_RAW_LENGTH = struct.Struct(">I")
+_RAW_OFFSET = len(_RAW_HEADER) + _RAW_LENGTH.size
+
+_PAYLOADS = EventType.PAYLOADS.value
+
+# Whether each command byte is a pre-frame or post-frame event
+_INPUT_EVENTS = [
+    command in (EventType.PRE_FRAME.value, EventType.POST_FRAME.value)
+    for command in range(0x100)
+]
+
+# Events whose first field (at 0x1) is the frame number
+_FRAME_EVENTS = frozenset(
+    event.value
+    for event in (
+        EventType.FRAME_START,
+        EventType.PRE_FRAME,
+        EventType.POST_FRAME,
+        EventType.ITEM_UPDATE,
+        EventType.FRAME_BOOKEND,
+    )
+)
+
+
+class SLPIndex:
+    """Byte offset of the start of every frame in an SLP file's raw event stream
+
+    Offsets are relative to the start of the raw array. A frame starts at its
+    FRAME_START event, or at its first frame event for files old enough not to have
+    those. Only the first occurrence of a frame counts, same as when streaming the file
+    through a Console, so frames replayed by rollback are skipped over.
+
+    Args:
+        first_frame (int): Frame number of offsets[0]
+        offsets (np.ndarray): int64 offset for each frame from first_frame on, or -1 if
+            the frame never appears
+        prelude_end (int): Offset of the first frame event. Everything before it
+            (payload sizes, game start) has to be read before seeking anywhere.
+    """
+
+    MAGIC = b"SLPIDX01"
+    _HEADER = struct.Struct(">8sQqqiQ")
+
+    def __init__(self, first_frame, offsets, prelude_end):
+        self.first_frame = first_frame
+        self.offsets = offsets
+        self.prelude_end = prelude_end
+
+    @property
+    def last_frame(self):
+        """(int): Frame number of the last frame in the file"""
+        return self.first_frame + len(self.offsets) - 1
+
+    def offset(self, frame):
+        """Returns the byte offset of the given frame, or raises KeyError"""
+        index = frame - self.first_frame
+        if index < 0 or index >= len(self.offsets) or self.offsets[index] < 0:
+            raise KeyError("frame %d is not in this file" % frame)
+        return int(self.offsets[index])
+
+    @classmethod
+    def build(cls, contents):
+        """Scan the raw event stream once and index it
+
+        Only the command byte and the frame number of each event are looked at.
+        """
+        eventsize = [0] * 0x100
+        if len(contents) < 2 or contents[0] != _PAYLOADS:
+            raise ValueError("raw event stream doesn't start with a payload sizes event")
+        payload_size = contents[1]
+        for cursor in range(0x2, payload_size, 3):
+            command, command_len = struct.unpack_from(">BH", contents, cursor)
+            eventsize[command] = command_len + 1
+
+        frame_of = struct.Struct(">i").unpack_from
+        frame_events = _FRAME_EVENTS
+        found = {}
+        prelude_end = None
+        current = None
+        index = payload_size + 1
+        end = len(contents)
+        while index < end:
+            command = contents[index]
+            size = eventsize[command]
+            if size == 0 or index + size > end:
+                break
+            if command in frame_events:
+                frame = frame_of(contents, index + 0x1)[0]
+                if prelude_end is None:
+                    prelude_end = index
+                if frame != current:
+                    current = frame
+                    if frame not in found:
+                        found[frame] = index
+            index += size
+
+        if not found:
+            return cls(0, np.zeros(0, dtype=np.int64), end)
+        first_frame = min(found)
+        offsets = np.full(max(found) - first_frame + 1, -1, dtype=np.int64)
+        for frame, offset in found.items():
+            offsets[frame - first_frame] = offset
+        return cls(first_frame, offsets, prelude_end)
+
+    def save(self, path, stat):
+        """Write the index to a sidecar file, tagged with the SLP file's size and mtime"""
+        with open(path, "wb") as file:
+            file.write(
+                self._HEADER.pack(
+                    self.MAGIC,
+                    stat.st_size,
+                    stat.st_mtime_ns,
+                    self.prelude_end,
+                    self.first_frame,
+                    len(self.offsets),
+                )
+            )
+            file.write(self.offsets.astype(">i8").tobytes())
+
+    @classmethod
+    def load(cls, path, stat):
+        """Read a sidecar index. Returns None if it's missing, broken or out of date"""
+        try:
+            with open(path, "rb") as file:
+                header = file.read(cls._HEADER.size)
+                magic, size, mtime, prelude_end, first_frame, count = cls._HEADER.unpack(
+                    header
+                )
+                if (magic, size, mtime) != (cls.MAGIC, stat.st_size, stat.st_mtime_ns):
+                    return None
+                offsets = np.frombuffer(file.read(count * 8), dtype=">i8")
+                if len(offsets) != count:
+                    return None
+        except (OSError, struct.error):
+            return None
+        return cls(first_frame, offsets.astype(np.int64), prelude_end)
+
+
 class SLPFileStreamer:
-    def __init__(self, path):
+    """Streams the events of an SLP file
+
+    The file is memory mapped rather than read in, and only the metadata at the end of
+    it is UBJSON decoded. Seeking to a frame uses an SLPIndex, which is built on first
+    use and saved next to the file as <path>.idx.
+
+    Args:
+        path (str): Path to the SLP file
+        index_cache (bool): Save and reuse the frame index sidecar file
+    """
+
+    def __init__(self, path, index_cache=True):
         self._path = path
+        self.index_cache = index_cache
+        self._index_path = str(path) + ".idx"
+        self._mmap = None
+        self._stat = None
+        self._slp_index = None
+        self._pending_seek = None
         self._contents = None
         self.eventsize = [0] * 0x100
         self._index = 0
@@ -38,15 +199,51 @@ class SLPFileStreamer:
         self.lastFrame = -9999
 
     def shutdown(self):
-        pass
+        self._contents = None
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # Someone still holds a view of an event, let garbage collection close it
+                pass
+            self._mmap = None
+
+    @property
+    def index(self):
+        """(SLPIndex): The frame index, loaded from the sidecar file or built on demand"""
+        if self._slp_index is None:
+            if self.index_cache:
+                self._slp_index = SLPIndex.load(self._index_path, self._stat)
+            if self._slp_index is None:
+                self._slp_index = SLPIndex.build(self._contents)
+                if self.index_cache:
+                    try:
+                        self._slp_index.save(self._index_path, self._stat)
+                    except OSError:
+                        pass
+        return self._slp_index
 
-    def _is_new_frame(self, event_bytes):
+    def seek(self, frame):
+        """Continue streaming from the start of the given frame
+
+        Raises KeyError if the frame isn't in the file.
+        """
+        offset = self.index.offset(frame)
+        if self._index < self.index.prelude_end:
+            # The payload sizes and game start still need to go out first
+            self._pending_seek = offset
+        else:
+            self._index = offset
+        # Don't let the first event of the frame look like the end of the previous one
+        self._frame = frame
+
+    def _is_new_frame(self, buffer, offset):
         """Introspect the bytes of the event to see if it represents a new frame
 
         This is for supporting older SLP files that don't have frame bookends
         """
-        if EventType(event_bytes[0]) in [EventType.POST_FRAME, EventType.PRE_FRAME]:
-            frame = np.ndarray((1,), ">i", event_bytes, 0x1)[0]
+        if _INPUT_EVENTS[buffer[offset]]:
+            frame = struct.unpack_from(">i", buffer, offset + 0x1)[0]
             if frame > self._frame:
                 self._frame = frame
                 return True
@@ -54,17 +251,24 @@ class SLPFileStreamer:
         return False
 
     def dispatch(self, dummy):
-        """Read a single game event off the buffer"""
+        """Read a single game event off the buffer
+
+        The payload handed back is a memoryview into the file contents, not a copy
+        """
+        if self._pending_seek is not None and self._index >= self.index.prelude_end:
+            self._index = self._pending_seek
+            self._pending_seek = None
         if self._index >= len(self._contents):
             return None
 
-        if EventType(self._contents[self._index]) == EventType.PAYLOADS:
-            cursor = 0x2
+        if self._contents[self._index] == _PAYLOADS:
             payload_size = self._contents[self._index + 1]
             num_commands = (payload_size - 1) // 3
+            cursor = self._index + 0x2
             for i in range(0, num_commands):
-                command = np.ndarray((1,), ">B", self._contents, cursor)[0]
-                command_len = np.ndarray((1,), ">H", self._contents, cursor + 0x1)[0]
+                command, command_len = struct.unpack_from(
+                    ">BH", self._contents, cursor
+                )
                 self.eventsize[command] = command_len + 1
                 cursor += 3
 
@@ -79,7 +283,7 @@ class SLPFileStreamer:
         event_size = self.eventsize[self._contents[self._index]]
 
         # Check to see if a new frame has happened for an old file type
-        if self._is_new_frame(self._contents[self._index : self._index + event_size]):
+        if self._is_new_frame(self._contents, self._index):
             wrapper = dict()
             wrapper["type"] = "frame_end"
             wrapper["payload"] = b""
@@ -92,38 +296,69 @@ class SLPFileStreamer:
 
         return wrapper
 
+    def _read_raw(self, file):
+        """Map the file and find the raw event stream in it
+
+        Returns the metadata dict, or None if this doesn't look like an SLP file
+        """
+        self._stat = os.fstat(file.fileno())
+        if self._stat.st_size < _RAW_OFFSET:
+            return None
+        self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[: len(_RAW_HEADER)] != _RAW_HEADER:
+            return self._read_raw_slow()
+        length = _RAW_LENGTH.unpack_from(self._mmap, len(_RAW_HEADER))[0]
+        end = _RAW_OFFSET + length
+        if end > len(self._mmap):
+            return None
+        # What follows the raw array is the rest of the top level object
+        try:
+            rest = ubjson.loadb(b"{" + self._mmap[end:])
+        except ubjson.decoder.DecoderException:
+            return None
+        if not isinstance(rest, dict):
+            return None
+        self._contents = memoryview(self._mmap)[_RAW_OFFSET:end]
+        return rest
+
+    def _read_raw_slow(self):
+        """Fall back to decoding the whole file, for files laid out some other way"""
+        try:
+            full = ubjson.loadb(self._mmap[:])
+        except ubjson.decoder.DecoderException:
+            return None
+        # This is annoying and sometimes happens when there's an error parsing
+        if not isinstance(full, dict):
+            return None
+        if "raw" not in full:
+            return None
+        self._contents = memoryview(full["raw"])
+        return full
+
     def connect(self):
         with open(self._path, mode="rb") as file:
-            full = None
-            try:
-                full = ubjson.loadb(file.read())
-            except ubjson.decoder.DecoderException:
-                return False
-            # This is annoying and sometimes happens when there's an error parsing
-            if not isinstance(full, dict):
-                return False
-            if "raw" not in full:
-                return False
-            raw = full["raw"]
-            self._contents = raw
-            try:
-                self.playedOn = full["metadata"]["playedOn"]
-            except KeyError:
-                pass
-            try:
-                self.timestamp = full["metadata"]["startAt"]
-            except KeyError:
-                pass
-            try:
-                self.consoleNick = full["metadata"]["consoleNick"]
-            except KeyError:
-                pass
-            try:
-                self.players = full["metadata"]["players"]
-            except KeyError:
-                pass
-            try:
-                self.lastFrame = full["metadata"]["lastFrame"]
-            except KeyError:
-                pass
-            return True
+            full = self._read_raw(file)
+        if full is None:
+            self.shutdown()
+            return False
+        try:
+            self.playedOn = full["metadata"]["playedOn"]
+        except KeyError:
+            pass
+        try:
+            self.timestamp = full["metadata"]["startAt"]
+        except KeyError:
+            pass
+        try:
+            self.consoleNick = full["metadata"]["consoleNick"]
+        except KeyError:
+            pass
+        try:
+            self.players = full["metadata"]["players"]
+        except KeyError:
+            pass
+        try:
+            self.lastFrame = full["metadata"]["lastFrame"]
+        except KeyError:
+            pass
+        return True
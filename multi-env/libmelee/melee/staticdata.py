@@ -0,0 +1,153 @@
+"""Shared, cached loading of the CSV data files that ship with libmelee
+
+actiondata.csv, characterdata.csv and framedata.csv are parsed once, and the parsed
+result is pickled to a cache file next to the CSV. Later processes load the pickle
+instead of parsing the CSV again. Each cache file records the SHA-256 of the CSV it
+came from and a format version, and is rebuilt whenever either doesn't match.
+
+Within a process every loader returns the same object each time, so the Consoles and
+FrameData instances of a process all share one copy. Treat what they return as read
+only.
+
+The cache files are written to the package directory, or to the directory named by the
+LIBMELEE_CACHE_DIR environment variable. If neither is writable the data is parsed
+in every process, the same as without a cache.
+"""
+
+import csv
+import hashlib
+import os
+import pickle
+import tempfile
+from collections import defaultdict
+
+from melee import enums
+
+CACHE_VERSION = 1
+"""(int): Bump whenever the layout of the parsed data changes"""
+
+PATH = os.path.dirname(os.path.realpath(__file__))
+
+_loaded = {}
+
+
+def _cache_dir():
+    return os.environ.get("LIBMELEE_CACHE_DIR", PATH)
+
+
+def cache_path(name):
+    """Where the parsed cache of the named CSV file is kept"""
+    return os.path.join(_cache_dir(), name + ".cache")
+
+
+def _read_cache(path, digest):
+    try:
+        with open(path, "rb") as file:
+            cached = pickle.load(file)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+        return None
+    if (
+        not isinstance(cached, dict)
+        or cached.get("version") != CACHE_VERSION
+        or cached.get("hash") != digest
+    ):
+        return None
+    return cached["data"]
+
+
+def _write_cache(path, digest, data):
+    # Write to a temporary file and rename it over the cache, so that processes starting
+    #   at the same time never see a half-written file
+    try:
+        handle, partial = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".partial")
+    except OSError:
+        return
+    try:
+        with os.fdopen(handle, "wb") as file:
+            pickle.dump(
+                {"version": CACHE_VERSION, "hash": digest, "data": data},
+                file,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+        os.replace(partial, path)
+    except OSError:
+        try:
+            os.remove(partial)
+        except OSError:
+            pass
+
+
+def load(name, parse):
+    """Load a data file through the cache
+
+    Args:
+        name (str): File name of the CSV, in the package directory
+        parse (callable): Called with the CSV's path to parse it when the cache is stale
+
+    Returns:
+        Whatever parse returned, shared by every caller in this process
+    """
+    if name in _loaded:
+        return _loaded[name]
+    path = os.path.join(PATH, name)
+    with open(path, "rb") as file:
+        digest = hashlib.sha256(file.read()).hexdigest()
+    cached = cache_path(name)
+    data = _read_cache(cached, digest)
+    if data is None:
+        data = parse(path)
+        _write_cache(cached, digest, data)
+    _loaded[name] = data
+    return data
+
+
+def clear(disk=False):
+    """Forget the data loaded in this process, and with disk=True delete the cache files"""
+    _loaded.clear()
+    if disk:
+        for name in ("actiondata.csv", "characterdata.csv", "framedata.csv"):
+            try:
+                os.remove(cache_path(name))
+            except OSError:
+                pass
+
+
+def _parse_actiondata(path):
+    zero_indices = defaultdict(set)
+    with open(path) as csvfile:
+        for line in csv.DictReader(csvfile):
+            if line["zeroindex"] == "True":
+                zero_indices[int(line["character"])].add(int(line["action"]))
+    return zero_indices
+
+
+def _parse_characterdata(path):
+    characterdata = dict()
+    with open(path) as csvfile:
+        for line in csv.DictReader(csvfile):
+            del line["Character"]
+            # Convert all fields to numbers
+            for key, value in line.items():
+                line[key] = float(value)
+            characterdata[enums.Character(line["CharacterIndex"])] = line
+    return characterdata
+
+
+def zero_indices():
+    """(dict of int - set of int): Per character index, the actions whose frame
+    counter starts at zero instead of one"""
+    return load("actiondata.csv", _parse_actiondata)
+
+
+def characterdata():
+    """(dict of enums.Character - dict): Physics constants of each character"""
+    return load("characterdata.csv", _parse_characterdata)
+
+
+def framedata_tables():
+    """(dict of str - np.ndarray): framedata.csv compiled into dense arrays, see
+    FrameData.tables"""
+    # Imported here since framedata itself loads its tables through this module
+    from melee.framedata import _compile_framedata
+
+    return load("framedata.csv", _compile_framedata)
@@ -0,0 +1,235 @@
+"""Opt-in latency histograms of where each frame's time goes inside a Console
+
+Create a console with timings=True and every frame records how many nanoseconds (from
+time.perf_counter_ns) were spent in each phase of Console.step():
+
+    flush   Sending the controller inputs queued up for the frame
+    wait    Waiting on the ENet socket / file for the frame's messages
+    unwrap  Unpacking the messages: JSON parsing and base64 decoding
+    decode  Decoding the Slippi events into the GameState
+    fixup   Fixing up the finished frame (frame indexing, IASA)
+    agent   Time outside of step(), between returning a frame and the next step()
+    step    All of step(), so everything above except agent
+
+A phase that's entered several times in a frame, like wait and decode when a frame
+arrives in more than one message, is summed up and counted once per frame.
+
+Each phase goes into a Histogram with a fixed number of log-scaled buckets, so
+recording is constant time and memory no matter how long the console runs. Read the
+results with FrameTimings.percentile() or FrameTimings.summary(), or write them out
+with FrameTimings.dump().
+"""
+
+import json
+import time
+
+PHASES = ("flush", "wait", "unwrap", "decode", "fixup", "agent", "step")
+"""(tuple of str): The phases of a frame that get timed, in the order they happen"""
+
+# Every power of two is split into 2**_SUB_BITS buckets, so a bucket is never wider
+#   than 1/8th of the values it holds
+_SUB_BITS = 3
+_SUB_BUCKETS = 1 << _SUB_BITS
+_MAX_BITS = 48
+BUCKETS = (_MAX_BITS - _SUB_BITS + 1) * _SUB_BUCKETS
+"""(int): Number of buckets in every Histogram. Covers 0 ns up to about three days"""
+
+
+def bucket_index(value):
+    """The index of the Histogram bucket a value (in ns) falls into"""
+    if value < _SUB_BUCKETS:
+        return max(value, 0)
+    bits = value.bit_length() - 1
+    if bits >= _MAX_BITS:
+        return BUCKETS - 1
+    shift = bits - _SUB_BITS
+    return (shift + 1) * _SUB_BUCKETS + ((value >> shift) & (_SUB_BUCKETS - 1))
+
+
+def bucket_bounds(index):
+    """(lowest, highest) value in ns that lands in the given bucket"""
+    if index < _SUB_BUCKETS:
+        return index, index
+    shift = index // _SUB_BUCKETS - 1
+    lowest = (_SUB_BUCKETS + index % _SUB_BUCKETS) << shift
+    return lowest, lowest + (1 << shift) - 1
+
+
+class Histogram:
+    """Counts of nanosecond durations, in a fixed number of log-scaled buckets
+
+    Percentiles are accurate to within the bucket size, 12.5% at worst. The count,
+    total, min and max are exact.
+    """
+
+    __slots__ = ["counts", "count", "total", "min", "max"]
+
+    def __init__(self):
+        self.counts = [0] * BUCKETS
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def record(self, value):
+        """Add a duration, in nanoseconds"""
+        self.counts[bucket_index(value)] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def clear(self):
+        """Forget everything recorded so far"""
+        self.counts = [0] * BUCKETS
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def mean(self):
+        """(float): Mean duration in ns, or None when empty"""
+        if not self.count:
+            return None
+        return self.total / self.count
+
+    def percentile(self, percent):
+        """Duration in ns that the given percent of recorded durations are at or below
+
+        Args:
+            percent (float): Between 0 and 100
+
+        Returns:
+            The midpoint of the bucket the percentile falls in, kept between the exact
+            min and max. None when empty.
+        """
+        if not self.count:
+            return None
+        # The rank of the value we want, counting from 1
+        rank = max(1, -(-self.count * percent // 100))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                lowest, highest = bucket_bounds(index)
+                return min(max((lowest + highest) // 2, self.min), self.max)
+        return self.max
+
+    def buckets(self):
+        """list of (lowest ns, highest ns, count) for every bucket that isn't empty"""
+        return [
+            bucket_bounds(index) + (count,)
+            for index, count in enumerate(self.counts)
+            if count
+        ]
+
+
+class FrameTimings:
+    """Per-phase latency histograms of a Console. See the module docstring
+
+    Made by consoles with timings=True, as Console.timings. The console calls start(),
+    add() and end_frame(); everything else is for reading the results.
+
+    Attributes:
+        histograms (dict of str - Histogram): One per name in PHASES
+        frames (int): How many frames have been recorded
+    """
+
+    def __init__(self):
+        self.histograms = {phase: Histogram() for phase in PHASES}
+        self.frames = 0
+        # Time so far of the phases that happened in the frame in progress
+        self._current = {}
+        self.start = time.perf_counter_ns
+        """(callable): The current time in ns, to later pass to add()"""
+
+    def add(self, phase, started):
+        """Count the time since started (from start()) towards a phase of this frame
+
+        Returns:
+            The current time in ns, so consecutive phases can be chained
+        """
+        now = time.perf_counter_ns()
+        current = self._current
+        current[phase] = current.get(phase, 0) + now - started
+        return now
+
+    def add_ns(self, phase, duration):
+        """Count a duration in ns towards a phase of this frame"""
+        current = self._current
+        current[phase] = current.get(phase, 0) + duration
+
+    def elapsed(self, phase):
+        """Time in ns counted towards a phase of the frame in progress so far"""
+        return self._current.get(phase, 0)
+
+    def end_frame(self):
+        """Record the frame in progress into the histograms, and start a new one
+
+        Only the phases that happened during the frame are recorded.
+        """
+        histograms = self.histograms
+        for phase, duration in self._current.items():
+            histograms[phase].record(duration)
+        self._current.clear()
+        self.frames += 1
+
+    def clear(self):
+        """Forget everything recorded so far"""
+        for histogram in self.histograms.values():
+            histogram.clear()
+        self._current.clear()
+        self.frames = 0
+
+    def percentile(self, phase, percent):
+        """Shorthand for histograms[phase].percentile(percent), in ns"""
+        return self.histograms[phase].percentile(percent)
+
+    def summary(self, percentiles=(50, 90, 99, 99.9)):
+        """Per-phase statistics, in microseconds
+
+        Returns:
+            dict of phase to a dict with the count, mean, min, max and the
+            given percentiles ("p50_us", "p99.9_us", ...). Phases never entered are
+            left out.
+        """
+        summary = {}
+        for phase, histogram in self.histograms.items():
+            if not histogram.count:
+                continue
+            stats = {
+                "count": histogram.count,
+                "mean_us": histogram.mean() / 1000,
+                "min_us": histogram.min / 1000,
+                "max_us": histogram.max / 1000,
+            }
+            for percent in percentiles:
+                stats["p%g_us" % percent] = histogram.percentile(percent) / 1000
+            summary[phase] = stats
+        return summary
+
+    def to_dict(self):
+        """Everything recorded, as a JSON serializable dict
+
+        Has the frame count, the summary() and the non-empty buckets of every phase
+        as [lowest ns, highest ns, count] lists.
+        """
+        return {
+            "frames": self.frames,
+            "summary": self.summary(),
+            "buckets": {
+                phase: [list(bucket) for bucket in histogram.buckets()]
+                for phase, histogram in self.histograms.items()
+                if histogram.count
+            },
+        }
+
+    def dump(self, file):
+        """Write to_dict() as JSON to a path or an open text file"""
+        if isinstance(file, str):
+            with open(file, "w") as output:
+                json.dump(self.to_dict(), output, indent=2)
+        else:
+            json.dump(self.to_dict(), file, indent=2)
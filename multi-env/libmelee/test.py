@@ -1,5 +1,19 @@
 #!/usr/bin/python3
+import asyncio
+import base64
+import csv
+import io
+import json
+import os
+import pickle
+import socket
+import subprocess
+import sys
+import tempfile
 import unittest
+from unittest import mock
+
+import numpy as np
 
 import melee
 
@@ -72,6 +86,574 @@ class SLPFile(unittest.TestCase):
             framedata.is_attack(melee.Character.FALCO, melee.Action.STANDING)
         )
 
+    def test_framedata_tables(self):
+        """Per-action summaries of a small frame data file match the frame by frame answers"""
+        fields = ["character", "action", "frame"]
+        for i in range(1, 5):
+            fields += ["hitbox_%d_%s" % (i, name) for name in ("status", "size", "x", "y")]
+        fields += ["locomotion_x", "locomotion_y", "iasa", "facing_changed", "projectile"]
+        # Fox's forward air hits on frames 3-4 and 7-8, with frame 6 missing from the
+        # file. His forward roll moves 2 units a frame and has no hitboxes
+        hitboxes = {3: [(5, 4)], 4: [(5, 4)], 7: [(2, 10), (2, -3)], 8: [(2, 10)]}
+        rows = []
+        for action, frames, locomotion in ((66, [1, 2, 3, 4, 5, 7, 8, 9, 10], 1.0), (233, range(1, 6), 2.0)):
+            for frame in frames:
+                row = {"character": 1, "action": action, "frame": frame, "locomotion_x": locomotion,
+                       "locomotion_y": 0.0, "iasa": action == 66 and frame >= 9,
+                       "facing_changed": False, "projectile": False}
+                boxes = hitboxes.get(frame, []) if action == 66 else []
+                for i in range(4):
+                    size, x = boxes[i] if i < len(boxes) else (0, 0)
+                    row.update({"hitbox_%d_status" % (i + 1): i < len(boxes), "hitbox_%d_size" % (i + 1): size,
+                                "hitbox_%d_x" % (i + 1): x, "hitbox_%d_y" % (i + 1): 0})
+                rows.append(row)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "framedata.csv")
+            with open(path, "w", newline="") as f:
+                writer = csv.DictWriter(f, fields)
+                writer.writeheader()
+                writer.writerows(rows)
+            tables = melee.framedata._compile_framedata(path)
+        with mock.patch.dict(melee.staticdata._loaded, {"framedata.csv": tables}):
+            framedata = melee.FrameData()
+
+        fox, fair, roll = melee.Character.FOX, melee.Action.FAIR, melee.Action.ROLL_FORWARD
+        self.assertTrue(framedata.is_attack(fox, fair))
+        self.assertFalse(framedata.is_attack(fox, roll))
+        self.assertEqual(framedata.first_hitbox_frame(fox, fair), 3)
+        self.assertEqual(framedata.last_hitbox_frame(fox, fair), 8)
+        self.assertEqual(framedata.hitbox_count(fox, fair), 2)
+        self.assertEqual(framedata.iasa(fox, fair), 9)
+        self.assertEqual(framedata.frame_count(fox, fair), 10)
+        self.assertEqual(framedata.frame_count(fox, roll), 5)
+        self.assertEqual(framedata.last_roll_frame(fox, roll), 5)
+        self.assertEqual(framedata.range_forward(fox, fair, 0), 12)
+        self.assertEqual(framedata.range_forward(fox, fair, 7), 12)
+        self.assertEqual(framedata.range_forward(fox, fair, 8), 0)
+        self.assertEqual(framedata.range_backward(fox, fair, 6), 5)
+        self.assertEqual(framedata.range_backward(fox, fair, 7), 0)
+        self.assertEqual(framedata.attack_state(fox, fair, 2), melee.AttackState.WINDUP)
+        self.assertEqual(framedata.attack_state(fox, fair, 6), melee.AttackState.ATTACKING)
+        self.assertEqual(framedata.attack_state(fox, fair, 9), melee.AttackState.COOLDOWN)
+
+        # Looking up the missing frame doesn't make the action any shorter
+        self.assertIsNone(framedata._getframe(fox, fair, 6))
+        self.assertEqual(framedata.frame_count(fox, fair), 10)
+
+        def player(action, x, facing=True):
+            state = melee.PlayerState()
+            state.character, state.action, state.action_frame = fox, action, 0
+            state.position.x, state.facing, state.on_ground = x, facing, True
+            return state
+
+        stage = melee.Stage.FINAL_DESTINATION
+        for distance, facing, frames in ((10, True, 3), (13, False, 0), (20, True, 7), (30, True, 0)):
+            attacker = player(fair, 0, facing)
+            defender = player(melee.Action.STANDING, distance if facing else -distance)
+            self.assertEqual(framedata.in_range(attacker, defender, stage), frames)
+
+        gamestate = melee.GameState()
+        gamestate.stage = stage
+        rolling = player(roll, 50)
+        rolling.action_frame, rolling.position.y = 2, 100
+        self.assertEqual(framedata.roll_end_position(rolling, gamestate), 56)
+
+    def test_decode_short_event(self):
+        """Fields past the end of an older, shorter event fall back to defaults"""
+        decoder = melee.eventdecoder.POST_FRAME
+        event = bytearray(0x32)
+        event[0x0] = 0x38
+        event[0x5] = 1
+        event[0x21] = 4
+        values = dict(zip(decoder.names, decoder.decode(bytes(event), 0, len(event))))
+        self.assertEqual(values["port"], 1)
+        self.assertEqual(values["stock"], 4)
+        self.assertEqual(values["jumps_left"], 1)
+        self.assertEqual(values["hitlag_left"], 0)
+        self.assertEqual(values["fod_platform_right"], 0)
+
+    def test_enum_tables(self):
+        """Raw ids map to their enum members, and unknown ids to the fallback"""
+        decoder = melee.eventdecoder
+        self.assertIs(decoder.ACTIONS[27], melee.Action(27))
+        self.assertIs(decoder.ACTIONS[0xFFF0], melee.Action.UNKNOWN_ANIMATION)
+        self.assertIs(decoder.CHARACTERS[1], melee.Character.FOX)
+        self.assertIs(decoder.CHARACTERS[0xF0], melee.Character.UNKNOWN_CHARACTER)
+        self.assertIs(decoder.CSS_CHARACTERS[0x0A], melee.Character.FOX)
+        self.assertIs(
+            decoder.PROJECTILE_TYPES[0xFFFF], melee.ProjectileType.UNKNOWN_PROJECTILE
+        )
+
+    def test_array_mirror(self):
+        """The mirrored player arrays agree with the PlayerState objects"""
+        console = melee.Console(
+            system="file",
+            allow_old_version=False,
+            path="test_artifacts/test_game_1.slp",
+            array_mirror=True,
+        )
+        self.assertTrue(console.connect())
+        while True:
+            gamestate = console.step()
+            if gamestate is None:
+                break
+            if gamestate.frame == 297:
+                row = gamestate.columns.players[1]
+                player = gamestate.players[2]
+                self.assertEqual(row[melee.columnar.COLUMN["action"]], player.action.value)
+                self.assertEqual(row[melee.columnar.COLUMN["action_frame"]], player.action_frame)
+                self.assertEqual(row[melee.columnar.COLUMN["x"]], np.float32(player.position.x))
+                self.assertEqual(row[melee.columnar.COLUMN["y"]], np.float32(player.position.y))
+                observation = gamestate.columns.observation([1, 2], ["percent", "stock"])
+                self.assertEqual(observation.shape, (2, 2))
+                self.assertEqual(observation[0, 0], 17)
+
+    def test_seek(self):
+        """Seeking to a frame gives the same gamestates as reading up to it"""
+        console = melee.Console(
+            system="file",
+            allow_old_version=False,
+            path="test_artifacts/test_game_1.slp",
+        )
+        self.assertTrue(console.connect())
+        console._slippstream.index_cache = False
+        frames = [gamestate.frame for gamestate in console.frames(297, 300)]
+        self.assertEqual(frames, [297, 298, 299])
+        gamestate = next(console.frames(297))
+        self.assertEqual(gamestate.players[2].action.value, 27)
+        self.assertEqual(gamestate.players[1].percent, 17)
+        with self.assertRaises(KeyError):
+            console.seek(100000)
+
+    def test_reuse_gamestates(self):
+        """Reused gamestates read the same as new ones, and snapshots don't change"""
+        consoles = [
+            melee.Console(
+                system="file",
+                path="test_artifacts/test_game_1.slp",
+                reuse_gamestates=reuse,
+            )
+            for reuse in (False, True)
+        ]
+        for console in consoles:
+            self.assertTrue(console.connect())
+        seen = set()
+        snapshot = None
+        while True:
+            fresh, reused = [console.step() for console in consoles]
+            if fresh is None:
+                self.assertIsNone(reused)
+                break
+            seen.add(id(reused))
+            self.assertEqual(fresh.frame, reused.frame)
+            for port, player in fresh.players.items():
+                self.assertEqual(player.action, reused.players[port].action)
+                self.assertEqual(player.position, reused.players[port].position)
+                self.assertEqual(
+                    player.invulnerability_left, reused.players[port].invulnerability_left
+                )
+            if reused.frame == 297:
+                snapshot = reused.snapshot()
+        self.assertEqual(len(seen), 2)
+        self.assertEqual(snapshot.frame, 297)
+        self.assertEqual(snapshot.players[2].action.value, 27)
+        self.assertEqual(snapshot.players[1].percent, 17)
+
+    def test_lazy_decoding(self):
+        """Lazily decoded players read the same as eagerly decoded ones"""
+        consoles = [
+            melee.Console(
+                system="file",
+                path="test_artifacts/test_game_1.slp",
+                lazy_decoding=lazy,
+            )
+            for lazy in (False, True)
+        ]
+        for console in consoles:
+            self.assertTrue(console.connect())
+        while True:
+            eager, lazy = [console.step() for console in consoles]
+            if eager is None:
+                break
+            if eager.frame in (-123, 297, 900):
+                # A copy holds on to the event bytes, not to views of the file
+                copied = lazy.snapshot()
+                for port, player in eager.players.items():
+                    self.assertEqual(player.ecb, copied.players[port].ecb)
+                    other = lazy.players[port]
+                    self.assertIsInstance(other, melee.gamestate.LazyPlayerState)
+                    self.assertEqual(player.action, other.action)
+                    self.assertEqual(player.ecb, other.ecb)
+                    self.assertEqual(player.ecb_bottom, other.ecb_bottom)
+                    self.assertEqual(player.hitlag_left, other.hitlag_left)
+                    self.assertEqual(player.speed_y_self, other.speed_y_self)
+                    self.assertEqual(
+                        player.controller_state.button, other.controller_state.button
+                    )
+                    self.assertEqual(
+                        player.controller_state.main_stick,
+                        other.controller_state.main_stick,
+                    )
+
+    def test_timings(self):
+        """Every frame's phases are recorded, and percentiles come from the histograms"""
+        from melee import timings
+
+        histogram = timings.Histogram()
+        for value in range(1, 1001):
+            histogram.record(value * 1000)
+        self.assertEqual(histogram.count, 1000)
+        self.assertEqual(histogram.percentile(0), 1000)
+        self.assertEqual(histogram.percentile(100), 1000000)
+        self.assertAlmostEqual(histogram.percentile(50), 500000, delta=500000 / 8)
+        self.assertAlmostEqual(histogram.percentile(99), 990000, delta=990000 / 8)
+        for index in range(timings.BUCKETS):
+            lowest, highest = timings.bucket_bounds(index)
+            self.assertEqual(timings.bucket_index(lowest), index)
+            self.assertEqual(timings.bucket_index(highest), index)
+
+        console = melee.Console(
+            system="file", path="test_artifacts/test_game_1.slp", timings=True
+        )
+        self.assertTrue(console.connect())
+        frames = 0
+        while console.step() is not None:
+            frames += 1
+        summary = console.timings.summary()
+        self.assertEqual(console.timings.frames, frames)
+        self.assertEqual(summary["decode"]["count"], frames)
+        self.assertEqual(summary["fixup"]["count"], frames)
+        self.assertEqual(summary["agent"]["count"], frames - 1)
+        self.assertNotIn("unwrap", summary)
+        self.assertLessEqual(summary["step"]["p50_us"], summary["step"]["p99_us"])
+        output = io.StringIO()
+        console.timings.dump(output)
+        dumped = json.loads(output.getvalue())
+        self.assertEqual(dumped["frames"], frames)
+        self.assertEqual(
+            sum(count for _, _, count in dumped["buckets"]["decode"]), frames
+        )
+
+    def test_step_async(self):
+        """One event loop drives several consoles, with the same frames as step()"""
+        consoles = [
+            melee.Console(system="file", path="test_artifacts/test_game_1.slp")
+            for _ in range(3)
+        ]
+
+        async def watch(console):
+            self.assertTrue(await console.connect_async())
+            frames = []
+            while True:
+                gamestate = await console.step_async()
+                if gamestate is None:
+                    return frames
+                frames.append((gamestate.frame, gamestate.players[2].action))
+
+        async def watch_all():
+            return await asyncio.gather(*[watch(console) for console in consoles])
+
+        results = asyncio.run(watch_all())
+        console = melee.Console(system="file", path="test_artifacts/test_game_1.slp")
+        self.assertTrue(console.connect())
+        expected = []
+        while True:
+            gamestate = console.step()
+            if gamestate is None:
+                break
+            expected.append((gamestate.frame, gamestate.players[2].action))
+        self.assertEqual(len(expected), 1038)
+        for frames in results:
+            self.assertEqual(frames, expected)
+
+    def test_batched_messages(self):
+        """Messages holding several frames, or parts of them, give every frame in turn"""
+        streamer = melee.slpfilestreamer.SLPFileStreamer("test_artifacts/test_game_1.slp")
+        self.assertTrue(streamer.connect())
+        events = bytes(streamer._contents)
+        eventsize = [0] * 0x100
+        for cursor in range(0x2, events[1], 3):
+            eventsize[events[cursor]] = int.from_bytes(events[cursor + 1:cursor + 3], "big") + 1
+        # Cut the events into messages of seven events each, whatever frame they're in
+        offsets = [0, events[1] + 1]
+        while offsets[-1] < len(events) and eventsize[events[offsets[-1]]]:
+            offsets.append(offsets[-1] + eventsize[events[offsets[-1]]])
+        cuts = offsets[1::7] + [offsets[-1]]
+        batch = [
+            {"type": "game_event", "payload": base64.b64encode(events[start:end]).decode()}
+            for start, end in zip([0] + cuts, cuts)
+            if end > start
+        ]
+
+        class Stream(melee.slippstream.SlippstreamClient):
+            def dispatch_batch(self, polling_mode):
+                taken = batch[:3]
+                del batch[:3]
+                return taken
+
+        console = melee.Console(system="dolphin", tmp_home_directory=False)
+        console._slippstream = Stream()
+        reference = melee.Console(system="file", path="test_artifacts/test_game_1.slp")
+        self.assertTrue(reference.connect())
+        frames = 0
+        while True:
+            gamestate = console.step()
+            expected = reference.step()
+            if expected is None:
+                break
+            self.assertEqual(gamestate.frame, expected.frame)
+            self.assertEqual(gamestate.players[1].position, expected.players[1].position)
+            frames += 1
+        self.assertEqual(frames, 1038)
+
+    def test_replay_server(self):
+        """A console reads the same frames from a ReplayServer as from the file"""
+        from melee.replayserver import ReplayServer
+
+        expected = []
+        console = melee.Console(system="file", path="test_artifacts/test_game_1.slp")
+        self.assertTrue(console.connect())
+        while True:
+            gamestate = console.step()
+            if gamestate is None:
+                break
+            expected.append((gamestate.frame, gamestate.players[2].action))
+
+        async def watch():
+            server = ReplayServer(
+                "test_artifacts/test_game_1.slp", port=0, frames_per_message=2
+            )
+            serving = asyncio.ensure_future(server.serve_async())
+            console = melee.Console(
+                system="dolphin", tmp_home_directory=False, slippi_port=server.port
+            )
+            self.assertTrue(await console.connect_async())
+            frames = []
+            while True:
+                gamestate = await console.step_async()
+                if gamestate is None:
+                    break
+                frames.append((gamestate.frame, gamestate.players[2].action))
+            serving.cancel()
+            server.close()
+            self.assertEqual(console.nick, "replay")
+            return frames
+
+        self.assertEqual(asyncio.run(asyncio.wait_for(watch(), 60)), expected)
+
+        # And with blocking step() calls, with the server in its own process
+        server = subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "melee.replayserver",
+                "test_artifacts/test_game_1.slp",
+                "--port",
+                "0",
+                "--idle-timeout",
+                "10",
+            ],
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        try:
+            port = int(server.stdout.readline())
+            console = melee.Console(
+                system="dolphin", tmp_home_directory=False, slippi_port=port
+            )
+            self.assertTrue(console.connect())
+            frames = []
+            while True:
+                gamestate = console.step()
+                if gamestate is None:
+                    break
+                frames.append((gamestate.frame, gamestate.players[2].action))
+            self.assertEqual(frames, expected)
+        finally:
+            server.kill()
+            server.wait()
+            server.stdout.close()
+
+    def test_mock_dolphin(self):
+        """Bots get a frame from the mock Dolphin for every flush of their inputs"""
+        from melee import mockdolphin
+
+        expected = []
+        console = melee.Console(system="file", path="test_artifacts/test_game_1.slp")
+        self.assertTrue(console.connect())
+        while True:
+            gamestate = console.step()
+            if gamestate is None:
+                break
+            expected.append(gamestate.frame)
+
+        with tempfile.TemporaryDirectory() as directory:
+            directory = mockdolphin.install(
+                directory, "test_artifacts/test_game_1.slp", loop=False
+            )
+            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+                sock.bind(("127.0.0.1", 0))
+                port = sock.getsockname()[1]
+            console = melee.Console(path=directory, blocking_input=True, slippi_port=port)
+            controllers = [melee.Controller(console=console, port=pad) for pad in (1, 2)]
+            console.run()
+            try:
+                self.assertTrue(console.connect())
+                for controller in controllers:
+                    self.assertTrue(controller.connect())
+                frames = []
+                while True:
+                    controllers[0].press_button(melee.Button.BUTTON_A)
+                    controllers[1].tilt_analog(melee.Button.BUTTON_MAIN, 0.2, 0.8)
+                    gamestate = console.step()
+                    if gamestate is None:
+                        break
+                    frames.append(gamestate.frame)
+                self.assertEqual(console.nick, "mockdolphin")
+                self.assertEqual(frames, expected)
+            finally:
+                console.stop()
+
+    def test_home_template(self):
+        """Template homes link the read-only files, and own what they write to"""
+        from melee import hometemplate
+
+        with tempfile.TemporaryDirectory() as root:
+            user = os.path.join(root, "User")
+            for directory in ("Config", "GC", "Wii", "Load", "Cache"):
+                os.makedirs(os.path.join(user, directory))
+                with open(os.path.join(user, directory, "file"), "w") as file:
+                    file.write(directory * 100)
+            with open(os.path.join(user, "Config", "Dolphin.ini"), "w") as file:
+                file.write("[Core]\n")
+
+            consoles = [
+                melee.Console(path=root, home_template=True, slippi_port=port)
+                for port in (51441, 51442)
+            ]
+            try:
+                homes = [console.dolphin_home_path for console in consoles]
+                self.assertIn("seconds", consoles[0].home_stats)
+                for home, port in zip(homes, (51441, 51442)):
+                    self.assertEqual(os.stat(home + "Load/file").st_nlink, 3)
+                    self.assertEqual(os.stat(home + "GC/file").st_nlink, 1)
+                    self.assertEqual(os.stat(home + "Wii/file").st_nlink, 1)
+                    self.assertEqual(os.listdir(home + "Cache"), [])
+                    self.assertTrue(os.path.isfile(home + "GameSettings/GALE01r2.ini"))
+                    with open(home + "Config/Dolphin.ini") as file:
+                        self.assertIn("slippispectatorlocalport = %d" % port, file.read())
+                # Only the private directories are really written
+                self.assertEqual(
+                    hometemplate.written_bytes(consoles[0].temp_dir),
+                    sum(
+                        hometemplate.written_bytes(homes[0] + directory)
+                        for directory in hometemplate.PRIVATE
+                    ),
+                )
+                # Saves written in place by one instance don't reach the template or
+                #   the other instance
+                template = hometemplate.template_for(user)
+                for directory in ("GC", "Wii"):
+                    with open(homes[0] + directory + "/file", "r+") as file:
+                        file.write("saved")
+                    for home in (template + "/", homes[1]):
+                        with open(home + directory + "/file") as file:
+                            self.assertEqual(file.read(), directory * 100)
+                # Writing an instance's config leaves the other instance's alone
+                melee.Controller(console=consoles[0], port=1)
+                self.assertFalse(os.path.exists(homes[1] + "Config/GCPadNew.ini"))
+            finally:
+                for console in consoles:
+                    console.stop()
+
+    def test_dataset(self):
+        """Convert a replay to a table, and skip it the second time"""
+        from melee import dataset
+
+        with tempfile.TemporaryDirectory() as output_dir:
+            result = dataset.convert_file(
+                "test_artifacts/test_game_1.slp", output_dir, "npz"
+            )
+            self.assertEqual(result["status"], "converted")
+            self.assertEqual(result["frames"], 1038)
+            with open(result["output"], "rb") as file:
+                columns = dict(np.load(file))
+            row = list(columns["frame"]).index(297)
+            self.assertEqual(columns["p1_percent"][row], 17)
+            self.assertEqual(columns["p2_action"][row], 27)
+            self.assertEqual(columns["slp_version"][0], "3.6.1")
+            result = dataset.convert_file(
+                "test_artifacts/test_game_1.slp", output_dir, "npz"
+            )
+            self.assertEqual(result["status"], "skipped")
+            self.assertEqual(len(os.listdir(output_dir)), 1)
+
+            # The formats that need pyarrow say so up front when it's missing
+            with mock.patch.object(dataset, "pyarrow", None):
+                with self.assertRaises(ImportError):
+                    dataset.convert_directory("test_artifacts", output_dir, "parquet")
+
+    def test_diff_input(self):
+        """Diffed controllers only send what changed, in one write per flush"""
+        with tempfile.TemporaryDirectory() as home:
+            os.makedirs(home + "/Config")
+            with open(home + "/Config/Dolphin.ini", "w") as dolphinfile:
+                dolphinfile.write("[Core]\n")
+            console = melee.Console(
+                system="dolphin", dolphin_home_path=home + "/", tmp_home_directory=False
+            )
+            controller = melee.Controller(console=console, port=1, diff_input=True)
+            controller.pipe = io.StringIO()
+            controller.release_all()
+            controller.press_button(melee.Button.BUTTON_A)
+            controller.tilt_analog_unit(melee.Button.BUTTON_MAIN, 1, 0)
+            controller.flush()
+            self.assertEqual(
+                controller.pipe.getvalue(), "PRESS A\nSET MAIN 1.0 0.5\nFLUSH\n"
+            )
+            controller.release_all()
+            controller.press_button(melee.Button.BUTTON_A)
+            controller.flush()
+            self.assertTrue(
+                controller.pipe.getvalue().endswith("FLUSH\nSET MAIN 0.5 0.5\nFLUSH\n")
+            )
+            self.assertEqual(controller.writes, 2)
+            self.assertFalse(controller.prev.button is controller.current.button)
+            controller.pipe = None
+
+    def test_staticdata(self):
+        """Data files are parsed once per process, and cached until the CSV changes"""
+        from melee import staticdata
+
+        with tempfile.TemporaryDirectory() as cache_dir, mock.patch.dict(
+            os.environ, {"LIBMELEE_CACHE_DIR": cache_dir}
+        ):
+            try:
+                staticdata.clear()
+                characterdata = staticdata.characterdata()
+                self.assertIs(staticdata.characterdata(), characterdata)
+                self.assertIs(melee.Console(system="file").characterdata, characterdata)
+                path = staticdata.cache_path("characterdata.csv")
+                self.assertTrue(os.path.isfile(path))
+
+                staticdata.clear()
+                cached = staticdata.characterdata()
+                self.assertIsNot(cached, characterdata)
+                self.assertEqual(cached, characterdata)
+
+                # A cache made from different contents is ignored and replaced
+                with open(path, "rb") as file:
+                    contents = pickle.load(file)
+                contents["hash"] = "0" * 64
+                contents["data"] = {}
+                with open(path, "wb") as file:
+                    pickle.dump(contents, file)
+                staticdata.clear()
+                self.assertEqual(staticdata.characterdata(), characterdata)
+            finally:
+                staticdata.clear()
+
     def test_corrupt_file(self):
         """Load a corrupt SLP file and make sure we don't crash"""
         console = melee.Console(
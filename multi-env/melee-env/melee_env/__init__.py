@@ -1,8 +1,14 @@
 import melee_env.env
+import melee_env.vec_env
+import melee_env.subproc_env
+import melee_env.pool
 import melee_env.dconfig
 import melee_env.agents.basic
 import melee_env.agents.util
 from melee_env.env import *
+from melee_env.vec_env import *
+from melee_env.subproc_env import *
+from melee_env.pool import *
 from melee_env.dconfig import *
 from melee_env.agents.basic import *
 from melee_env.agents.util import *
@@ -36,6 +36,17 @@ class ObservationSpace:
 
         return np.array([x_positions, y_positions]).T  # players x 2
 
+    def get_observation_vector(self, gamestate, ports=(1, 2), fields=None):
+        """Flat float32 observation built straight from the console's player arrays
+
+        Needs an env created with array_mirror=True. See melee.columnar.FIELDS for the
+        available fields. The result is ordered port by port.
+        """
+        if gamestate.columns is None:
+            raise ValueError(
+                "gamestate has no columns, create the env with array_mirror=True")
+        return gamestate.columns.observation(ports, fields).ravel()
+
     def __call__(self, gamestate):
         reward = (0, 0)
         info = None
@@ -216,6 +227,13 @@ class ActionSpace:
 
         self.size = self.action_space.shape[0]
 
+        # The same actions in ControlState's layout. Buttons 1-4 are A, B, Z and
+        #   digital R, the sticks are already in -1..1
+        self.control_states = np.zeros((self.size, 13))
+        self.control_states[:, 7:9] = self.action_space[:, :2]
+        for button, column in [(1, 0), (2, 1), (3, 4), (4, 6)]:
+            self.control_states[self.action_space[:, 2] == button, column] = 1
+
     def sample(self):
         return np.random.choice(self.size)
 
@@ -223,7 +241,7 @@ class ActionSpace:
         if action > self.size - 1:
             exit("Error: invalid action!")
 
-        return ControlState(self.action_space[action])
+        return ControlState(self.control_states[action])
 
 
 class ControlState:
@@ -259,6 +277,79 @@ class ControlState:
             controller.press_shoulder(melee.enums.Button.BUTTON_R, self.state[12])
 
 
+class _StateRecorder:
+    """Takes the place of a melee.Controller to see which state a control leaves it in"""
+
+    def __init__(self):
+        self.current = melee.ControllerState()
+
+    def release_all(self):
+        self.current = melee.ControllerState()
+
+    def press_button(self, button):
+        self.current.button[button] = True
+
+    def release_button(self, button):
+        self.current.button[button] = False
+
+    def press_shoulder(self, button, amount):
+        if button == melee.enums.Button.BUTTON_L:
+            self.current.l_shoulder = amount
+        elif button == melee.enums.Button.BUTTON_R:
+            self.current.r_shoulder = amount
+
+    def tilt_analog(self, button, x, y):
+        if button == melee.enums.Button.BUTTON_MAIN:
+            self.current.main_stick = (x, y)
+        else:
+            self.current.c_stick = (x, y)
+
+    def tilt_analog_unit(self, button, x, y):
+        self.tilt_analog(button, (x / 2) + 0.5, (y / 2) + 0.5)
+
+
+class CompiledControl:
+    """A control with its controller state and pipe commands worked out ahead of time
+
+    Applying it is one Controller.set_state() call: a dict copy and a single queued write.
+    """
+
+    __slots__ = ("state", "controller_state", "commands")
+
+    def __init__(self, control):
+        recorder = _StateRecorder()
+        control(recorder)
+        self.state = getattr(control, "state", None)
+        self.controller_state = recorder.current
+        self.commands = recorder.current.toCommands()
+
+    def __call__(self, controller):
+        controller.set_state(self.controller_state, self.commands)
+
+
+class ActionTable:
+    """Precompiled version of a discrete action space
+
+    Works with any space that has a `size` and returns a control (such as a
+    ControlState) from `space(action)`, like ActionSpace or an agent's own action
+    array. Every action is compiled once up front, and a table can be used in place
+    of the space it was built from.
+
+    Args:
+        space: The action space to compile
+    """
+
+    def __init__(self, space):
+        self.size = space.size
+        self.controls = [CompiledControl(space(action)) for action in range(self.size)]
+
+    def sample(self):
+        return np.random.choice(self.size)
+
+    def __call__(self, action):
+        return self.controls[action]
+
+
 def from_observation_space(act):
     def get_observation(self, *args):
         gamestate = args[0]
@@ -5,7 +5,7 @@ import time
 import melee
 import numpy as np
 from melee import enums
-from melee_env.agents.util import ObservationSpace
+from melee_env.agents.util import ActionTable, ObservationSpace
 from melee_env.dconfig import DolphinConfig
 import psutil
 
@@ -46,6 +46,12 @@ class MeleeEnv:
         save_replays=False,
         port=None,
         save_action=False,
+        array_mirror=False,
+        polling_mode=False,
+        diff_input=False,
+        compile_actions=False,
+        pool=None,
+        replay_dir=None,
     ):
         self.d = DolphinConfig()
         self.d.set_ff(fast_forward)
@@ -72,11 +78,26 @@ class MeleeEnv:
         self.menu_control_agent = 0
         self.ai_press_start = ai_starts_game
         self.save_replays = save_replays
+        # Where Slippi saves this env's replays, see melee.Console(replay_dir=...)
+        self.replay_dir = replay_dir
         self.port = port
         self.save_action = save_action
         self.action_history = {0: [], 1: []}
+        self.array_mirror = array_mirror
+        self.polling_mode = polling_mode
+        self.diff_input = diff_input
+        self.compile_actions = compile_actions
+        # A ConsolePool to borrow a booted Dolphin from, instead of launching one. Its
+        #   consoles and controllers are made with the pool's settings, and start()
+        #   refuses a pool whose array_mirror, polling_mode, diff_input, save_replays
+        #   or replay_dir differ from this env's
+        self.pool = pool
+        self._pooled = None
 
     def start(self):
+        if self.pool is not None:
+            return self._start_pooled()
+
         if sys.platform == "linux":
             dolphin_home_path = str(self.d.slippi_home) + "/"
         elif sys.platform == "win32":
@@ -91,7 +112,10 @@ class MeleeEnv:
             gfx_backend="Null",
             setup_gecko_codes=True,
             disable_audio=True,
-            save_replays=self.save_replays
+            save_replays=self.save_replays,
+            replay_dir=self.replay_dir,
+            array_mirror=self.array_mirror,
+            polling_mode=self.polling_mode,
         )
 
         # print(self.console.dolphin_home_path)  # add to logging later
@@ -114,10 +138,16 @@ class MeleeEnv:
                 self.d.set_controller_type(
                     i + 1, enums.ControllerType.GCN_ADAPTER)
                 curr_player.controller = melee.Controller(
-                    console=self.console, port=i + 1
+                    console=self.console, port=i + 1, diff_input=self.diff_input
                 )
                 self.menu_control_agent = i
                 curr_player.port = i + 1
+                if (
+                    self.compile_actions
+                    and curr_player.agent_type == "AI"
+                    and not isinstance(curr_player.action_space, ActionTable)
+                ):
+                    curr_player.action_space = ActionTable(curr_player.action_space)
             else:  # no player
                 self.d.set_controller_type(
                     i + 1, enums.ControllerType.UNPLUGGED)
@@ -143,6 +173,54 @@ class MeleeEnv:
 
         self.gamestate = self.console.step()
 
+    def _start_pooled(self):
+        """start(), with a Dolphin parked at character select by the pool"""
+        for i, player in enumerate(self.players):
+            if player.agent_type == "HMN":
+                raise ValueError("pooled consoles only have bot controllers")
+            if player.agent_type in ["AI", "CPU"] and i + 1 not in self.pool.ports:
+                raise ValueError(f"port {i + 1} has no controller in the pool")
+        settings = {
+            "array_mirror": self.array_mirror,
+            "polling_mode": self.polling_mode,
+            "save_replays": self.save_replays,
+            "replay_dir": self.replay_dir,
+        }
+        for name, value in settings.items():
+            pooled = self.pool.console_setting(name)
+            if pooled != value:
+                raise ValueError(f"env has {name}={value!r} but the pool has {name}={pooled!r}")
+        if self.diff_input != self.pool.diff_input:
+            raise ValueError(
+                f"env has diff_input={self.diff_input!r} but the pool has diff_input={self.pool.diff_input!r}"
+            )
+
+        self._pooled = self.pool.acquire()
+        self.console = self._pooled.console
+        self.controllers = []
+        for i, player in enumerate(self.players):
+            if player.agent_type in ["AI", "CPU"]:
+                player.controller = self._pooled.controllers[i + 1]
+                player.port = i + 1
+                self.menu_control_agent = i
+                if (
+                    self.compile_actions
+                    and player.agent_type == "AI"
+                    and not isinstance(player.action_space, ActionTable)
+                ):
+                    player.action_space = ActionTable(player.action_space)
+            self.controllers.append(player.controller)
+
+        self.ai_press_start = self.ai_starts_game
+        if self.ai_press_start:
+            self.players[self.menu_control_agent].press_start = True
+        self.gamestate = self._pooled.gamestate
+
+    def is_alive(self):
+        """Whether the Dolphin process started by start() is still running"""
+        process = self.console._process if self.console is not None else None
+        return process is not None and process.poll() is None
+
     def reset(self, stage):
         self.observation_space.reset()
         for player in self.players:
@@ -150,48 +228,68 @@ class MeleeEnv:
 
         while True:
             self.gamestate = self.console.step()
-            if self.gamestate.menu_state is melee.Menu.CHARACTER_SELECT:
-                for i in range(len(self.players)):
-                    if self.players[i].agent_type == "AI":
-                        melee.MenuHelper.choose_character(
-                            character=self.players[i].character,
-                            gamestate=self.gamestate,
-                            controller=self.players[i].controller,
-                            costume=i,
-                            swag=False,
-                            start=self.players[i].press_start,
-                        )
-                    if self.players[i].agent_type == "CPU":
-                        melee.MenuHelper.choose_character(
-                            character=self.players[i].character,
-                            gamestate=self.gamestate,
-                            controller=self.players[i].controller,
-                            costume=i,
-                            swag=False,
-                            cpu_level=self.players[i].lvl,
-                            start=self.players[i].press_start,
-                        )
-
-            elif self.gamestate.menu_state is melee.Menu.STAGE_SELECT:
-                # time.sleep(0.1)
-                melee.MenuHelper.choose_stage(
-                    stage=stage,
-                    gamestate=self.gamestate,
-                    controller=self.players[self.menu_control_agent].controller,
-                )
-
-            elif self.gamestate.menu_state in [
-                melee.Menu.IN_GAME,
-                melee.Menu.SUDDEN_DEATH,
-            ]:
+            if self.gamestate is None:
+                continue
+            if self.navigate_menu(stage):
                 return self.gamestate, False  # game is not done on start
 
-            else:
-                melee.MenuHelper.choose_versus_mode(
-                    self.gamestate, self.players[self.menu_control_agent].controller
-                )
+    def navigate_menu(self, stage):
+        """Press this frame's menu inputs to get from wherever we are into a game
+
+        Returns True once the current gamestate is in game. Driving the menus one
+        frame at a time lets callers interleave several envs.
+        """
+        if self.gamestate.menu_state is melee.Menu.CHARACTER_SELECT:
+            for i in range(len(self.players)):
+                if self.players[i].agent_type == "AI":
+                    melee.MenuHelper.choose_character(
+                        character=self.players[i].character,
+                        gamestate=self.gamestate,
+                        controller=self.players[i].controller,
+                        costume=i,
+                        swag=False,
+                        start=self.players[i].press_start,
+                    )
+                if self.players[i].agent_type == "CPU":
+                    melee.MenuHelper.choose_character(
+                        character=self.players[i].character,
+                        gamestate=self.gamestate,
+                        controller=self.players[i].controller,
+                        costume=i,
+                        swag=False,
+                        cpu_level=self.players[i].lvl,
+                        start=self.players[i].press_start,
+                    )
+
+        elif self.gamestate.menu_state is melee.Menu.STAGE_SELECT:
+            # time.sleep(0.1)
+            melee.MenuHelper.choose_stage(
+                stage=stage,
+                gamestate=self.gamestate,
+                controller=self.players[self.menu_control_agent].controller,
+            )
+
+        elif self.gamestate.menu_state in [
+            melee.Menu.IN_GAME,
+            melee.Menu.SUDDEN_DEATH,
+        ]:
+            return True
+
+        else:
+            melee.MenuHelper.choose_versus_mode(
+                self.gamestate, self.players[self.menu_control_agent].controller
+            )
+        return False
 
     def step(self, *actions):
+        self.send_actions(actions)
+
+        if self.gamestate.menu_state in [melee.Menu.IN_GAME, melee.Menu.SUDDEN_DEATH]:
+            self.gamestate = self.console.step()
+        return self.gamestate
+
+    def send_actions(self, actions):
+        """Queue up each player's action on its controller, without stepping the console"""
         for i, player in enumerate(self.players):
             if player.agent_type == "CPU":
                 continue
@@ -201,17 +299,21 @@ class MeleeEnv:
                 self.action_history[i].append((control.state))
             control(player.controller)
 
-        if self.gamestate.menu_state in [melee.Menu.IN_GAME, melee.Menu.SUDDEN_DEATH]:
-            self.gamestate = self.console.step()
-        return self.gamestate
-
     def close(self):
-        for c in self.controllers:
-            c.disconnect()
+        if self._pooled is not None:
+            # Hand the Dolphin back to the pool, which parks it for the next env
+            self._pooled.gamestate = self.gamestate
+            self.pool.release(self._pooled)
+            self._pooled = None
+            self.console = None
+        else:
+            for c in self.controllers:
+                c.disconnect()
 
         self.observation_space.reset()
         self.gamestate = None
-        self.console.stop()
+        if self.console is not None:
+            self.console.stop()
         
         if self.save_action:
             import pickle
@@ -0,0 +1,359 @@
+import collections
+import inspect
+import selectors
+import sys
+import time
+
+import melee
+from melee import enums
+from melee_env.dconfig import DolphinConfig
+from melee_env.env import find_available_udp_port
+
+_IN_GAME = (melee.Menu.IN_GAME, melee.Menu.SUDDEN_DEATH)
+
+# melee.Console arguments of every instance, unless the pool's kwargs say otherwise
+_CONSOLE_DEFAULTS = {
+    "blocking_input": True,
+    "gfx_backend": "Null",
+    "setup_gecko_codes": True,
+    "disable_audio": True,
+    # Like MeleeEnv's default
+    "save_replays": False,
+    # Every instance's home directory links to one template, see melee.hometemplate
+    "home_template": True,
+}
+
+
+class PooledConsole:
+    """One Dolphin instance of a ConsolePool, with a controller on each of the pool's ports
+
+    Attributes:
+        console (melee.Console): The connected console
+        controllers (dict of int - melee.Controller): Connected controller per port
+        gamestate (melee.GameState): The last gamestate read from the console
+        games (int): How many times the instance has been handed out
+        port (int): The instance's Slippstream port
+    """
+
+    def __init__(self, console, controllers, port):
+        self.console = console
+        self.controllers = controllers
+        self.gamestate = None
+        self.games = 0
+        self.port = port
+        self.launched_at = time.time()
+        self.ready_at = None
+
+    def is_alive(self):
+        """Whether the instance's Dolphin process is still running"""
+        process = self.console._process
+        return process is not None and process.poll() is None
+
+    def next_gamestate(self, timeout):
+        """Flush the controllers and wait for the frame that follows
+
+        Returns None if Dolphin died, or didn't send a frame within timeout seconds.
+        """
+        console = self.console
+        console.flush()
+        deadline = time.time() + timeout
+        with selectors.DefaultSelector() as selector:
+            selector.register(console, selectors.EVENT_READ)
+            while True:
+                gamestate = console.poll()
+                if gamestate is not None:
+                    self.gamestate = gamestate
+                    return gamestate
+                if not self.is_alive() or time.time() > deadline:
+                    return None
+                selector.select(timeout=min(1.0, max(deadline - time.time(), 0)))
+
+
+class ConsolePool:
+    """Keeps booted Dolphin instances parked at character select, to hand out to envs
+
+    Booting Dolphin and the ISO takes seconds for every MeleeEnv.start(), and close()
+    throws it all away. A pool boots its instances once and lends them out instead:
+    acquire() hands out a parked instance, and release() drives it back to character
+    select for the next env, ready in a few frames. Pass the pool to MeleeEnv(pool=...)
+    and start() and close() do this for you. The consoles and controllers are made with
+    the pool's settings, not the env's, so MeleeEnv.start() raises ValueError if the
+    env's array_mirror, polling_mode, diff_input, save_replays or replay_dir differ.
+
+    Every instance is health checked when it's handed out and when it's returned: its
+    Dolphin must still be running and answer a frame within `timeout`. Failed instances,
+    ones returned in the middle of a game and ones that have been handed out
+    `max_games` times are stopped, and a replacement is launched in their place.
+    release() doesn't wait for the replacement to boot: the next acquire() or
+    maintain() connects to it and parks it, by which time it's had a head start.
+
+    Parked instances sit at character select waiting for their inputs. ENet drops a
+    connection that's been silent for around 30 seconds, so when instances can stay
+    parked that long, call maintain() every now and then to keep them alive.
+
+    Every instance shares a controller setup, since it's baked in when Dolphin boots:
+    a standard (pipe) controller on each of `ports`, and nothing on the others.
+
+    Args:
+        iso_path (str): Path to the Melee ISO
+        size (int): How many instances to keep booted
+        ports (list of int): Controller ports to plug a bot controller into
+        max_games (int): Replace an instance after it's been handed out this many
+            times. None to keep it as long as it's healthy.
+        timeout (float): Seconds to wait for a frame before an instance is
+            considered dead
+        park_timeout (float): Seconds to give an instance to reach character select,
+            from booting or from the end of a game
+        fast_forward (bool): Enable the fast forward gecko code, see DolphinConfig.set_ff.
+            Only for melee-env's own install
+        diff_input (bool): Only send the controller inputs that changed
+        path (str): Directory to run Dolphin from, like one made by
+            melee.mockdolphin.install(). None for melee-env's own Slippi install,
+            which is set up on first use
+        **kwargs: Passed through to melee.Console, like blocking_input or array_mirror
+    """
+
+    def __init__(
+        self,
+        iso_path,
+        size=1,
+        ports=(1, 2),
+        max_games=None,
+        timeout=30.0,
+        park_timeout=120.0,
+        fast_forward=False,
+        diff_input=False,
+        path=None,
+        **kwargs
+    ):
+        self.d = None
+        if path is None:
+            self.d = DolphinConfig()
+            self.d.set_ff(fast_forward)
+            path = str(self.d.slippi_bin_path)
+        self.iso_path = iso_path
+        self.size = size
+        self.path = path
+        self.ports = tuple(ports)
+        self.max_games = max_games
+        self.timeout = timeout
+        self.park_timeout = park_timeout
+        self.diff_input = diff_input
+        self.kwargs = kwargs
+        self._idle = collections.deque()
+        self._booting = collections.deque()
+        self._lent = set()
+        self._last_port = None
+        self.stats = {
+            "launched": 0,
+            "acquired": 0,
+            "cold_starts": 0,
+            "recycled": 0,
+            "failed_checks": 0,
+            "boot_seconds": 0.0,
+        }
+        """(dict): Counters of what the pool has done: instances launched, handed
+        out, handed out without a warm one waiting (cold_starts), replaced after
+        max_games (recycled) or after failing a health check, and total seconds spent
+        booting and parking"""
+
+    def start(self):
+        """Boot the pool's instances. They're all launched before waiting on any"""
+        self._top_up()
+        self._settle()
+
+    def acquire(self):
+        """Take a healthy instance parked at character select, booting one if needed
+
+        Returns:
+            PooledConsole, to give back with release()
+        """
+        instance = None
+        while self._idle:
+            candidate = self._idle.popleft()
+            if self._check(candidate):
+                instance = candidate
+                break
+            self.stats["failed_checks"] += 1
+            self._stop(candidate)
+        if instance is None:
+            self.stats["cold_starts"] += 1
+            # A replacement launched by release() has had a head start on its boot
+            if self._booting:
+                candidate = self._booting.popleft()
+                if self._warm(candidate):
+                    instance = candidate
+                else:
+                    self.stats["failed_checks"] += 1
+                    self._stop(candidate)
+        if instance is None:
+            instance = self._boot()
+        instance.games += 1
+        self._lent.add(instance)
+        self.stats["acquired"] += 1
+        return instance
+
+    def release(self, instance):
+        """Take an instance back, parking it at character select for the next user
+
+        The instance is replaced instead when it's dead, still in a game, has been
+        handed out max_games times, or doesn't make it back to character select. Its
+        replacement is only launched here, and left to boot in the background.
+        """
+        self._lent.discard(instance)
+        for controller in instance.controllers.values():
+            controller.release_all()
+        if self.max_games is not None and instance.games >= self.max_games:
+            self.stats["recycled"] += 1
+        elif self._park(instance):
+            self._idle.append(instance)
+            return
+        else:
+            self.stats["failed_checks"] += 1
+        self._stop(instance)
+        self._top_up()
+
+    def maintain(self):
+        """Health check every parked instance, replacing the ones that fail, and park
+        the replacements launched since the last call
+
+        Also keeps their ENet connections from timing out.
+        """
+        for _ in range(len(self._idle)):
+            instance = self._idle.popleft()
+            if self._check(instance):
+                self._idle.append(instance)
+            else:
+                self.stats["failed_checks"] += 1
+                self._stop(instance)
+        self._top_up()
+        self._settle()
+
+    def close(self):
+        """Stop every instance, including the ones still handed out"""
+        for instance in list(self._idle) + list(self._booting) + list(self._lent):
+            self._stop(instance)
+        self._idle.clear()
+        self._booting.clear()
+        self._lent.clear()
+
+    def console_setting(self, name):
+        """The value of a melee.Console argument the pool's instances are made with"""
+        if name in self.kwargs:
+            return self.kwargs[name]
+        if name in _CONSOLE_DEFAULTS:
+            return _CONSOLE_DEFAULTS[name]
+        return inspect.signature(melee.Console).parameters[name].default
+
+    def __len__(self):
+        return len(self._idle)
+
+    def _top_up(self):
+        """Launch instances until the pool has its size, without waiting on them"""
+        while len(self._idle) + len(self._booting) + len(self._lent) < self.size:
+            self._booting.append(self._launch())
+
+    def _settle(self):
+        """Connect to every launched instance and park it, booting a new one in place
+        of each that fails"""
+        while self._booting:
+            instance = self._booting.popleft()
+            if not self._warm(instance):
+                self.stats["failed_checks"] += 1
+                self._stop(instance)
+                instance = self._boot()
+            self._idle.append(instance)
+
+    def _launch(self):
+        """Start a Dolphin process with the pool's controller setup, without waiting"""
+        dolphin_home_path = None
+        if self.d is not None:
+            for port in range(1, 5):
+                controller_type = (
+                    enums.ControllerType.STANDARD
+                    if port in self.ports
+                    else enums.ControllerType.UNPLUGGED
+                )
+                self.d.set_controller_type(port, controller_type)
+            if sys.platform == "linux":
+                dolphin_home_path = str(self.d.slippi_home) + "/"
+
+        # find_available_udp_port doesn't reserve anything, so search past the last
+        #   port handed out to keep the instances from colliding
+        port = find_available_udp_port(
+            1024 if self._last_port is None else self._last_port + 1
+        )
+        self._last_port = port
+        kwargs = dict(_CONSOLE_DEFAULTS)
+        kwargs.update(self.kwargs)
+        console = melee.Console(
+            path=self.path,
+            dolphin_home_path=dolphin_home_path,
+            tmp_home_directory=True,
+            slippi_port=port,
+            **kwargs
+        )
+        controllers = {
+            port: melee.Controller(console=console, port=port, diff_input=self.diff_input)
+            for port in self.ports
+        }
+        console.run(iso_path=self.iso_path)
+        self.stats["launched"] += 1
+        return PooledConsole(console, controllers, port)
+
+    def _warm(self, instance):
+        """Connect to a launched instance and bring it to character select"""
+        started = time.time()
+        if not instance.console.connect():
+            return False
+        for controller in instance.controllers.values():
+            controller.connect()
+        parked = self._park(instance)
+        instance.ready_at = time.time()
+        self.stats["boot_seconds"] += instance.ready_at - started
+        return parked
+
+    def _boot(self):
+        """Launch and warm an instance, retrying until one makes it"""
+        while True:
+            instance = self._launch()
+            if self._warm(instance):
+                return instance
+            self.stats["failed_checks"] += 1
+            self._stop(instance)
+
+    def _park(self, instance):
+        """Drive the menus to character select. Returns False if it doesn't get there"""
+        gamestate = instance.gamestate
+        controller = instance.controllers[self.ports[0]]
+        deadline = time.time() + self.park_timeout
+        while time.time() < deadline:
+            if gamestate is not None:
+                if gamestate.menu_state is melee.Menu.CHARACTER_SELECT:
+                    controller.release_all()
+                    return True
+                if gamestate.menu_state in _IN_GAME:
+                    # A finished game plays out its ending by itself, but there's no
+                    #   leaving one that's still going, so that instance is replaced
+                    if all(player.stock for player in gamestate.players.values()):
+                        return False
+                elif gamestate.menu_state is melee.Menu.POSTGAME_SCORES:
+                    melee.MenuHelper.skip_postgame(controller, gamestate)
+                else:
+                    melee.MenuHelper.choose_versus_mode(gamestate, controller)
+            gamestate = instance.next_gamestate(self.timeout)
+            if gamestate is None:
+                return False
+        return False
+
+    def _check(self, instance):
+        """Whether an instance is alive and still sending frames"""
+        return instance.is_alive() and instance.next_gamestate(self.timeout) is not None
+
+    def _stop(self, instance):
+        for controller in instance.controllers.values():
+            controller.disconnect()
+        try:
+            instance.console.stop()
+        except Exception:
+            pass
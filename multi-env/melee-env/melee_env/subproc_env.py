@@ -0,0 +1,341 @@
+import multiprocessing
+import selectors
+import traceback
+from multiprocessing import shared_memory
+
+import melee
+import numpy as np
+from melee.columnar import FIELDS
+from melee_env.env import MeleeEnv, find_available_udp_port
+
+_IN_GAME = (melee.Menu.IN_GAME, melee.Menu.SUDDEN_DEATH)
+
+
+class _Buffers:
+    """Numpy views onto the shared memory block that all the workers write into
+
+    Laid out as observations (slots, num_envs, size) float32, then rewards
+    (slots, num_envs, 2) float32, then dones (slots, num_envs) bool.
+    """
+
+    def __init__(self, shm, slots, num_envs, size):
+        self.observations = np.ndarray(
+            (slots, num_envs, size), dtype=np.float32, buffer=shm.buf
+        )
+        offset = self.observations.nbytes
+        self.rewards = np.ndarray(
+            (slots, num_envs, 2), dtype=np.float32, buffer=shm.buf, offset=offset
+        )
+        offset += self.rewards.nbytes
+        self.dones = np.ndarray(
+            (slots, num_envs), dtype=bool, buffer=shm.buf, offset=offset
+        )
+
+    @staticmethod
+    def nbytes(slots, num_envs, size):
+        return slots * num_envs * (size * 4 + 2 * 4 + 1)
+
+
+class _Worker:
+    """Owns one MeleeEnv inside a worker process, and restarts it if Dolphin dies"""
+
+    def __init__(self, index, spec, buffers):
+        self.index = index
+        self.spec = spec
+        self.buffers = buffers
+        self.env = None
+        self.restarts = 0
+
+    def start(self):
+        spec = self.spec
+        self.env = MeleeEnv(
+            spec["iso_path"],
+            spec["player_factory"](),
+            port=spec["port"],
+            array_mirror=True,
+            **spec["kwargs"]
+        )
+        self.env.start()
+
+    def restart(self):
+        try:
+            self.env.close()
+        except Exception:
+            pass
+        self.restarts += 1
+        self.start()
+
+    def next_gamestate(self):
+        """Wait for the next frame, without hanging forever on a dead Dolphin
+
+        Returns None if Dolphin went away.
+        """
+        console = self.env.console
+        with selectors.DefaultSelector() as selector:
+            selector.register(console, selectors.EVENT_READ)
+            while True:
+                gamestate = console.poll()
+                if gamestate is not None:
+                    self.env.gamestate = gamestate
+                    return gamestate
+                if not self.env.is_alive():
+                    return None
+                selector.select(timeout=1.0)
+
+    def reset(self):
+        """Drive the menus into a new game. Returns False if Dolphin died on the way"""
+        env = self.env
+        env.observation_space.reset()
+        for player in env.players:
+            player.defeated = False
+        gamestate = env.gamestate
+        # Coming off a finished game, wait for the post game screens first
+        while gamestate is not None and gamestate.menu_state in _IN_GAME:
+            env.console.flush()
+            gamestate = self.next_gamestate()
+        while gamestate is not None:
+            if env.navigate_menu(self.spec["stage"]):
+                env.observation_space(gamestate)
+                return True
+            env.console.flush()
+            gamestate = self.next_gamestate()
+        return False
+
+    def reset_until_alive(self):
+        while not self.reset():
+            self.restart()
+
+    def write(self, slot, reward=(0, 0), done=False):
+        buffers, i = self.buffers, self.index
+        buffers.observations[slot, i] = self.env.observation_space.get_observation_vector(
+            self.env.gamestate, self.spec["ports"], self.spec["fields"]
+        )
+        buffers.rewards[slot, i] = reward
+        buffers.dones[slot, i] = done
+
+    def step(self, slot, actions):
+        """Step one frame, auto-resetting at the end of an episode. Returns the info dict"""
+        env = self.env
+        env.send_actions(actions)
+        env.console.flush()
+        gamestate = self.next_gamestate()
+        if gamestate is None:
+            self.restart()
+            self.reset_until_alive()
+            self.write(slot, done=True)
+            return {"restarted": True, "restarts": self.restarts}
+        if gamestate.menu_state not in _IN_GAME:
+            self.reset_until_alive()
+            self.write(slot, done=True)
+            return {}
+        _, reward, done, _ = env.observation_space(gamestate)
+        if not done:
+            self.write(slot, reward)
+            return {}
+        self.write(slot, reward, done)
+        info = {"terminal_observation": self.buffers.observations[slot, self.index].copy()}
+        self.reset_until_alive()
+        self.write(slot, reward, done)
+        return info
+
+
+def _worker_main(index, pipe, parent_pipe, spec, shm_name, slots, num_envs, size):
+    parent_pipe.close()
+    shm = shared_memory.SharedMemory(name=shm_name)
+    worker = _Worker(index, spec, _Buffers(shm, slots, num_envs, size))
+    try:
+        worker.start()
+        while True:
+            command, slot, data = pipe.recv()
+            if command == "step":
+                pipe.send(worker.step(slot, data))
+            elif command == "reset":
+                worker.reset_until_alive()
+                worker.write(slot)
+                pipe.send({})
+            elif command == "close":
+                break
+    except KeyboardInterrupt:
+        pass
+    except Exception:
+        pipe.send({"error": traceback.format_exc()})
+    finally:
+        if worker.env is not None:
+            worker.env.close()
+        del worker
+        shm.close()
+        pipe.close()
+
+
+class MeleeSubprocEnv:
+    """Runs each MeleeEnv in its own process, so decoding runs on several cores
+
+    Workers write every frame's observation, reward and done into a ring of slots in a
+    single shared memory block, and only a small command or info dict crosses the
+    pipe. The arrays returned by reset() and step() are views into that block: they
+    stay valid until the ring wraps around, `slots` steps later, so copy anything you
+    want to keep for longer.
+
+    Episodes are reset automatically, like MeleeVecEnv. If a worker's Dolphin process
+    dies, the worker starts a fresh one, reports the episode as done and sets
+    infos[i]["restarted"].
+
+    Args:
+        iso_path (str): Path to the Melee ISO
+        player_factory (callable): Called in each worker to create its list of
+            players. Must be picklable when using the spawn start method.
+        num_envs (int): How many worker processes to run
+        stage (enums.Stage): Stage to play every episode on
+        ports (list of int): Controller ports to put in the observation, in order
+        fields (list of str): Columns to put in the observation, see melee.columnar.FIELDS.
+            Defaults to all of them.
+        slots (int): How many steps the ring buffer holds
+        start_method (str): multiprocessing start method. Defaults to the platform's
+        **kwargs: Passed through to each MeleeEnv
+    """
+
+    def __init__(
+        self,
+        iso_path,
+        player_factory,
+        num_envs,
+        stage,
+        ports=(1, 2),
+        fields=None,
+        slots=2,
+        start_method=None,
+        **kwargs
+    ):
+        kwargs.pop("array_mirror", None)
+        kwargs.pop("port", None)
+        self.num_envs = num_envs
+        self.slots = slots
+        self.observation_size = len(ports) * len(FIELDS if fields is None else fields)
+        self._slot = 0
+        # Indices of the workers that still owe us a reply
+        self._waiting = set()
+        self._closed = False
+
+        size = _Buffers.nbytes(slots, num_envs, self.observation_size)
+        self._shm = shared_memory.SharedMemory(create=True, size=size)
+        self._buffers = _Buffers(self._shm, slots, num_envs, self.observation_size)
+
+        context = multiprocessing.get_context(start_method)
+        self._pipes = []
+        self._processes = []
+        port = None
+        for i in range(num_envs):
+            port = find_available_udp_port(1024 if port is None else port + 1)
+            spec = {
+                "iso_path": iso_path,
+                "player_factory": player_factory,
+                "stage": stage,
+                "port": port,
+                "ports": ports,
+                "fields": fields,
+                "kwargs": kwargs,
+            }
+            parent_pipe, child_pipe = context.Pipe()
+            process = context.Process(
+                target=_worker_main,
+                args=(
+                    i,
+                    child_pipe,
+                    parent_pipe,
+                    spec,
+                    self._shm.name,
+                    slots,
+                    num_envs,
+                    self.observation_size,
+                ),
+                daemon=True,
+            )
+            process.start()
+            child_pipe.close()
+            self._pipes.append(parent_pipe)
+            self._processes.append(process)
+
+    def _send(self, command, slot, data):
+        for i, (pipe, item) in enumerate(zip(self._pipes, data)):
+            pipe.send((command, slot, item))
+            self._waiting.add(i)
+
+    def _receive(self):
+        infos = []
+        for i, pipe in enumerate(self._pipes):
+            try:
+                info = pipe.recv()
+            except EOFError:
+                info = {"error": "worker exited without replying\n"}
+            self._waiting.discard(i)
+            infos.append(info)
+        for i, info in enumerate(infos):
+            if "error" in info:
+                raise RuntimeError("worker %d failed:\n%s" % (i, info["error"]))
+        return infos
+
+    def reset(self):
+        """Bring every environment into a new game
+
+        Returns:
+            np.ndarray view of shape (num_envs, observation_size)
+        """
+        slot = self._slot
+        self._send("reset", slot, [None] * self.num_envs)
+        self._receive()
+        self._slot = (slot + 1) % self.slots
+        return self._buffers.observations[slot]
+
+    def step_async(self, actions):
+        """Send every environment its action tuple, without waiting for the frame"""
+        self._send("step", self._slot, actions)
+
+    def step_wait(self):
+        """Wait for the frame started by step_async()
+
+        Returns:
+            (observations, rewards, dones, infos), the first three being views into
+            the ring buffer
+        """
+        infos = self._receive()
+        slot = self._slot
+        self._slot = (slot + 1) % self.slots
+        buffers = self._buffers
+        return buffers.observations[slot], buffers.rewards[slot], buffers.dones[slot], infos
+
+    def step(self, actions):
+        """Step every environment by one frame. See step_wait() for the return value"""
+        self.step_async(actions)
+        return self.step_wait()
+
+    def close(self):
+        """Shut down the workers and their Dolphins, and free the shared memory"""
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            # Only the workers still owed a reply have one coming. A failed worker
+            #   has exited, so its pipe is at EOF
+            for i in sorted(self._waiting):
+                try:
+                    if self._pipes[i].poll(10):
+                        self._pipes[i].recv()
+                except (EOFError, OSError):
+                    pass
+            self._waiting.clear()
+            for pipe in self._pipes:
+                try:
+                    pipe.send(("close", 0, None))
+                except (EOFError, OSError):
+                    pass
+        finally:
+            for process in self._processes:
+                process.join(timeout=10)
+                if process.is_alive():
+                    process.terminate()
+                    process.join()
+            for pipe in self._pipes:
+                pipe.close()
+            del self._buffers
+            self._shm.close()
+            self._shm.unlink()
@@ -0,0 +1,206 @@
+import selectors
+import time
+
+import melee
+import numpy as np
+from melee_env.env import MeleeEnv, find_available_udp_port
+
+_IN_GAME = (melee.Menu.IN_GAME, melee.Menu.SUDDEN_DEATH)
+
+# Per-environment phases while stepping
+_STEPPING = 0  # waiting on the frame that follows our actions
+_FINISHING = 1  # episode is over, waiting for the game to leave the in-game screen
+_MENUS = 2  # driving the menus back into a new game
+_READY = 3  # has an observation for this step
+
+
+class MeleeVecEnv:
+    """Runs several MeleeEnv instances in lockstep from a single thread
+
+    Each environment gets its own Dolphin, temporary home directory and Slippstream
+    port. step() takes one action tuple per environment and returns stacked
+    observations, rewards and dones. Waits on the consoles are multiplexed, so a
+    slow instance only holds up the batch, not the reading of the other instances.
+    Environments whose episode ended are reset automatically, menus included, and
+    the last observation of the finished episode is put in
+    infos[i]["terminal_observation"].
+
+    Observations are the flat array vectors of ObservationSpace.get_observation_vector,
+    so the consoles always run with array_mirror=True.
+
+    Args:
+        iso_path (str): Path to the Melee ISO
+        player_factory (callable): Called once per environment, returns that
+            environment's list of players. Players can't be shared between
+            environments since they hold on to their controller.
+        num_envs (int): How many environments to run
+        stage (enums.Stage): Stage to play every episode on
+        ports (list of int): Controller ports to put in the observation, in order
+        fields (list of str): Columns to put in the observation, see melee.columnar.FIELDS.
+            Defaults to all of them.
+        timeout (float): Seconds to wait on a silent console before giving up
+        **kwargs: Passed through to each MeleeEnv
+    """
+
+    def __init__(
+        self,
+        iso_path,
+        player_factory,
+        num_envs,
+        stage,
+        ports=(1, 2),
+        fields=None,
+        timeout=30.0,
+        **kwargs
+    ):
+        kwargs.pop("array_mirror", None)
+        kwargs.pop("port", None)
+        self.num_envs = num_envs
+        self.stage = stage
+        self.ports = ports
+        self.fields = fields
+        self.timeout = timeout
+        self.envs = []
+        port = None
+        for _ in range(num_envs):
+            # find_available_udp_port doesn't reserve anything, so search past the
+            # last port handed out to keep the instances from colliding
+            port = find_available_udp_port(1024 if port is None else port + 1)
+            self.envs.append(
+                MeleeEnv(iso_path, player_factory(), port=port, array_mirror=True, **kwargs)
+            )
+        self._selector = selectors.DefaultSelector()
+        self._phase = [_MENUS] * num_envs
+        self._observations = [None] * num_envs
+
+    def start(self):
+        """Start every Dolphin instance and connect to them"""
+        for i, env in enumerate(self.envs):
+            env.start()
+            self._selector.register(env.console, selectors.EVENT_READ, i)
+
+    def reset(self):
+        """Bring every environment into a new game
+
+        Returns:
+            np.ndarray of shape (num_envs, observation size)
+        """
+        for i in range(self.num_envs):
+            self._begin_reset(i)
+            self._phase[i] = _MENUS
+        self._run()
+        return np.stack(self._observations)
+
+    def step(self, actions):
+        """Step every environment by one frame
+
+        Args:
+            actions (sequence): One tuple of per-player actions for each environment
+
+        Returns:
+            (observations, rewards, dones, infos) where observations has shape
+            (num_envs, observation size), rewards (num_envs, 2) and dones (num_envs,)
+        """
+        for i, env in enumerate(self.envs):
+            env.send_actions(actions[i])
+            env.console.flush()
+            self._phase[i] = _STEPPING
+        self.rewards = np.zeros((self.num_envs, 2), dtype=np.float32)
+        self.dones = np.zeros(self.num_envs, dtype=bool)
+        self.infos = [{} for _ in range(self.num_envs)]
+        self._run()
+        return np.stack(self._observations), self.rewards, self.dones, self.infos
+
+    def close(self):
+        """Stop every Dolphin instance"""
+        for env in self.envs:
+            if env.console is not None:
+                self._selector.unregister(env.console)
+                env.close()
+        self._selector.close()
+
+    def _observe(self, env):
+        return env.observation_space.get_observation_vector(
+            env.gamestate, self.ports, self.fields
+        )
+
+    def _begin_reset(self, i):
+        env = self.envs[i]
+        env.observation_space.reset()
+        for player in env.players:
+            player.defeated = False
+
+    def _run(self):
+        """Read frames off the consoles until every environment is _READY"""
+        # Anything ENet or the socket already buffered is picked up before sleeping
+        pending = set(range(self.num_envs))
+        for i in list(pending):
+            if self._advance(i):
+                pending.discard(i)
+        deadline = time.time() + self.timeout
+        while pending:
+            ready = self._selector.select(timeout=0.01)
+            if ready:
+                candidates = [key.data for key, _ in ready]
+                deadline = time.time() + self.timeout
+            else:
+                # ENet queues datagrams internally and needs servicing for its own
+                # acks, so poke the stragglers every now and then
+                candidates = list(pending)
+                if time.time() > deadline:
+                    raise TimeoutError(
+                        "no data from consoles %s in %.1fs" % (sorted(pending), self.timeout)
+                    )
+            for i in candidates:
+                if i in pending and self._advance(i):
+                    pending.discard(i)
+
+    def _advance(self, i):
+        """Consume every complete frame available on console i. Returns True when ready"""
+        env = self.envs[i]
+        while True:
+            gamestate = env.console.poll()
+            if gamestate is None:
+                return False
+            env.gamestate = gamestate
+            phase = self._phase[i]
+
+            if phase == _STEPPING:
+                if gamestate.menu_state not in _IN_GAME:
+                    # The game ended underneath us, without our side seeing the last stock
+                    self.dones[i] = True
+                    self.infos[i]["terminal_observation"] = self._observations[i]
+                    self._begin_reset(i)
+                    self._phase[i] = _MENUS
+                else:
+                    _, reward, done, _ = env.observation_space(gamestate)
+                    self._observations[i] = self._observe(env)
+                    self.rewards[i] = reward
+                    if not done:
+                        self._phase[i] = _READY
+                        return True
+                    self.dones[i] = True
+                    self.infos[i]["terminal_observation"] = self._observations[i]
+                    self._begin_reset(i)
+                    self._phase[i] = _FINISHING
+                env.console.flush()
+
+            elif phase == _FINISHING:
+                if gamestate.menu_state not in _IN_GAME:
+                    self._phase[i] = _MENUS
+                    self._navigate(i)
+                env.console.flush()
+
+            elif phase == _MENUS:
+                if self._navigate(i):
+                    self._phase[i] = _READY
+                    return True
+                env.console.flush()
+
+    def _navigate(self, i):
+        env = self.envs[i]
+        if not env.navigate_menu(self.stage):
+            return False
+        env.observation_space(env.gamestate)
+        self._observations[i] = self._observe(env)
+        return True
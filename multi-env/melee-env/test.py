@@ -0,0 +1,465 @@
+#!/usr/bin/python3
+import io
+import os
+import selectors
+import socket
+import tempfile
+import unittest
+from multiprocessing import shared_memory
+from unittest import mock
+
+import numpy as np
+
+import melee
+from melee import mockdolphin
+from melee_env.agents.util import ActionSpace, ActionTable
+from melee_env.env import MeleeEnv
+from melee_env.pool import ConsolePool
+from melee_env.subproc_env import MeleeSubprocEnv, _Worker
+from melee_env.vec_env import MeleeVecEnv
+
+REPLAY = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    "..", "libmelee", "test_artifacts", "test_game_1.slp"
+)
+
+
+class Pool(unittest.TestCase):
+    """
+    ConsolePool against melee.mockdolphin, so no Dolphin or ISO is needed
+    """
+
+    def test_pool_lifecycle(self):
+        """Instances are parked, handed out, recycled and replaced when they die"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = mockdolphin.install(directory, REPLAY)
+            # The mock streams a game and has no menus, so an instance counts as
+            #   parked as soon as it answers a frame
+            park = lambda pool, instance: instance.next_gamestate(pool.timeout) is not None
+            with mock.patch.object(ConsolePool, "_park", park):
+                pool = ConsolePool(None, size=2, max_games=2, timeout=10.0, path=path)
+                try:
+                    pool.start()
+                    self.assertEqual(len(pool), 2)
+                    first, second = pool.acquire(), pool.acquire()
+                    self.assertEqual(len(pool), 0)
+                    self.assertIsNotNone(first.next_gamestate(pool.timeout))
+                    pool.release(first)
+                    pool.release(second)
+                    self.assertEqual(len(pool), 2)
+                    self.assertEqual(pool.stats["launched"], 2)
+
+                    # Its second game is first's last, and release() doesn't wait for
+                    #   the replacement to boot
+                    self.assertIs(pool.acquire(), first)
+                    pool.release(first)
+                    self.assertFalse(first.is_alive())
+                    self.assertEqual(pool.stats["recycled"], 1)
+                    self.assertEqual(pool.stats["launched"], 3)
+                    self.assertEqual(len(pool), 1)
+
+                    # A dead instance is passed over for the replacement
+                    second.console._process.kill()
+                    second.console._process.wait()
+                    third = pool.acquire()
+                    self.assertNotIn(third, (first, second))
+                    self.assertTrue(third.is_alive())
+                    self.assertEqual(pool.stats["failed_checks"], 1)
+                    self.assertEqual(pool.stats["launched"], 3)
+                    pool.release(third)
+                    pool.maintain()
+                    self.assertEqual(len(pool), 2)
+                    self.assertEqual(pool.stats["launched"], 4)
+                finally:
+                    pool.close()
+            self.assertFalse(third.is_alive())
+
+    def test_park(self):
+        """Parking drives the menus to character select, and gives up on a game in
+        progress"""
+
+        class Instance:
+            def __init__(self, menus, stocks=0):
+                self.controllers = {1: mock.Mock()}
+                self.gamestates = []
+                for menu in menus:
+                    gamestate = melee.GameState()
+                    gamestate.menu_state = menu
+                    for port in (1, 2):
+                        gamestate.players[port] = melee.PlayerState()
+                        gamestate.players[port].stock = stocks
+                    self.gamestates.append(gamestate)
+                self.gamestate = None
+
+            def next_gamestate(self, timeout):
+                self.gamestate = self.gamestates.pop(0) if self.gamestates else None
+                return self.gamestate
+
+        with mock.patch.object(melee.MenuHelper, "skip_postgame") as skip_postgame:
+            pool = ConsolePool(None, ports=(1,), path="unused")
+            finished = Instance(
+                [melee.Menu.IN_GAME, melee.Menu.POSTGAME_SCORES, melee.Menu.CHARACTER_SELECT]
+            )
+            self.assertTrue(pool._park(finished))
+            self.assertEqual(skip_postgame.call_count, 1)
+            self.assertFalse(pool._park(Instance([melee.Menu.IN_GAME], stocks=4)))
+            self.assertFalse(pool._park(Instance([melee.Menu.POSTGAME_SCORES])))
+
+    def test_env_settings(self):
+        """An env only borrows from a pool made with the same console settings"""
+        pool = ConsolePool(None, path="unused", array_mirror=True)
+        self.assertTrue(pool.console_setting("array_mirror"))
+        self.assertFalse(pool.console_setting("save_replays"))
+        self.assertIsNone(pool.console_setting("replay_dir"))
+        with mock.patch("melee_env.env.DolphinConfig"), mock.patch.object(
+            pool, "acquire", side_effect=RuntimeError("acquired")
+        ) as acquire:
+            for settings in (
+                {},
+                {"array_mirror": True, "diff_input": True},
+                {"array_mirror": True, "replay_dir": "/tmp/replays"},
+            ):
+                env = MeleeEnv(None, [_Player(), _Player()], pool=pool, **settings)
+                with self.assertRaises(ValueError):
+                    env.start()
+            acquire.assert_not_called()
+            env = MeleeEnv(None, [_Player(), _Player()], pool=pool, array_mirror=True)
+            with self.assertRaisesRegex(RuntimeError, "acquired"):
+                env.start()
+
+
+def _controller_state(controller):
+    state = controller.current
+    return (
+        dict(state.button), state.main_stick, state.c_stick, state.l_shoulder, state.r_shoulder
+    )
+
+
+class Actions(unittest.TestCase):
+    """
+    Discrete action spaces and the ActionTable compiled from them
+    """
+
+    def setUp(self):
+        self.home = tempfile.TemporaryDirectory()
+        os.makedirs(self.home.name + "/Config")
+        with open(self.home.name + "/Config/Dolphin.ini", "w") as dolphinfile:
+            dolphinfile.write("[Core]\n")
+        self.console = melee.Console(
+            system="dolphin", dolphin_home_path=self.home.name + "/", tmp_home_directory=False
+        )
+
+    def tearDown(self):
+        self.home.cleanup()
+
+    def _controller(self, diff_input):
+        controller = melee.Controller(console=self.console, port=1, diff_input=diff_input)
+        controller.pipe = io.StringIO()
+        return controller
+
+    def test_control_states(self):
+        """ActionSpace's (x, y, button) rows map to ControlState's 13 columns"""
+        space = ActionSpace()
+        states = space.control_states
+        self.assertEqual(states.shape, (45, 13))
+        np.testing.assert_array_equal(states[:, 7:9], space.action_space[:, :2])
+        buttons = space.action_space[:, 2]
+        for button, column in [(1, 0), (2, 1), (3, 4), (4, 6)]:
+            np.testing.assert_array_equal(states[:, column], buttons == button)
+        # X, Y, digital L, the C stick and the analog shoulders are never used
+        self.assertFalse(states[:, [2, 3, 5, 9, 10, 11, 12]].any())
+        # Down/right with B
+        np.testing.assert_array_equal(
+            states[22], [0, 1, 0, 0, 0, 0, 0, np.sqrt(2) / 2, -np.sqrt(2) / 2, 0, 0, 0, 0]
+        )
+
+    def test_action_table(self):
+        """A compiled action leaves the controller as its ControlState does, and diffed
+        controllers send the same bytes down the pipe"""
+        space = ActionSpace()
+        table = ActionTable(space)
+        self.assertEqual(table.size, space.size)
+        actions = list(range(space.size)) + list(np.random.RandomState(0).randint(space.size, size=200))
+        for diff_input in (False, True):
+            plain, compiled = self._controller(diff_input), self._controller(diff_input)
+            for action in actions:
+                space(action)(plain)
+                table(action)(compiled)
+                self.assertEqual(_controller_state(compiled), _controller_state(plain))
+                plain.flush()
+                compiled.flush()
+            if diff_input:
+                self.assertEqual(compiled.pipe.getvalue(), plain.pipe.getvalue())
+            else:
+                # Every compiled action is written whole
+                self.assertEqual(
+                    compiled.pipe.getvalue(),
+                    "".join(table(action).commands + "FLUSH\n" for action in actions),
+                )
+            plain.pipe = compiled.pipe = None
+
+    def test_set_state(self):
+        """set_state copies the state it's given and writes its commands"""
+        state = melee.ControllerState()
+        state.button[melee.Button.BUTTON_A] = True
+        state.main_stick = (1.0, 0.5)
+        controller = self._controller(diff_input=False)
+        controller.set_state(state)
+        state.button[melee.Button.BUTTON_A] = False
+        self.assertTrue(controller.current.button[melee.Button.BUTTON_A])
+        controller.flush()
+        written = controller.pipe.getvalue()
+        self.assertIn("PRESS A\n", written)
+        self.assertIn("SET MAIN 1.0 0.5\n", written)
+        self.assertTrue(written.endswith("SET R 0\nFLUSH\n"))
+        controller.pipe = None
+
+
+class _Columns:
+    """Stands in for a gamestate's columns, observing just its frame number for each port"""
+
+    def __init__(self, frame):
+        self.frame = frame
+
+    def observation(self, ports, fields):
+        return np.full((len(ports), 1), self.frame, dtype=np.float32)
+
+
+def _gamestate(frame, menu=melee.Menu.IN_GAME, stocks=(4, 4), percents=(0, 0)):
+    gamestate = melee.GameState()
+    gamestate.frame = frame
+    gamestate.menu_state = menu
+    gamestate.columns = _Columns(frame)
+    for port in (1, 2):
+        gamestate.players[port] = melee.PlayerState()
+        gamestate.players[port].stock = stocks[port - 1]
+        gamestate.players[port].percent = percents[port - 1]
+    return gamestate
+
+
+class _FakeConsole:
+    """A console that sends its scripted frames one per flush, like Dolphin with
+    blocking input. The first one is already waiting, as after MeleeEnv.start()"""
+
+    def __init__(self, gamestates):
+        self._reader, self._writer = socket.socketpair()
+        self._script = list(gamestates)
+        self._sent = []
+        self.flushes = 0
+        self.alive = True
+        self._send()
+
+    def _send(self):
+        if self._script:
+            self._sent.append(self._script.pop(0))
+            self._writer.send(b"f")
+        else:
+            # Out of frames, as if Dolphin crashed
+            self.alive = False
+
+    def fileno(self):
+        return self._reader.fileno()
+
+    def flush(self):
+        self.flushes += 1
+        self._send()
+
+    def poll(self):
+        if not self._sent:
+            return None
+        self._reader.recv(1)
+        return self._sent.pop(0)
+
+    def stop(self):
+        self._reader.close()
+        self._writer.close()
+
+
+class _Player:
+    """An AI player whose actions are recorded on its controller"""
+
+    agent_type = "AI"
+
+    def __init__(self):
+        self.controller = mock.Mock()
+        self.defeated = False
+        self.press_start = False
+
+    def action_space(self, action):
+        return lambda controller: controller.apply(action)
+
+
+class VecEnv(unittest.TestCase):
+    """
+    MeleeVecEnv's lockstep loop and auto-reset, against fake consoles
+    """
+
+    def test_step_and_auto_reset(self):
+        """Every env is stepped a frame at a time, and one whose game ends is reset
+        into the next, whether it saw the last stock go or the game just left"""
+        scripts = [
+            [
+                _gamestate(0, melee.Menu.POSTGAME_SCORES),
+                _gamestate(1),
+                _gamestate(2, percents=(0, 10)),
+                _gamestate(3, stocks=(4, 0), percents=(0, 10)),
+                _gamestate(4, stocks=(4, 0), percents=(0, 10)),
+                _gamestate(5, melee.Menu.POSTGAME_SCORES),
+                _gamestate(6),
+            ],
+            [
+                _gamestate(0),
+                _gamestate(1),
+                _gamestate(2, melee.Menu.POSTGAME_SCORES),
+                _gamestate(3),
+            ],
+        ]
+        with mock.patch("melee_env.env.DolphinConfig"):
+            vec_env = MeleeVecEnv(None, lambda: [_Player(), _Player()], 2, melee.Stage.FINAL_DESTINATION)
+        # What start() does, with the fake consoles in place of Dolphin
+        for i, env in enumerate(vec_env.envs):
+            env.console = _FakeConsole(scripts[i])
+            vec_env._selector.register(env.console, selectors.EVENT_READ, i)
+
+        with mock.patch.object(melee.MenuHelper, "choose_versus_mode") as choose_versus_mode:
+            observations = vec_env.reset()
+            np.testing.assert_array_equal(observations, [[1, 1], [0, 0]])
+            self.assertEqual(choose_versus_mode.call_count, 1)
+
+            observations, rewards, dones, infos = vec_env.step([(1, 2), (3, 4)])
+            np.testing.assert_array_equal(observations, [[2, 2], [1, 1]])
+            np.testing.assert_allclose(rewards, [[1, -1], [0, 0]])
+            np.testing.assert_array_equal(dones, [False, False])
+            vec_env.envs[0].players[1].controller.apply.assert_called_with(2)
+            vec_env.envs[1].players[0].controller.apply.assert_called_with(3)
+
+            # env 0 sees its opponent's last stock go, plays out the end of the game
+            #   and goes through the menus. env 1's game ends without it seeing why
+            observations, rewards, dones, infos = vec_env.step([(0, 0), (0, 0)])
+            np.testing.assert_array_equal(observations, [[6, 6], [3, 3]])
+            np.testing.assert_array_equal(dones, [True, True])
+            np.testing.assert_array_equal(infos[0]["terminal_observation"], [3, 3])
+            np.testing.assert_array_equal(infos[1]["terminal_observation"], [1, 1])
+            self.assertEqual(choose_versus_mode.call_count, 2)
+            # The new episodes start without a previous frame to reward against
+            for env in vec_env.envs:
+                self.assertIs(env.observation_space.previous_gamestate, env.gamestate)
+
+        self.assertEqual([env.console.flushes for env in vec_env.envs], [6, 3])
+        vec_env.close()
+
+
+class SubprocEnv(unittest.TestCase):
+    """
+    MeleeSubprocEnv's workers and shared memory ring, against fake consoles
+    """
+
+    def test_ring_and_restart(self):
+        """Steps land in alternating slots of the ring, and a worker whose Dolphin dies
+        starts a new one and reports the episode as done"""
+        scripts = [
+            # Dolphin dies after frame 3
+            [
+                _gamestate(0, melee.Menu.POSTGAME_SCORES),
+                _gamestate(1),
+                _gamestate(2, percents=(0, 10)),
+                _gamestate(3, percents=(0, 10)),
+            ],
+            [_gamestate(10, melee.Menu.POSTGAME_SCORES), _gamestate(11), _gamestate(12)],
+        ]
+        # Patched before the workers fork, so they use the fakes too. Each worker
+        #   counts its own starts
+        starts = []
+
+        def start(env):
+            env.console = _FakeConsole(scripts[len(starts)])
+            env.gamestate = env.console.poll()
+            starts.append(env)
+
+        with mock.patch("melee_env.env.DolphinConfig"), mock.patch.object(
+            MeleeEnv, "start", start
+        ), mock.patch.object(
+            MeleeEnv, "is_alive", lambda env: env.console.alive
+        ), mock.patch.object(melee.MenuHelper, "choose_versus_mode"):
+            subproc_env = MeleeSubprocEnv(
+                None,
+                lambda: [_Player(), _Player()],
+                2,
+                melee.Stage.FINAL_DESTINATION,
+                fields=["x"],
+                start_method="fork",
+            )
+        try:
+            self.assertEqual(subproc_env.observation_size, 2)
+            first = subproc_env.reset()
+            np.testing.assert_array_equal(first, [[1, 1], [1, 1]])
+
+            observations, rewards, dones, infos = subproc_env.step([(0, 0), (0, 0)])
+            np.testing.assert_array_equal(observations, [[2, 2], [2, 2]])
+            np.testing.assert_allclose(rewards, [[1, -1], [1, -1]])
+            np.testing.assert_array_equal(dones, [False, False])
+            self.assertFalse(np.shares_memory(observations, first))
+
+            # With two slots, the third step's arrays are the first's
+            observations, rewards, dones, infos = subproc_env.step([(0, 0), (0, 0)])
+            self.assertTrue(np.shares_memory(observations, first))
+            np.testing.assert_array_equal(first, [[3, 3], [3, 3]])
+
+            observations, rewards, dones, infos = subproc_env.step([(0, 0), (0, 0)])
+            np.testing.assert_array_equal(observations, [[11, 11], [11, 11]])
+            np.testing.assert_array_equal(dones, [True, True])
+            self.assertEqual(infos, [{"restarted": True, "restarts": 1}] * 2)
+
+            observations, rewards, dones, infos = subproc_env.step([(0, 0), (0, 0)])
+            np.testing.assert_array_equal(observations, [[12, 12], [12, 12]])
+            np.testing.assert_array_equal(dones, [False, False])
+            self.assertEqual(infos, [{}, {}])
+        finally:
+            subproc_env.close()
+
+    def test_worker_error(self):
+        """A worker that fails mid step is reported, and close() still shuts down the
+        others and frees the shared memory, whichever worker it was"""
+        def start(env):
+            env.console = _FakeConsole(
+                [_gamestate(0, melee.Menu.POSTGAME_SCORES), _gamestate(1), _gamestate(2)]
+            )
+            env.gamestate = env.console.poll()
+
+        for failing in (0, 1):
+            with self.subTest(failing=failing):
+                def step(worker, slot, actions):
+                    if worker.index == failing:
+                        raise ValueError("bad action")
+                    return {}
+
+                with mock.patch("melee_env.env.DolphinConfig"), mock.patch.object(
+                    MeleeEnv, "start", start
+                ), mock.patch.object(
+                    MeleeEnv, "is_alive", lambda env: env.console.alive
+                ), mock.patch.object(
+                    melee.MenuHelper, "choose_versus_mode"
+                ), mock.patch.object(_Worker, "step", step):
+                    subproc_env = MeleeSubprocEnv(
+                        None,
+                        lambda: [_Player(), _Player()],
+                        2,
+                        melee.Stage.FINAL_DESTINATION,
+                        fields=["x"],
+                        start_method="fork",
+                    )
+                name = subproc_env._shm.name
+                try:
+                    subproc_env.reset()
+                    with self.assertRaisesRegex(RuntimeError, "worker %d failed" % failing):
+                        subproc_env.step([(0, 0), (0, 0)])
+                finally:
+                    subproc_env.close()
+                for process in subproc_env._processes:
+                    self.assertFalse(process.is_alive())
+                with self.assertRaises(FileNotFoundError):
+                    shared_memory.SharedMemory(name=name)
+
+
+if __name__ == "__main__":
+    unittest.main()